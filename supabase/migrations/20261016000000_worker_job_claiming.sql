@@ -0,0 +1,51 @@
+-- Worker 任务领取：用 FOR UPDATE SKIP LOCKED 原子地把 pending 项目改为 processing
+-- 多个 Worker 可以同时消费同一个队列，不会重复处理同一个项目
+
+-- ==========================================
+-- 步骤 1: 记录领取任务的 Worker
+-- ==========================================
+ALTER TABLE public.projects
+ADD COLUMN IF NOT EXISTS claimed_by text,
+ADD COLUMN IF NOT EXISTS claimed_at timestamptz;
+
+COMMENT ON COLUMN public.projects.claimed_by IS
+'Worker id that claimed this project (set by claim_pending_projects)';
+
+-- 队列扫描只关心 pending 行，按创建时间先进先出
+CREATE INDEX IF NOT EXISTS projects_pending_created_at_idx
+    ON public.projects(created_at)
+    WHERE status = 'pending';
+
+-- ==========================================
+-- 步骤 2: 原子领取函数
+-- ==========================================
+CREATE OR REPLACE FUNCTION public.claim_pending_projects(
+    p_worker_id text,
+    p_limit integer DEFAULT 1
+)
+RETURNS SETOF public.projects AS $$
+BEGIN
+  RETURN QUERY
+  WITH candidates AS (
+    SELECT id
+    FROM public.projects
+    WHERE status = 'pending'
+    ORDER BY created_at
+    LIMIT GREATEST(p_limit, 0)
+    FOR UPDATE SKIP LOCKED
+  )
+  UPDATE public.projects p
+  SET
+    status = 'processing',
+    claimed_by = p_worker_id,
+    claimed_at = NOW(),
+    updated_at = NOW()
+  FROM candidates
+  WHERE p.id = candidates.id
+  RETURNING p.*;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 只允许 Service Role（Worker）调用
+REVOKE ALL ON FUNCTION public.claim_pending_projects(text, integer) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.claim_pending_projects(text, integer) TO service_role;
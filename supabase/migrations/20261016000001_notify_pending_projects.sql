@@ -0,0 +1,21 @@
+-- 新项目推送通知：项目变为 pending 时发送 pg_notify，Worker 通过 LISTEN 立即被唤醒
+-- Worker 断开连接时会自动退回轮询模式，因此此触发器是可选的性能优化
+
+CREATE OR REPLACE FUNCTION public.notify_pending_project()
+RETURNS trigger AS $$
+BEGIN
+  IF NEW.status = 'pending' THEN
+    PERFORM pg_notify('projects_pending', NEW.id::text);
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notify_pending_project ON public.projects;
+
+-- INSERT: 新提交的项目
+-- UPDATE OF status: 重置/重试的项目（例如 reset_project.py）
+CREATE TRIGGER notify_pending_project
+    AFTER INSERT OR UPDATE OF status ON public.projects
+    FOR EACH ROW
+    EXECUTE FUNCTION public.notify_pending_project();
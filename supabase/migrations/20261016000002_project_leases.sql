@@ -0,0 +1,116 @@
+-- 任务租约 + 心跳：Worker 崩溃后，过期的 processing 项目会被自动重新排队
+-- 取代手动执行 CLEANUP_STUCK_TASKS.sql
+
+-- ==========================================
+-- 步骤 1: 租约字段
+-- ==========================================
+ALTER TABLE public.projects
+ADD COLUMN IF NOT EXISTS lease_expires_at timestamptz,
+ADD COLUMN IF NOT EXISTS attempt_count integer NOT NULL DEFAULT 0;
+
+COMMENT ON COLUMN public.projects.lease_expires_at IS
+'Worker lease expiry; renewed by the worker heartbeat while processing';
+COMMENT ON COLUMN public.projects.attempt_count IS
+'Number of times this project has been claimed by a worker';
+
+CREATE INDEX IF NOT EXISTS projects_processing_lease_idx
+    ON public.projects(lease_expires_at)
+    WHERE status = 'processing';
+
+-- ==========================================
+-- 步骤 2: 领取时写入租约（替换旧的两参数版本）
+-- ==========================================
+DROP FUNCTION IF EXISTS public.claim_pending_projects(text, integer);
+
+CREATE OR REPLACE FUNCTION public.claim_pending_projects(
+    p_worker_id text,
+    p_limit integer DEFAULT 1,
+    p_lease_seconds integer DEFAULT 30
+)
+RETURNS SETOF public.projects AS $$
+BEGIN
+  RETURN QUERY
+  WITH candidates AS (
+    SELECT id
+    FROM public.projects
+    WHERE status = 'pending'
+    ORDER BY created_at
+    LIMIT GREATEST(p_limit, 0)
+    FOR UPDATE SKIP LOCKED
+  )
+  UPDATE public.projects p
+  SET
+    status = 'processing',
+    claimed_by = p_worker_id,
+    claimed_at = NOW(),
+    lease_expires_at = NOW() + make_interval(secs => p_lease_seconds),
+    attempt_count = p.attempt_count + 1,
+    updated_at = NOW()
+  FROM candidates
+  WHERE p.id = candidates.id
+  RETURNING p.*;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- ==========================================
+-- 步骤 3: 心跳续租（只续本 Worker 仍持有的项目）
+-- ==========================================
+CREATE OR REPLACE FUNCTION public.renew_project_leases(
+    p_worker_id text,
+    p_project_ids uuid[],
+    p_lease_seconds integer DEFAULT 30
+)
+RETURNS SETOF uuid AS $$
+BEGIN
+  RETURN QUERY
+  UPDATE public.projects p
+  SET lease_expires_at = NOW() + make_interval(secs => p_lease_seconds)
+  WHERE p.id = ANY(p_project_ids)
+    AND p.status = 'processing'
+    AND p.claimed_by = p_worker_id
+  RETURNING p.id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- ==========================================
+-- 步骤 4: 回收过期租约
+-- 未超过重试上限 -> 重新排队为 pending；超过上限 -> failed
+-- ==========================================
+CREATE OR REPLACE FUNCTION public.reap_expired_projects(
+    p_max_attempts integer DEFAULT 3
+)
+RETURNS TABLE (project_id uuid, new_status text, attempts integer) AS $$
+BEGIN
+  RETURN QUERY
+  WITH expired AS (
+    SELECT p.id
+    FROM public.projects p
+    WHERE p.status = 'processing'
+      AND p.lease_expires_at IS NOT NULL
+      AND p.lease_expires_at < NOW()
+    FOR UPDATE SKIP LOCKED
+  )
+  UPDATE public.projects p
+  SET
+    status = CASE WHEN p.attempt_count >= p_max_attempts THEN 'failed' ELSE 'pending' END,
+    error_message = CASE
+      WHEN p.attempt_count >= p_max_attempts
+        THEN 'Worker stopped responding ' || p.attempt_count || ' times - please retry'
+      ELSE p.error_message
+    END,
+    claimed_by = NULL,
+    lease_expires_at = NULL,
+    updated_at = NOW()
+  FROM expired
+  WHERE p.id = expired.id
+  RETURNING p.id, p.status, p.attempt_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 只允许 Service Role（Worker）调用
+REVOKE ALL ON FUNCTION public.claim_pending_projects(text, integer, integer) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.renew_project_leases(text, uuid[], integer) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.reap_expired_projects(integer) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.claim_pending_projects(text, integer, integer) TO service_role;
+GRANT EXECUTE ON FUNCTION public.renew_project_leases(text, uuid[], integer) TO service_role;
+GRANT EXECUTE ON FUNCTION public.reap_expired_projects(integer) TO service_role;
@@ -0,0 +1,159 @@
+-- 公平调度：按预估成本排序（短视频优先）+ 等待时间老化 + 每用户并发上限
+--
+-- 排序采用 HRRN（最高响应比优先）：
+--   priority = (已等待秒数 + 预估处理秒数) / 预估处理秒数
+-- 短任务的 priority 增长更快，因此能插队到长任务前面；
+-- 长任务的 priority 也会随等待时间持续增长，所以不会被饿死。
+--
+-- 预估成本与 worker/main.py 中的 estimate_credits_cost() 一致：
+--   credits = GREATEST(10, CEIL(duration / 60) * 10)
+--
+-- 时长来源（按先后）：
+--   1. 提交时：下面的 fill_project_duration 触发器从同一视频的已有项目复制时长；
+--      ingest_playlist.py 在批量导入时直接写入扁平提取得到的时长
+--   2. Worker 获取视频元数据后立即写入（早于 AI 分析），失败或重试的项目也有时长
+-- 仍然未知的项目（首次提交、尚未被处理过的视频）按 600 秒（Worker 的默认时长）估算。
+
+-- 提交时补全时长：网页端 /api/projects/create 不知道视频时长
+CREATE OR REPLACE FUNCTION public.fill_project_duration()
+RETURNS trigger AS $$
+BEGIN
+  IF NEW.video_duration_seconds IS NULL THEN
+    SELECT p.video_duration_seconds INTO NEW.video_duration_seconds
+    FROM public.projects p
+    WHERE p.video_source_url = NEW.video_source_url
+      AND p.video_duration_seconds IS NOT NULL
+    ORDER BY p.created_at DESC
+    LIMIT 1;
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS fill_project_duration ON public.projects;
+
+CREATE TRIGGER fill_project_duration
+    BEFORE INSERT ON public.projects
+    FOR EACH ROW
+    EXECUTE FUNCTION public.fill_project_duration();
+
+CREATE INDEX IF NOT EXISTS projects_video_source_url_duration_idx
+    ON public.projects(video_source_url, created_at DESC)
+    WHERE video_duration_seconds IS NOT NULL;
+
+DROP FUNCTION IF EXISTS public.claim_pending_projects(text, integer, integer);
+
+CREATE OR REPLACE FUNCTION public.claim_pending_projects(
+    p_worker_id text,
+    p_limit integer DEFAULT 1,
+    p_lease_seconds integer DEFAULT 30,
+    p_max_per_user integer DEFAULT 2,
+    p_seconds_per_credit double precision DEFAULT 1.0
+)
+RETURNS SETOF public.projects AS $$
+DECLARE
+  candidate record;
+  claimed public.projects%ROWTYPE;
+  user_running integer;
+  claimed_count integer := 0;
+BEGIN
+  IF p_limit <= 0 THEN
+    RETURN;
+  END IF;
+
+  -- 先在全部 pending 项目上按用户排名（上限 + 优先级），不加锁；
+  -- 只对最终选中的 id 执行 FOR UPDATE SKIP LOCKED。
+  -- 这样某个用户排队再多（例如整个播放列表导入），也不会挤占其他用户的候选名额。
+  FOR candidate IN
+    WITH running AS (
+      SELECT r.user_id, COUNT(*) AS running_count
+      FROM public.projects r
+      WHERE r.status = 'processing'
+      GROUP BY r.user_id
+    ),
+    pending AS (
+      SELECT
+        p.id,
+        p.user_id,
+        p.created_at,
+        GREATEST(10, CEIL(COALESCE(p.video_duration_seconds, 600) / 60.0) * 10)
+          * GREATEST(p_seconds_per_credit, 0.001) AS est_seconds
+      FROM public.projects p
+      WHERE p.status = 'pending'
+    ),
+    ranked AS (
+      SELECT
+        pending.id,
+        pending.user_id,
+        pending.created_at,
+        (EXTRACT(EPOCH FROM (NOW() - pending.created_at)) + pending.est_seconds) / pending.est_seconds AS priority,
+        COALESCE(running.running_count, 0) AS running_count,
+        ROW_NUMBER() OVER (
+          PARTITION BY pending.user_id
+          ORDER BY
+            (EXTRACT(EPOCH FROM (NOW() - pending.created_at)) + pending.est_seconds) / pending.est_seconds DESC,
+            pending.created_at
+        ) AS user_rank
+      FROM pending
+      LEFT JOIN running ON running.user_id = pending.user_id
+    )
+    SELECT ranked.id, ranked.user_id
+    FROM ranked
+    -- 每个用户：正在处理的 + 本次领取的 <= 上限
+    WHERE ranked.running_count + ranked.user_rank <= p_max_per_user
+    ORDER BY ranked.priority DESC, ranked.created_at
+  LOOP
+    EXIT WHEN claimed_count >= p_limit;
+
+    -- 每用户事务级咨询锁：同一用户的并发领取串行化，上限检查不会同时通过。
+    -- 拿不到锁说明另一个 Worker 正在为该用户领取，直接跳过（与 SKIP LOCKED 一致，避免死锁）
+    IF NOT pg_try_advisory_xact_lock(hashtext('claim_pending_projects:' || candidate.user_id::text)) THEN
+      CONTINUE;
+    END IF;
+
+    -- 持锁后重新统计（包含本事务刚领取的项目）
+    SELECT COUNT(*) INTO user_running
+    FROM public.projects r
+    WHERE r.user_id = candidate.user_id
+      AND r.status = 'processing';
+    IF user_running >= p_max_per_user THEN
+      CONTINUE;
+    END IF;
+
+    UPDATE public.projects p
+    SET
+      status = 'processing',
+      claimed_by = p_worker_id,
+      claimed_at = NOW(),
+      lease_expires_at = NOW() + make_interval(secs => p_lease_seconds),
+      attempt_count = p.attempt_count + 1,
+      updated_at = NOW()
+    WHERE p.id = (
+      SELECT l.id
+      FROM public.projects l
+      WHERE l.id = candidate.id
+        AND l.status = 'pending'
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING p.* INTO claimed;
+
+    IF FOUND THEN
+      claimed_count := claimed_count + 1;
+      RETURN NEXT claimed;
+    END IF;
+  END LOOP;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 按用户统计 processing 项目
+CREATE INDEX IF NOT EXISTS projects_processing_user_idx
+    ON public.projects(user_id)
+    WHERE status = 'processing';
+
+-- 排名扫描全部 pending 项目
+CREATE INDEX IF NOT EXISTS projects_pending_user_idx
+    ON public.projects(user_id, created_at)
+    WHERE status = 'pending';
+
+REVOKE ALL ON FUNCTION public.claim_pending_projects(text, integer, integer, integer, double precision) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.claim_pending_projects(text, integer, integer, integer, double precision) TO service_role;
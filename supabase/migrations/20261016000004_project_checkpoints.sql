@@ -0,0 +1,65 @@
+-- 阶段检查点：保存每个处理阶段的产出，重试时从第一个未完成的阶段继续
+-- 结构见 worker/checkpoint.py（metadata / transcript / analysis / images）
+--
+-- 单独建表而不是放在 projects 上：检查点包含完整字幕和分析 JSON，
+-- 不能随 claim_pending_projects（p.*）或项目列表 API（select('*')）一起返回。
+-- 项目完成后 Worker 会删除对应的检查点。
+
+CREATE TABLE IF NOT EXISTS public.project_checkpoints (
+    project_id uuid PRIMARY KEY REFERENCES public.projects(id) ON DELETE CASCADE,
+    data jsonb NOT NULL DEFAULT '{}'::jsonb,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+COMMENT ON TABLE public.project_checkpoints IS
+'Worker stage checkpoint (metadata, transcript, analysis, uploaded images) used to resume retried projects';
+
+-- 只由 Worker（Service Role）读写
+ALTER TABLE public.project_checkpoints ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role can manage project checkpoints"
+    ON public.project_checkpoints FOR ALL
+    USING (auth.role() = 'service_role');
+
+GRANT ALL ON public.project_checkpoints TO service_role;
+
+-- 合并一个或多个阶段（顶层键覆盖）
+CREATE OR REPLACE FUNCTION public.save_project_checkpoint(
+    p_project_id uuid,
+    p_stages jsonb
+)
+RETURNS void AS $$
+BEGIN
+  INSERT INTO public.project_checkpoints AS c (project_id, data, updated_at)
+  VALUES (p_project_id, p_stages, NOW())
+  ON CONFLICT (project_id) DO UPDATE
+  SET data = c.data || EXCLUDED.data,
+      updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 记录一张已上传的截图：只修补 images 中的一个键，不重写整个检查点
+CREATE OR REPLACE FUNCTION public.save_project_checkpoint_image(
+    p_project_id uuid,
+    p_section_order text,
+    p_image_path text
+)
+RETURNS void AS $$
+BEGIN
+  INSERT INTO public.project_checkpoints AS c (project_id, data, updated_at)
+  VALUES (p_project_id, jsonb_build_object('images', jsonb_build_object(p_section_order, p_image_path)), NOW())
+  ON CONFLICT (project_id) DO UPDATE
+  SET data = jsonb_set(
+        c.data,
+        '{images}',
+        CASE WHEN jsonb_typeof(c.data->'images') = 'object' THEN c.data->'images' ELSE '{}'::jsonb END
+          || jsonb_build_object(p_section_order, p_image_path)
+      ),
+      updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE ALL ON FUNCTION public.save_project_checkpoint(uuid, jsonb) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.save_project_checkpoint_image(uuid, text, text) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.save_project_checkpoint(uuid, jsonb) TO service_role;
+GRANT EXECUTE ON FUNCTION public.save_project_checkpoint_image(uuid, text, text) TO service_role;
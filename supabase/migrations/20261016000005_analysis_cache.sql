@@ -0,0 +1,32 @@
+-- 跨项目的 AI 分析结果缓存
+-- 同一视频、同一生成模式、同一模型、同一 Prompt（哈希）只需调用一次 Gemini
+-- 结构见 worker/analysis_cache.py
+
+CREATE TABLE IF NOT EXISTS public.analysis_cache (
+    video_id text NOT NULL,
+    generation_mode text NOT NULL,
+    model text NOT NULL,
+    prompt_hash text NOT NULL,
+    metadata jsonb NOT NULL DEFAULT '{}'::jsonb,  -- video_id / duration / title
+    analysis jsonb NOT NULL,                      -- analyze_content() 的规范化结果
+    images jsonb NOT NULL DEFAULT '{}'::jsonb,    -- {section_order: storage path}
+    created_at timestamptz NOT NULL DEFAULT now(),
+    expires_at timestamptz NOT NULL,
+    PRIMARY KEY (video_id, generation_mode, model, prompt_hash)
+);
+
+CREATE INDEX IF NOT EXISTS analysis_cache_expires_at_idx ON public.analysis_cache(expires_at);
+
+-- 只由 Worker（Service Role）读写
+ALTER TABLE public.analysis_cache ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role can manage analysis cache"
+    ON public.analysis_cache FOR ALL
+    USING (auth.role() = 'service_role');
+
+GRANT ALL ON public.analysis_cache TO service_role;
+
+-- 不需要在 system_configs 上加失效触发器：缓存键已包含 Prompt 哈希，
+-- 修改 Prompt 后旧条目自然不再命中，并在 expires_at 之后过期
+DROP TRIGGER IF EXISTS invalidate_analysis_cache_on_prompt_change ON public.system_configs;
+DROP FUNCTION IF EXISTS public.invalidate_analysis_cache_on_prompt_change();
@@ -0,0 +1,20 @@
+-- Gemini 调用的共享令牌桶（每个模型一行）
+-- 多台机器上的 Worker 通过这张表共享 RPM / TPM 配额（GEMINI_RATE_LIMIT_BACKEND=postgres）
+-- 结构见 worker/rate_limiter.py
+
+CREATE TABLE IF NOT EXISTS public.gemini_rate_limits (
+    model text PRIMARY KEY,
+    requests double precision,                -- 请求桶剩余量（NULL = 新行，满桶）
+    tokens double precision,                  -- Token 桶剩余量
+    updated_at double precision,              -- 上次补充的时间（Unix 秒）
+    blocked_until double precision NOT NULL DEFAULT 0  -- 429 后暂停到此时间（Unix 秒）
+);
+
+-- 只由 Worker（Service Role / 直连）读写
+ALTER TABLE public.gemini_rate_limits ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role can manage gemini rate limits"
+    ON public.gemini_rate_limits FOR ALL
+    USING (auth.role() = 'service_role');
+
+GRANT ALL ON public.gemini_rate_limits TO service_role;
@@ -0,0 +1,63 @@
+-- 播放列表 / 频道批量导入：在一个事务中创建项目并扣除积分
+-- 调用方见 worker/ingest_playlist.py
+-- 余额检查、项目插入、积分扣除和 credits_history 记录要么全部成功，要么全部回滚，
+-- 不会出现项目已删除但积分未退还的情况。
+
+CREATE OR REPLACE FUNCTION public.create_charged_projects(
+    p_user_id uuid,
+    p_projects jsonb,       -- [{title, video_source_url, video_duration_seconds, credits_cost, generation_mode}]
+    p_description text
+)
+RETURNS SETOF public.projects AS $$
+DECLARE
+  v_customer public.customers%ROWTYPE;
+  v_total integer;
+BEGIN
+  SELECT COALESCE(SUM((item->>'credits_cost')::integer), 0) INTO v_total
+  FROM jsonb_array_elements(p_projects) AS item;
+
+  -- 锁定余额，避免并发导入或网页端扣分同时通过检查
+  SELECT * INTO v_customer
+  FROM public.customers
+  WHERE user_id = p_user_id
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Customer record not found for user %', p_user_id;
+  END IF;
+
+  IF v_customer.credits < v_total THEN
+    RAISE EXCEPTION 'Insufficient credits: % required, % available', v_total, v_customer.credits;
+  END IF;
+
+  RETURN QUERY
+  INSERT INTO public.projects (
+    user_id, title, video_source_url, video_duration_seconds, status, credits_cost, generation_mode
+  )
+  SELECT
+    p_user_id, item.title, item.video_source_url, item.video_duration_seconds,
+    'pending', item.credits_cost, item.generation_mode
+  FROM jsonb_to_recordset(p_projects) AS item(
+    title text,
+    video_source_url text,
+    video_duration_seconds integer,
+    credits_cost integer,
+    generation_mode text
+  )
+  RETURNING *;
+
+  IF v_total > 0 THEN
+    UPDATE public.customers
+    SET credits = credits - v_total,
+        updated_at = NOW()
+    WHERE id = v_customer.id;
+
+    INSERT INTO public.credits_history (customer_id, amount, type, description)
+    VALUES (v_customer.id, v_total, 'subtract', p_description);
+  END IF;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 只允许 Service Role 调用
+REVOKE ALL ON FUNCTION public.create_charged_projects(uuid, jsonb, text) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.create_charged_projects(uuid, jsonb, text) TO service_role;
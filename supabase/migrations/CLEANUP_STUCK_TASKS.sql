@@ -1,3 +1,6 @@
+-- 注意：执行 20261016000002_project_leases.sql 后，Worker 会自动回收过期租约的项目
+-- （reap_expired_projects），通常不再需要手动执行此脚本
+
 -- 问题1: 清理被 Cloudflare 拦截的卡住任务
 -- 将所有 processing 状态的项目标记为 failed
 
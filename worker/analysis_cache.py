@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Cross-project cache of Gemini analysis results
+
+Stored in the `analysis_cache` table (see
+supabase/migrations/20261016000005_analysis_cache.sql) and keyed by
+video id, generation mode, model and the hash of the prompt template.
+A hit skips subtitles, analyze_content and storyboard extraction: the
+entry carries the video metadata and the storage paths of the
+screenshots uploaded by the project that produced it.
+
+Entries expire after `ttl_seconds`. Editing a prompt in system_configs
+needs no invalidation: the new prompt hash simply misses the old entries.
+invalidate() drops entries explicitly.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+
+class AnalysisCache:
+    """
+    Supabase-backed analysis cache shared by all workers
+    """
+
+    def __init__(self, supabase, ttl_seconds: float = 7 * 24 * 3600):
+        self.supabase = supabase
+        self.ttl_seconds = ttl_seconds
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def get(self, video_id: str, generation_mode: str, prompt_hash: str, models: List[str]) -> Optional[Dict]:
+        """
+        Look up a cached analysis, preferring models in the given order
+
+        Returns:
+            Row dict with metadata, analysis, images and model, or None
+        """
+        if not self.enabled or not video_id:
+            return None
+
+        try:
+            response = (
+                self.supabase.table('analysis_cache')
+                .select('model, metadata, analysis, images')
+                .eq('video_id', video_id)
+                .eq('generation_mode', generation_mode)
+                .eq('prompt_hash', prompt_hash)
+                .in_('model', models)
+                .gt('expires_at', datetime.now(timezone.utc).isoformat())
+                .execute()
+            )
+        except Exception as e:
+            print(f"⚠️ Analysis cache lookup failed: {e}")
+            return None
+
+        rows = response.data or []
+        if not rows:
+            return None
+
+        rows.sort(key=lambda row: models.index(row['model']) if row['model'] in models else len(models))
+        entry = rows[0]
+        # jsonb object keys are strings; section_order is an int everywhere else
+        entry['images'] = {int(order): path for order, path in (entry.get('images') or {}).items()}
+        print(f"🎯 Analysis cache hit: {video_id} ({generation_mode}, {entry['model']}, prompt {prompt_hash})")
+        return entry
+
+    def put(self, video_id: str, generation_mode: str, model: str, prompt_hash: str,
+            metadata: Dict, analysis: Dict, images: Optional[Dict] = None):
+        """Store (or refresh) an analysis result"""
+        if not self.enabled or not video_id or not model:
+            return
+
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+        try:
+            self.supabase.table('analysis_cache').upsert({
+                'video_id': video_id,
+                'generation_mode': generation_mode,
+                'model': model,
+                'prompt_hash': prompt_hash,
+                'metadata': metadata,
+                'analysis': analysis,
+                'images': {str(order): path for order, path in (images or {}).items()},
+                'expires_at': expires_at.isoformat(),
+            }).execute()
+            print(f"💾 Cached analysis for {video_id} ({generation_mode}, {model})")
+        except Exception as e:
+            # Cache is best effort - never fail a project because of it
+            print(f"⚠️ Failed to write analysis cache: {e}")
+
+    def invalidate(self, video_id: Optional[str] = None, prompt_hash: Optional[str] = None):
+        """Drop entries for a video and/or prompt hash (everything when both are None)"""
+        query = self.supabase.table('analysis_cache').delete()
+        if video_id:
+            query = query.eq('video_id', video_id)
+        if prompt_hash:
+            query = query.eq('prompt_hash', prompt_hash)
+        if not video_id and not prompt_hash:
+            query = query.neq('video_id', '')
+        query.execute()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Response schema and decoder for Gemini video analyses
+
+Analysis and Section are passed to Gemini as the response schema
+(structured output), so the model returns bare JSON in this shape instead
+of free text that has to be fished out of code fences.
+
+decode_analysis() turns that JSON into typed Section records. The field
+table is built once at import: each field has its key, the aliases older
+prompts in system_configs still use, a coercion and a default. A section
+that cannot be decoded is dropped on its own instead of failing the
+whole response.
+
+SectionStreamDecoder does the same on a streamed response, returning each
+section as soon as its object in the "sections" array is closed.
+"""
+
+import json
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+# typing.TypedDict is rejected by the SDK's schema builder (pydantic) before Python 3.12
+from typing_extensions import TypedDict
+
+
+class Section(TypedDict):
+    section_order: int
+    title: str
+    content: str
+    timestamp_seconds: float
+    needs_screenshot: bool
+
+
+class Analysis(TypedDict):
+    summary: str
+    sections: List[Section]
+
+
+class AnalysisDecodeError(ValueError):
+    """The response has no usable sections"""
+
+
+# "75", "75.5s", "01:15", "1:01:15", "[01:15]"
+_TIMESTAMP_RE = re.compile(r"^\[?\s*(?:(?:(\d+):)?(\d+):)?(\d+(?:\.\d+)?)\s*s?\s*\]?$")
+_TRUE_STRINGS = {'true', 'yes', '1'}
+
+
+def parse_timestamp(value: Any) -> float:
+    """Seconds from a number or a [h:]mm:ss / "75s" string"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    match = _TIMESTAMP_RE.match(str(value).strip())
+    if not match:
+        raise ValueError(f"unreadable timestamp {value!r}")
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds)
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in _TRUE_STRINGS
+    return bool(value)
+
+
+def _to_int(value: Any) -> int:
+    return int(float(value))
+
+
+def _to_text(value: Any) -> str:
+    return value.strip() if isinstance(value, str) else str(value)
+
+
+# key, aliases (first non-empty wins), coercion, default (called with the 1-based index)
+_FIELDS: Tuple[Tuple[str, Tuple[str, ...], Callable[[Any], Any], Callable[[int], Any]], ...] = (
+    ('section_order', ('section_order', 'step_order', 'order'), _to_int, lambda i: i),
+    ('title', ('title', 'name'), _to_text, lambda i: f"Section {i}"),
+    ('content', ('content', 'instruction', 'description', 'title'), _to_text, lambda i: "Content not provided"),
+    ('timestamp_seconds', ('timestamp_seconds', 'timestamp'), parse_timestamp, lambda i: 0.0),
+    # Screenshots are opt-out: default to True for visual guides
+    ('needs_screenshot', ('needs_screenshot', 'screenshot', 'has_screenshot', 'visual', 'image'), _to_bool, lambda i: True),
+)
+
+
+def _compile_decoder(fields) -> Callable[[Dict, int], Section]:
+    def decode(raw: Dict, index: int) -> Section:
+        section = {}
+        for key, aliases, coerce, default in fields:
+            for alias in aliases:
+                value = raw.get(alias)
+                if value is not None and value != '':
+                    section[key] = coerce(value)
+                    break
+            else:
+                section[key] = default(index)
+        return section
+    return decode
+
+
+decode_section = _compile_decoder(_FIELDS)
+
+
+def decode_analysis(response: Any) -> Dict:
+    """
+    Validate an analysis response and normalize its sections
+
+    Args:
+        response: JSON text, or the already parsed dict
+
+    Returns:
+        The response dict with 'sections' replaced by Section records
+
+    Raises:
+        AnalysisDecodeError: not a JSON object, or no section could be decoded
+    """
+    if isinstance(response, (str, bytes)):
+        try:
+            response = json.loads(response)
+        except json.JSONDecodeError as e:
+            raise AnalysisDecodeError(f"Invalid JSON response: {e}")
+    if not isinstance(response, dict):
+        raise AnalysisDecodeError("Response is not a JSON object")
+
+    raw_sections = response.get('sections')
+    if raw_sections is None:
+        raw_sections = response.get('steps')
+    if not isinstance(raw_sections, list):
+        raise AnalysisDecodeError("Response has no 'sections' list")
+
+    sections: List[Section] = []
+    for index, raw in enumerate(raw_sections, 1):
+        if not isinstance(raw, dict):
+            print(f"   ⚠️ Section {index} is not an object, skipped")
+            continue
+        try:
+            sections.append(decode_section(raw, index))
+        except (TypeError, ValueError) as e:
+            print(f"   ⚠️ Section {index} skipped: {e}")
+
+    if not sections:
+        raise AnalysisDecodeError("Model returned 0 sections")
+
+    data = dict(response)
+    data.pop('steps', None)
+    data['summary'] = _to_text(response.get('summary') or '')
+    data['sections'] = sections
+    return data
+
+
+class SectionStreamDecoder:
+    """
+    Incremental decoder for a streamed analysis response
+
+    Scans each chunk once, tracking string/nesting state, and decodes the
+    objects of the top-level "sections" (or "steps") array as they close.
+    Sections get the same positions and coercions as in decode_analysis(),
+    so finish() returns the same records the stream produced.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key = None
+        self._in_sections = False
+        self._item_start = None
+        self._index = 0
+
+    def feed(self, chunk: str) -> List[Section]:
+        """Sections completed by this chunk"""
+        self.text += chunk
+        text = self.text
+        completed: List[Section] = []
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = text[self._string_start + 1:i]
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == '{' or ch == '[':
+                self._depth += 1
+                if self._depth == 2 and ch == '[' and self._last_key in ('sections', 'steps'):
+                    self._in_sections = True
+                elif self._depth == 3 and self._in_sections:
+                    self._index += 1
+                    self._item_start = i if ch == '{' else None
+            elif ch == '}' or ch == ']':
+                if self._depth == 3 and self._item_start is not None:
+                    section = self._decode(text[self._item_start:i + 1])
+                    if section is not None:
+                        completed.append(section)
+                    self._item_start = None
+                self._depth -= 1
+                if self._depth < 2:
+                    self._in_sections = False
+        self._pos = len(text)
+        return completed
+
+    def _decode(self, item: str):
+        try:
+            raw = json.loads(item)
+            return decode_section(raw, self._index)
+        except (TypeError, ValueError):
+            # Reported (and skipped) again by finish()
+            return None
+
+    def finish(self) -> Dict:
+        """decode_analysis() of the complete response"""
+        return decode_analysis(self.text)
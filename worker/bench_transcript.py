@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the transcript path on the bundled caption fixtures
+
+Measures each stage parse_vtt_to_text runs (see transcript.py) on the
+worker/*.vtt files, or on given .vtt/.json3/.srv3 files, optionally scaled
+up into synthetic multi-hour inputs:
+
+    parse    iter_caption_cues        streaming cue parser
+    dedupe   + dedupe_rolling_cues    rolling auto-caption merge
+    compact  + compact_transcript     token-budgeted text (what Gemini gets)
+    windows  + split_transcript_windows  long-video windows
+
+For every fixture and stage it reports throughput (input MB/s, median of
+--repeat runs), peak Python memory (tracemalloc, separate run), output
+size and estimated tokens. Results can be written as JSON and compared
+with a previous run to catch regressions between releases.
+
+Usage:
+    python bench_transcript.py
+    python bench_transcript.py --scale 1 10 50 --json bench.json
+    python bench_transcript.py --compare bench-baseline.json --threshold 0.2
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from transcript import (
+    CAPTION_FORMATS, iter_caption_cues, dedupe_rolling_cues,
+    compact_transcript, split_transcript_windows, estimate_tokens,
+)
+
+WORKER_DIR = Path(__file__).parent
+
+
+def _format(path: Path) -> str:
+    ext = path.suffix.lstrip('.')
+    return ext if ext in CAPTION_FORMATS else 'vtt'
+
+
+def _open(path: Path):
+    return open(path, 'rb') if _format(path) == 'srv3' else open(path, 'r', encoding='utf-8')
+
+
+def _cues(f, path: Path, dedupe: bool):
+    """Cues of a caption file; rolling-caption dedup only applies to VTT"""
+    cues = iter_caption_cues(f, _format(path))
+    return dedupe_rolling_cues(cues) if dedupe and _format(path) == 'vtt' else cues
+
+
+def _compact(path: Path, budget: int) -> str:
+    with _open(path) as f:
+        return compact_transcript(_cues(f, path, dedupe=True), token_budget=budget)
+
+
+def stage_functions(budget: int, window_seconds: float) -> Dict[str, Callable[[Path], Dict]]:
+    """Stage name -> fn(path) returning output stats"""
+
+    def parse(path: Path) -> Dict:
+        with _open(path) as f:
+            cues = chars = 0
+            for cue in _cues(f, path, dedupe=False):
+                cues += 1
+                chars += len(cue.text)
+        return {'cues': cues, 'output_chars': chars}
+
+    def dedupe(path: Path) -> Dict:
+        with _open(path) as f:
+            cues = chars = words = 0
+            for cue in _cues(f, path, dedupe=True):
+                cues += 1
+                chars += len(cue.text) + 1
+                words += cue.text.count(' ') + 1
+        return {'cues': cues, 'output_chars': chars, 'output_words': words}
+
+    def compact(path: Path) -> Dict:
+        text = _compact(path, budget)
+        return {'output_chars': len(text), 'output_tokens': estimate_tokens(text), 'blocks': text.count('\n') + 1}
+
+    def windows(path: Path) -> Dict:
+        parts = split_transcript_windows(_compact(path, budget), window_seconds)
+        return {'windows': len(parts), 'output_chars': sum(len(w.text) for w in parts)}
+
+    return {'parse': parse, 'dedupe': dedupe, 'compact': compact, 'windows': windows}
+
+
+def write_scaled_fixture(source: Path, factor: int, directory: Path) -> Path:
+    """
+    Synthetic long input: the fixture's cues repeated factor times back to back
+
+    Written cue by cue as VTT so multi-hour files are never built in memory.
+    """
+    target = directory / f"{source.stem}.x{factor}.vtt"
+    with _open(source) as f:
+        cues = list(_cues(f, source, dedupe=False))
+    length = cues[-1].end if cues else 0
+
+    def stamp(seconds: float) -> str:
+        millis = int(round(seconds * 1000))
+        return f"{millis // 3600000:02d}:{millis // 60000 % 60:02d}:{millis // 1000 % 60:02d}.{millis % 1000:03d}"
+
+    with open(target, 'w', encoding='utf-8') as out:
+        out.write("WEBVTT\nKind: captions\nLanguage: en\n\n")
+        for copy in range(factor):
+            offset = copy * length
+            for cue in cues:
+                out.write(f"{stamp(cue.start + offset)} --> {stamp(cue.end + offset)} align:start position:0%\n")
+                out.write((cue.text or ' ') + "\n\n")
+    return target
+
+
+def measure(fn: Callable[[Path], Dict], path: Path, repeat: int) -> Dict:
+    size = path.stat().st_size
+    fn(path)  # Warm-up (page cache, imports)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        stats = fn(path)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    fn(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    median = statistics.median(timings)
+    return dict(stats, **{
+        'input_bytes': size,
+        'seconds_median': round(median, 6),
+        'seconds_min': round(min(timings), 6),
+        'mb_per_second': round(size / 1e6 / median, 2) if median else None,
+        'peak_memory_kb': round(peak / 1024, 1),
+    })
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=WORKER_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        return ''
+
+
+def compare(results: List[Dict], baseline_path: Path, threshold: float) -> List[str]:
+    """Regressions against a previous --json run (throughput, memory, output size)"""
+    baseline = {
+        (row['fixture'], row['scale'], row['stage']): row
+        for row in json.loads(baseline_path.read_text())['results']
+    }
+    regressions = []
+    for row in results:
+        old = baseline.get((row['fixture'], row['scale'], row['stage']))
+        if not old:
+            continue
+        label = f"{row['fixture']} x{row['scale']} {row['stage']}"
+        if old.get('mb_per_second') and row['mb_per_second'] < old['mb_per_second'] * (1 - threshold):
+            regressions.append(f"{label}: throughput {old['mb_per_second']} -> {row['mb_per_second']} MB/s")
+        if row['peak_memory_kb'] > old['peak_memory_kb'] * (1 + threshold) + 64:
+            regressions.append(f"{label}: peak memory {old['peak_memory_kb']} -> {row['peak_memory_kb']} KB")
+        for key in ('output_tokens', 'output_chars'):
+            if old.get(key) and row.get(key) and row[key] > old[key] * (1 + threshold):
+                regressions.append(f"{label}: {key} {old[key]} -> {row[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark caption parsing, dedup and compaction")
+    parser.add_argument('files', nargs='*', type=Path, help="Caption files (default: worker/*.vtt)")
+    parser.add_argument('--stages', nargs='+', default=['parse', 'dedupe', 'compact', 'windows'])
+    parser.add_argument('--scale', nargs='+', type=int, default=[1],
+                        help="Repeat each fixture N times back to back (e.g. 1 10 50 for multi-hour inputs)")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per measurement")
+    parser.add_argument('--budget', type=int, default=8000, help="compact_transcript token budget")
+    parser.add_argument('--window-seconds', type=float, default=1200)
+    parser.add_argument('--json', type=Path, help="Write results to this file")
+    parser.add_argument('--compare', type=Path, help="Previous --json output to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    files = args.files or sorted(WORKER_DIR.glob('*.vtt'))
+    if not files:
+        print("❌ No VTT fixtures found")
+        sys.exit(1)
+    stages = stage_functions(args.budget, args.window_seconds)
+    unknown = set(args.stages) - set(stages)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+    results = []
+    print(f"{'fixture':<32} {'scale':>5} {'stage':<8} {'input':>9} {'MB/s':>8} {'peak KB':>9} {'out chars':>10} {'tokens':>8}")
+    with tempfile.TemporaryDirectory(prefix="bench_transcript_") as tmp:
+        for source in files:
+            for factor in args.scale:
+                path = source if factor == 1 else write_scaled_fixture(source, factor, Path(tmp))
+                for stage in args.stages:
+                    row = dict(fixture=source.name, scale=factor, stage=stage,
+                               **measure(stages[stage], path, args.repeat))
+                    results.append(row)
+                    print(f"{source.name[:32]:<32} {factor:>5} {stage:<8} {row['input_bytes'] / 1024:>7.0f}KB "
+                          f"{row['mb_per_second'] or 0:>8.2f} {row['peak_memory_kb']:>9.1f} "
+                          f"{row['output_chars']:>10} {row.get('output_tokens', ''):>8}")
+                if path != source:
+                    path.unlink()
+
+    if args.json:
+        args.json.write_text(json.dumps({
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'settings': {'budget': args.budget, 'window_seconds': args.window_seconds, 'repeat': args.repeat},
+            'results': results,
+        }, indent=2))
+        print(f"💾 Results written to {args.json}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) vs {args.compare}:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"✅ No regressions vs {args.compare} (threshold {args.threshold:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Caption track selection from a yt-dlp info dict
+
+The info dict already lists every available track in `subtitles` (manual)
+and `automatic_captions` (auto-generated), so the worker ranks those and
+fetches exactly one track instead of trying languages one by one.
+
+The chosen track is downloaded straight from its URL over a shared
+keep-alive requests.Session and handed to the parser in memory - no
+yt-dlp download() and no .vtt file in the project directory. The compact
+json3/srv3 formats are preferred over VTT when the track offers them.
+"""
+
+from typing import Dict, List, Optional
+
+import requests
+
+from transcript import CAPTION_FORMATS
+
+
+# Preferred manual subtitle languages (after the video's own language)
+PREFERRED_SUBTITLE_LANGUAGES = [
+    'zh-Hans',  # Simplified Chinese
+    'zh-CN',    # China
+    'zh-TW',    # Taiwan
+    'zh',       # Generic Chinese
+    'en',       # English
+    'en-US',    # US English
+    'en-GB',    # UK English
+]
+
+# Preferred auto-generated caption languages
+PREFERRED_AUTO_LANGUAGES = ['zh-Hans', 'zh', 'en']
+
+# Tracks that are not captions
+_IGNORED_TRACKS = {'live_chat', 'rechat'}
+
+
+def _base_language(lang: str) -> str:
+    return lang.split('-')[0].lower()
+
+
+def _match_track(tracks: Dict, lang: str, allow_base: bool = True) -> Optional[str]:
+    """Exact track for lang, else (optionally) the first track with the same base language"""
+    if lang in tracks:
+        return lang
+    if allow_base:
+        base = _base_language(lang)
+        for name in tracks:
+            if _base_language(name) == base:
+                return name
+    return None
+
+
+def rank_caption_tracks(info: Dict,
+                        preferred: List[str] = PREFERRED_SUBTITLE_LANGUAGES,
+                        preferred_auto: List[str] = PREFERRED_AUTO_LANGUAGES) -> List[Dict]:
+    """
+    Rank the caption tracks available in a yt-dlp info dict
+
+    The video's language is info['language']; when yt-dlp has none, the
+    '<lang>-orig' auto track (YouTube's untranslated original) names it.
+
+    Order:
+    1. Manual track in the video's declared language
+    2. Original auto-generated track in the video's declared language
+    3. Manual tracks in `preferred` order
+    4. Auto-generated tracks in `preferred_auto` order
+    5. Any other manual track, then any original (untranslated) auto track
+
+    Returns:
+        List of {'lang', 'auto', 'formats'} dicts, best first (no duplicates)
+    """
+    manual = {k: v for k, v in (info.get('subtitles') or {}).items() if v and k not in _IGNORED_TRACKS}
+    auto = {k: v for k, v in (info.get('automatic_captions') or {}).items() if v and k not in _IGNORED_TRACKS}
+    declared = info.get('language')
+    if not declared:
+        # Without it, machine translations (e.g. zh-Hans) would beat the source track
+        declared = next((lang[:-len('-orig')] for lang in auto if lang.endswith('-orig')), None)
+
+    ranked: List[Dict] = []
+    seen = set()
+
+    def add(tracks: Dict, lang: Optional[str], is_auto: bool):
+        if lang and (lang, is_auto) not in seen:
+            seen.add((lang, is_auto))
+            ranked.append({'lang': lang, 'auto': is_auto, 'formats': tracks[lang]})
+
+    if declared:
+        add(manual, _match_track(manual, declared), False)
+        # YouTube lists the untranslated auto track as '<lang>-orig' next to machine translations
+        add(auto, _match_track(auto, f"{declared}-orig", allow_base=False) or _match_track(auto, declared, allow_base=False), True)
+
+    for lang in preferred:
+        add(manual, _match_track(manual, lang, allow_base=False), False)
+    for lang in preferred_auto:
+        add(auto, _match_track(auto, lang, allow_base=False), True)
+    for lang in manual:
+        add(manual, lang, False)
+    for lang in auto:
+        if lang.endswith('-orig'):
+            add(auto, lang, True)
+
+    return ranked
+
+
+def caption_url(track: Dict, ext: str = 'vtt') -> Optional[str]:
+    """URL of the track in the given format, if the info dict lists one"""
+    for fmt in track.get('formats') or []:
+        if fmt.get('ext') == ext and fmt.get('url'):
+            return fmt['url']
+    return None
+
+
+def preferred_caption_format(track: Dict, formats=CAPTION_FORMATS) -> Optional[str]:
+    """First of `formats` the track has a URL for"""
+    for ext in formats:
+        if caption_url(track, ext):
+            return ext
+    return None
+
+
+def fetch_caption(track: Dict, session: Optional[requests.Session] = None,
+                  ext: str = 'vtt', timeout: float = 30) -> Optional[str]:
+    """
+    Download one caption track into memory
+
+    Returns:
+        Caption file content, or None if the track has no URL in that format
+    """
+    url = caption_url(track, ext)
+    if not url:
+        return None
+
+    response = (session or requests).get(url, timeout=timeout)
+    response.raise_for_status()
+    # timedtext responses often omit the charset; captions are always UTF-8
+    response.encoding = 'utf-8'
+    return response.text
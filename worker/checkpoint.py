@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Durable per-project stage checkpoints
+
+Each completed stage of process_project stores its output in the
+`project_checkpoints` table (see
+supabase/migrations/20261016000004_project_checkpoints.sql), kept apart
+from `projects` so transcripts never ship with project rows:
+
+- metadata:   video_id / duration / title
+- transcript: parsed transcript text
+- analysis:   normalized analysis dict from analyze_content
+- images:     {section_order: storage path} of uploaded screenshots
+
+A retried project (lease reaped, manual reset) resumes at the first stage
+that is missing instead of re-downloading subtitles and re-running Gemini.
+The checkpoint is cleared once the project completes.
+"""
+
+import threading
+from typing import Any, Dict, Optional
+
+
+class ProjectCheckpoint:
+    """
+    Read/write access to one project's checkpoint
+    """
+
+    def __init__(self, supabase, project_id: str, data: Optional[Dict] = None):
+        self.supabase = supabase
+        self.project_id = project_id
+        self.data: Dict[str, Any] = dict(data or {})
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_project(cls, supabase, project: Dict) -> "ProjectCheckpoint":
+        """Load the checkpoint of a claimed project (empty when it has none)"""
+        response = supabase.table('project_checkpoints').select('data') \
+            .eq('project_id', project['id']).limit(1).execute()
+        data = response.data[0]['data'] if response.data else None
+        return cls(supabase, project['id'], data)
+
+    def has(self, stage: str) -> bool:
+        return self.data.get(stage) is not None
+
+    def get(self, stage: str, default: Any = None) -> Any:
+        return self.data.get(stage, default)
+
+    def save(self, **stages: Any):
+        """Persist one or more stages in a single update (other stages are kept)"""
+        with self._lock:
+            self.data.update(stages)
+        self.supabase.rpc('save_project_checkpoint', {
+            'p_project_id': self.project_id,
+            'p_stages': stages,
+        }).execute()
+        print(f"💾 Checkpoint saved: {', '.join(stages)}")
+
+    def save_image(self, section_order: int, image_path: str):
+        """Record one uploaded screenshot (patches only that key of images)"""
+        with self._lock:
+            images = dict(self.data.get('images') or {})
+            images[str(section_order)] = image_path
+            self.data['images'] = images
+        self.supabase.rpc('save_project_checkpoint_image', {
+            'p_project_id': self.project_id,
+            'p_section_order': str(section_order),
+            'p_image_path': image_path,
+        }).execute()
+
+    def image_for(self, section_order: int) -> Optional[str]:
+        return (self.get('images') or {}).get(str(section_order))
+
+    def clear(self):
+        """Drop all stages (project finished, or the next run starts from scratch)"""
+        with self._lock:
+            self.data = {}
+        self.supabase.table('project_checkpoints').delete().eq('project_id', self.project_id).execute()
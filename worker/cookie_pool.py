@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+YouTube cookie pool
+
+Cookies are decoded once at startup and kept in memory as one or more
+cookie jars. yt-dlp gets a fresh in-memory copy per call (`cookiefile`
+accepts a file object), so concurrent projects never share or rewrite a
+file on disk.
+
+Each jar tracks its recent outcomes. Bot checks ("Sign in to confirm
+you're not a bot") and invalid-cookie errors count against the jar that
+was used; other failures (private, age-gated or removed videos, network
+errors) do not. A jar that fails repeatedly is quarantined for a while and
+acquire() round-robins over the remaining healthy jars.
+
+Sources (all are loaded, in this order):
+1. YOUTUBE_COOKIES_B64 - one base64 cookies.txt, or several separated by commas
+2. YOUTUBE_COOKIES_B64_1, YOUTUBE_COOKIES_B64_2, ... - one jar each
+3. YOUTUBE_COOKIES - plain text cookies.txt
+4. YOUTUBE_COOKIES_DIR - every *.txt file in the directory
+5. /data/cookies.txt, /app/cookies.txt, worker/cookies.txt - first one found,
+   only when nothing above was configured
+"""
+
+import base64
+import io
+import os
+import re
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import List, Optional
+
+# Error fragments that mean YouTube rejected the session, not the video.
+# Kept narrow on purpose: private videos ("Sign in if you've been granted access")
+# and age gates ("Sign in to confirm your age ... --cookies for the authentication")
+# also mention signing in and cookies, but say nothing about the jar itself.
+BOT_CHECK_MARKERS = ('not a bot',)
+AUTH_ERROR_MARKERS = ('cookies are no longer valid', 'cookies have likely been rotated')
+
+DEFAULT_COOKIE_FILES = [
+    Path("/data/cookies.txt"),                # Zeabur persistent
+    Path("/app/cookies.txt"),                 # Container
+    Path(__file__).parent / "cookies.txt",    # Local development
+]
+
+
+def is_cookie_error(error) -> bool:
+    """True if a yt-dlp error is attributable to the cookies that were sent"""
+    message = str(error).lower()
+    return any(marker in message for marker in BOT_CHECK_MARKERS + AUTH_ERROR_MARKERS)
+
+
+def _looks_like_cookies_txt(content: str) -> bool:
+    first_line = content.lstrip().split('\n', 1)[0]
+    return first_line.startswith('# Netscape') or first_line.startswith('# HTTP Cookie File') or 'youtube.com' in content[:4096].lower()
+
+
+class CookieJar:
+    """
+    One cookies.txt held in memory, with a sliding window of outcomes
+    """
+
+    def __init__(self, name: str, content: str, window: int = 20):
+        self.name = name
+        self.content = content
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.bot_checks = 0
+        self.quarantined_until = 0.0
+
+    def cookiefile(self) -> io.StringIO:
+        """Fresh file object for yt-dlp's `cookiefile` option"""
+        return io.StringIO(self.content)
+
+    @property
+    def success_rate(self) -> float:
+        if not self.outcomes:
+            return 1.0
+        return sum(self.outcomes) / len(self.outcomes)
+
+    def is_quarantined(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) < self.quarantined_until
+
+
+class CookiePool:
+    """
+    Round-robin pool of cookie jars with health scoring and quarantine
+    """
+
+    def __init__(self, jars: List[CookieJar], quarantine_seconds: float = 900,
+                 max_consecutive_failures: int = 2, min_success_rate: float = 0.5,
+                 min_samples: int = 5):
+        self.jars = jars
+        self.quarantine_seconds = quarantine_seconds
+        self.max_consecutive_failures = max_consecutive_failures
+        self.min_success_rate = min_success_rate
+        self.min_samples = min_samples
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "CookiePool":
+        """Load every configured cookie source once"""
+        jars: List[CookieJar] = []
+
+        def add(name: str, content: str):
+            if not content.strip():
+                print(f"   ⚠️ Cookie source {name} is empty")
+            elif not _looks_like_cookies_txt(content):
+                print(f"   ⚠️ Cookie source {name} doesn't appear to be in Netscape format")
+                print(f"   💡 First line: {content.lstrip()[:50]}")
+            else:
+                jars.append(CookieJar(name, content))
+
+        def add_b64(name: str, value: str):
+            try:
+                # Decode as bytes first; cookies.txt may contain non-UTF8 values
+                add(name, base64.b64decode(value.strip()).decode('utf-8', errors='ignore'))
+            except Exception as e:
+                print(f"   ⚠️ Failed to decode {name}: {e}")
+                print(f"   💡 Tip: Ensure cookies are properly base64 encoded")
+
+        cookies_b64 = os.getenv("YOUTUBE_COOKIES_B64")
+        if cookies_b64:
+            values = [v for v in cookies_b64.split(',') if v.strip()]
+            for i, value in enumerate(values, 1):
+                add_b64("YOUTUBE_COOKIES_B64" + (f"[{i}]" if len(values) > 1 else ""), value)
+
+        numbered = [key for key in os.environ if re.fullmatch(r"YOUTUBE_COOKIES_B64_\d+", key)]
+        for key in sorted(numbered, key=lambda k: int(k.rsplit('_', 1)[1])):
+            add_b64(key, os.environ[key])
+
+        cookies_plain = os.getenv("YOUTUBE_COOKIES")
+        if cookies_plain:
+            add("YOUTUBE_COOKIES", cookies_plain)
+
+        cookies_dir = os.getenv("YOUTUBE_COOKIES_DIR")
+        if cookies_dir:
+            for path in sorted(Path(cookies_dir).glob("*.txt")):
+                add(str(path), path.read_text('utf-8', errors='ignore'))
+
+        if not jars:
+            for path in DEFAULT_COOKIE_FILES:
+                if path.exists() and path.stat().st_size > 0:
+                    add(str(path), path.read_text('utf-8', errors='ignore'))
+                    break
+
+        if jars:
+            print(f"🍪 Loaded {len(jars)} YouTube cookie jar(s): {', '.join(jar.name for jar in jars)}")
+        else:
+            print("⚠️ No YouTube cookies found (subtitle downloads may fail for restricted content)")
+        return cls(jars, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.jars)
+
+    def acquire(self, exclude: Optional[List[CookieJar]] = None) -> Optional[CookieJar]:
+        """
+        Next healthy jar in round-robin order
+
+        Returns:
+            A jar, or None if the pool is empty or every jar is quarantined
+            (the caller then goes without cookies)
+        """
+        now = time.time()
+        with self._lock:
+            for _ in range(len(self.jars)):
+                jar = self.jars[self._next % len(self.jars)]
+                self._next += 1
+                if not jar.is_quarantined(now) and jar not in (exclude or []):
+                    return jar
+        return None
+
+    def report_success(self, jar: Optional[CookieJar]):
+        if jar is None:
+            return
+        with self._lock:
+            jar.outcomes.append(True)
+            jar.consecutive_failures = 0
+
+    def report_failure(self, jar: Optional[CookieJar], error) -> bool:
+        """
+        Record a failed request made with jar
+
+        Only cookie-attributable errors (see is_cookie_error) lower the jar's
+        health. Returns True if the error was attributed to the jar.
+        """
+        if jar is None or not is_cookie_error(error):
+            return False
+        with self._lock:
+            jar.outcomes.append(False)
+            jar.consecutive_failures += 1
+            if any(marker in str(error).lower() for marker in BOT_CHECK_MARKERS):
+                jar.bot_checks += 1
+            unhealthy = (
+                jar.consecutive_failures >= self.max_consecutive_failures
+                or (len(jar.outcomes) >= self.min_samples and jar.success_rate < self.min_success_rate)
+            )
+            if unhealthy:
+                jar.quarantined_until = time.time() + self.quarantine_seconds
+                # Leave one failure on the books: after quarantine the jar gets a
+                # single probe request before it is quarantined again
+                jar.consecutive_failures = self.max_consecutive_failures - 1
+        if unhealthy:
+            print(f"   🚫 Cookie jar {jar.name} quarantined for {self.quarantine_seconds:.0f}s "
+                  f"(success rate {jar.success_rate:.0%}, {jar.bot_checks} bot check(s))")
+        return True
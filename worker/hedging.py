@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Hedged calls over an ordered list of fallbacks
+
+hedged_call() starts the first candidate and waits. The next candidate is
+started when the ones in flight have all failed (plain fallback) or when
+none of them has answered within hedge_after seconds (hedging), and the
+first successful result wins.
+
+Blocking calls (the Gemini SDK has no cancellation) cannot be interrupted,
+so fn gets a `cancelled` event that is set as soon as the call is settled.
+A loser should check it at its own safe points (before a retry, between
+stream chunks) and raise HedgeCancelled instead of spending more quota;
+its result is ignored either way. Candidates that were never started are
+not started.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+
+class HedgeCancelled(Exception):
+    """Raised by a call that stopped because the hedge was already settled"""
+
+
+def hedged_call(fn: Callable[[Any, threading.Event], Any], candidates: Sequence[Any],
+                hedge_after: Optional[float] = None,
+                answering: Optional[Callable[[], bool]] = None) -> Tuple[Any, Any]:
+    """
+    Call fn(candidate) for candidates in order, hedging slow calls
+
+    Args:
+        fn: Called as fn(candidate, cancelled); raises on failure. cancelled
+            is set once a winner is picked (or every candidate failed)
+        candidates: In order of preference
+        hedge_after: Seconds without an answer before the next candidate is
+            started alongside the ones in flight; None (or <= 0) only falls
+            back on failure
+        answering: Optional check for partial output (a streaming call);
+            while it returns True the deadline is pushed back instead of
+            hedging
+
+    Returns:
+        (result, candidate) of the first call that succeeded
+
+    Raises:
+        The exception of the last failed candidate when all of them fail
+    """
+    if not candidates:
+        raise ValueError("hedged_call needs at least one candidate")
+    if hedge_after is not None and hedge_after <= 0:
+        hedge_after = None
+
+    pool = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="hedge")
+    in_flight: Dict[Future, Any] = {}
+    remaining = list(candidates)
+    last_error: Optional[BaseException] = None
+    cancelled = threading.Event()
+
+    def launch():
+        candidate = remaining.pop(0)
+        in_flight[pool.submit(fn, candidate, cancelled)] = candidate
+        return time.monotonic()
+
+    try:
+        launched_at = launch()
+        while in_flight:
+            timeout = None
+            if remaining and hedge_after is not None:
+                timeout = max(0.0, launched_at + hedge_after - time.monotonic())
+            done, _ = wait(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                if answering is not None and answering():
+                    launched_at = time.monotonic()
+                    continue
+                print(f"   ⏱️ No answer after {hedge_after:g}s, hedging with {remaining[0]}")
+                launched_at = launch()
+                continue
+
+            for future in done:
+                candidate = in_flight.pop(future)
+                error = future.exception()
+                if error is None:
+                    if in_flight:
+                        print(f"   🏁 {candidate} answered first; ignoring {', '.join(map(str, in_flight.values()))}")
+                    return future.result(), candidate
+                last_error = error
+
+            if not in_flight and remaining:
+                launched_at = launch()
+    finally:
+        # Don't wait for the losers, but tell them to stop
+        cancelled.set()
+        pool.shutdown(wait=False)
+
+    raise last_error
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Bulk ingestion of a YouTube playlist or channel
+
+Expands the URL with flat extraction (one request per page of entries,
+no per-video extraction), creates one pending `projects` row per video
+in a single bulk insert, then prefetches full metadata and caption
+availability for every entry in parallel. The prefetch warms the local
+video metadata cache (see metadata_cache.py), so run this on the worker
+host or point VIDEO_METADATA_CACHE_PATH at a volume the worker shares.
+
+Usage:
+    python ingest_playlist.py <playlist-or-channel-url> --user <user_id>
+        [--mode text_only|text_with_images] [--limit N]
+        [--concurrency N] [--no-charge] [--no-prefetch]
+"""
+
+import argparse
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import yt_dlp
+from dotenv import load_dotenv
+from supabase import create_client
+
+from cookie_pool import CookiePool
+from metadata_cache import VideoMetadataCache
+
+# Flat price per video, same as app/api/projects/create/route.ts
+CREDITS_PER_VIDEO = 10
+
+# Flat playlist placeholders for videos we cannot process
+UNAVAILABLE_TITLES = {'[Private video]', '[Deleted video]'}
+
+# Channel URLs without a tab expand to their tabs (Videos, Shorts, Live), not to videos
+_CHANNEL_ROOT = re.compile(r"^https?://(www\.|m\.)?youtube\.com/(@[^/?#]+|channel/[^/?#]+|c/[^/?#]+|user/[^/?#]+)/?$")
+
+
+def normalize_collection_url(url: str) -> str:
+    """Point bare channel URLs at their Videos tab"""
+    url = url.strip()
+    if _CHANNEL_ROOT.match(url):
+        return url.rstrip('/') + '/videos'
+    return url
+
+
+def expand_playlist(url: str, cookie_pool: Optional[CookiePool] = None, limit: Optional[int] = None) -> Dict:
+    """
+    List the videos of a playlist or channel without extracting each one
+
+    Returns:
+        {'title': collection title, 'entries': [{'video_id', 'url', 'title', 'duration'}]}
+    """
+    ydl_opts = {
+        'extract_flat': 'in_playlist',
+        'skip_download': True,
+        'quiet': True,
+        'no_warnings': True,
+    }
+    if limit:
+        ydl_opts['playlistend'] = limit
+    cookie_jar = cookie_pool.acquire() if cookie_pool else None
+    if cookie_jar:
+        ydl_opts['cookiefile'] = cookie_jar.cookiefile()
+
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(normalize_collection_url(url), download=False)
+        if cookie_pool:
+            cookie_pool.report_success(cookie_jar)
+    except Exception as e:
+        if cookie_pool:
+            cookie_pool.report_failure(cookie_jar, e)
+        raise
+
+    entries = []
+    seen = set()
+    for entry in info.get('entries') or []:
+        video_id = entry.get('id') if entry else None
+        if not video_id or video_id in seen or entry.get('title') in UNAVAILABLE_TITLES:
+            continue
+        seen.add(video_id)
+        entries.append({
+            'video_id': video_id,
+            'url': f"https://www.youtube.com/watch?v={video_id}",
+            'title': entry.get('title'),
+            'duration': entry.get('duration'),
+        })
+
+    return {'title': info.get('title'), 'entries': entries}
+
+
+def create_projects(supabase, user_id: str, entries: List[Dict],
+                    generation_mode: str = 'text_with_images', charge: bool = True) -> List[Dict]:
+    """
+    Insert one pending project per entry in a single request
+
+    With charge=True every video costs CREDITS_PER_VIDEO, like the create API
+    route. The balance check, the inserts, the deduction and the
+    credits_history row run in one transaction (create_charged_projects, see
+    supabase/migrations/20261016000007_charged_project_import.sql), so a
+    failure leaves neither projects nor a charge behind.
+    """
+    rows = [{
+        'title': entry['title'],
+        'video_source_url': entry['url'],
+        'video_duration_seconds': int(entry['duration']) if entry.get('duration') else None,
+        'credits_cost': CREDITS_PER_VIDEO if charge else 0,
+        'generation_mode': generation_mode,
+    } for entry in entries]
+
+    if charge:
+        response = supabase.rpc('create_charged_projects', {
+            'p_user_id': user_id,
+            'p_projects': rows,
+            'p_description': f"Playlist import: {len(rows)} videos",
+        }).execute()
+        return response.data or []
+
+    rows = [dict(row, user_id=user_id, status='pending') for row in rows]
+    return supabase.table('projects').insert(rows).execute().data or []
+
+
+def prefetch_metadata(entries: List[Dict], metadata_cache: VideoMetadataCache,
+                      cookie_pool: Optional[CookiePool] = None, concurrency: int = 8) -> Dict[str, Optional[bool]]:
+    """
+    Extract full metadata for every entry in parallel and store it in the cache
+
+    Returns:
+        {video_id: True/False caption availability, None if extraction failed}
+    """
+    def fetch(entry: Dict) -> Optional[bool]:
+        cached = metadata_cache.get(entry['video_id'])
+        if cached is not None:
+            return bool(cached['subtitles'] or cached['automatic_captions'])
+
+        ydl_opts = {
+            'skip_download': True,
+            'quiet': True,
+            'no_warnings': True,
+        }
+        cookie_jar = cookie_pool.acquire() if cookie_pool else None
+        if cookie_jar:
+            ydl_opts['cookiefile'] = cookie_jar.cookiefile()
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(entry['url'], download=False)
+            if cookie_pool:
+                cookie_pool.report_success(cookie_jar)
+        except Exception as e:
+            if cookie_pool:
+                cookie_pool.report_failure(cookie_jar, e)
+            print(f"   ⚠️ Prefetch failed for {entry['video_id']}: {e}")
+            return None
+
+        slim = metadata_cache.put(info)
+        return bool(slim['subtitles'] or slim['automatic_captions'])
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="prefetch") as pool:
+        results = list(pool.map(fetch, entries))
+    return {entry['video_id']: result for entry, result in zip(entries, results)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue every video of a YouTube playlist or channel")
+    parser.add_argument('url', help="Playlist or channel URL")
+    parser.add_argument('--user', required=True, help="User id that owns the created projects")
+    parser.add_argument('--mode', default='text_with_images', choices=['text_only', 'text_with_images'])
+    parser.add_argument('--limit', type=int, default=None, help="Only the first N videos")
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv("INGEST_PREFETCH_CONCURRENCY", "8")),
+                        help="Parallel metadata prefetches")
+    parser.add_argument('--no-charge', action='store_true', help="Create free projects (credits_cost 0)")
+    parser.add_argument('--no-prefetch', action='store_true', help="Skip the metadata prefetch")
+    args = parser.parse_args()
+
+    load_dotenv()
+    supabase_url = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not supabase_url or not supabase_key:
+        print("❌ Error: Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY")
+        exit(1)
+    supabase = create_client(supabase_url, supabase_key)
+    cookie_pool = CookiePool.from_env()
+
+    print(f"📃 Expanding {args.url}")
+    collection = expand_playlist(args.url, cookie_pool, limit=args.limit)
+    entries = collection['entries']
+    if not entries:
+        print("❌ No videos found.")
+        exit(1)
+    print(f"   {collection['title']}: {len(entries)} videos")
+
+    created = create_projects(supabase, args.user, entries, args.mode, charge=not args.no_charge)
+    print(f"✅ Queued {len(created)} projects ({sum(row['credits_cost'] for row in created)} credits)")
+
+    if args.no_prefetch:
+        return
+
+    metadata_cache = VideoMetadataCache(
+        Path(os.getenv("VIDEO_METADATA_CACHE_PATH") or Path(tempfile.gettempdir()) / "vidoc_worker" / "video_metadata.sqlite3"),
+        ttl_seconds=float(os.getenv("VIDEO_METADATA_CACHE_TTL_SECONDS", str(3 * 3600))),
+        negative_ttl_seconds=float(os.getenv("VIDEO_METADATA_NEGATIVE_TTL_SECONDS", "3600")),
+    )
+    print(f"🔎 Prefetching metadata ({args.concurrency} at a time)...")
+    captions = prefetch_metadata(entries, metadata_cache, cookie_pool, concurrency=args.concurrency)
+    with_captions = sum(1 for v in captions.values() if v)
+    without = [video_id for video_id, v in captions.items() if v is False]
+    failed = [video_id for video_id, v in captions.items() if v is None]
+    print(f"✅ Prefetch done: {with_captions} with captions, {len(without)} without, {len(failed)} failed")
+    if without:
+        print(f"   ℹ️ No captions (Vision Mode fallback): {', '.join(without)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Push-based wakeup for the worker loop
+
+Instead of sleeping a fixed 5 seconds when the queue is empty, the worker
+waits on a notifier that fires as soon as a project becomes pending:
+
+- PostgresNotifier: LISTEN on the `projects_pending` channel fed by the
+  trigger in supabase/migrations/20261016000001_notify_pending_projects.sql
+- LocalNotifier: in-process stand-in, used for local runs and tests
+
+While a notifier is disconnected `is_connected` is False and the worker
+falls back to plain polling.
+"""
+
+import select
+import threading
+import time
+from typing import Optional
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+    PSYCOPG2_AVAILABLE = True
+except ImportError:
+    PSYCOPG2_AVAILABLE = False
+
+
+NOTIFY_CHANNEL = "projects_pending"
+
+
+class LocalNotifier:
+    """
+    In-process notifier: call notify() to wake a waiting worker
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.connected = True
+
+    @property
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self.connected = False
+        self._event.set()
+
+    def notify(self, payload: Optional[str] = None):
+        self._event.set()
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Block until notified or timeout expires
+
+        Returns:
+            True if woken by a notification
+        """
+        woken = self._event.wait(timeout)
+        self._event.clear()
+        return woken
+
+
+class PostgresNotifier(LocalNotifier):
+    """
+    LISTEN/NOTIFY notifier backed by a direct Postgres connection
+
+    A background thread keeps the LISTEN connection open and reconnects after
+    `reconnect_delay` seconds when it drops. Notifications are coalesced into a single wakeup.
+    """
+
+    def __init__(self, dsn: str, channel: str = NOTIFY_CHANNEL, reconnect_delay: float = 5.0):
+        super().__init__()
+        if not PSYCOPG2_AVAILABLE:
+            raise RuntimeError("psycopg2 is required for PostgresNotifier")
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.connected = False
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._listen_forever, name="pg-notifier", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        super().stop()
+
+    def _listen_forever(self):
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel};")
+                self.connected = True
+                print(f"📡 Listening for new projects on channel '{self.channel}'")
+                # Wake once after (re)connecting: inserts may have happened while we were down
+                self.notify()
+
+                while not self._stopping.is_set():
+                    readable, _, _ = select.select([conn], [], [], 30)
+                    if not readable:
+                        # Idle - cheap liveness check so a dead socket is detected
+                        with conn.cursor() as cur:
+                            cur.execute("SELECT 1")
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self.notify()
+            except Exception as e:
+                if not self._stopping.is_set():
+                    print(f"⚠️ Project notifier disconnected: {e} (falling back to polling)")
+            finally:
+                self.connected = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            if not self._stopping.is_set():
+                time.sleep(self.reconnect_delay)
+
+
+def create_notifier(dsn: Optional[str]) -> Optional[LocalNotifier]:
+    """
+    Build the notifier for this worker, or None to use plain polling
+    """
+    if not dsn:
+        print("ℹ️ No database DSN configured - using polling for new projects")
+        return None
+    if not PSYCOPG2_AVAILABLE:
+        print("⚠️ psycopg2 not available - using polling for new projects")
+        return None
+    return PostgresNotifier(dsn)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Project queue helpers for the worker
+
+Claims pending projects through the `claim_pending_projects` Postgres function
+(see supabase/migrations/20261016000000_worker_job_claiming.sql), which uses
+FOR UPDATE SKIP LOCKED so many workers can share one queue without ever
+picking up the same project twice.
+
+Claimed projects carry a lease (20261016000002_project_leases.sql).
+LeaseHeartbeat renews the leases of every project this worker is running;
+reap_expired_projects() re-queues projects whose worker stopped renewing.
+A project whose lease could not be renewed is flagged so the running job
+aborts instead of racing the worker that claims it next.
+"""
+
+import os
+import socket
+import threading
+from typing import Dict, List, Set
+
+
+class LeaseLost(Exception):
+    """The project was reaped or claimed by another worker while running"""
+
+
+class ProjectLease:
+    """Lease of one running project, flagged by LeaseHeartbeat once it is lost"""
+
+    def __init__(self, project_id: str):
+        self.project_id = project_id
+        self._lost = threading.Event()
+
+    @property
+    def lost(self) -> bool:
+        return self._lost.is_set()
+
+    def mark_lost(self):
+        self._lost.set()
+
+    def ensure(self):
+        """Raise LeaseLost when the project is no longer held by this worker"""
+        if self.lost:
+            raise LeaseLost(f"Lease for project {self.project_id} was lost")
+
+
+def default_worker_id() -> str:
+    """Worker id used to stamp claimed projects (WORKER_ID or host-pid)"""
+    return os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def claim_projects(
+    supabase,
+    worker_id: str,
+    limit: int = 1,
+    lease_seconds: int = 30,
+    max_per_user: int = 2,
+    seconds_per_credit: float = 1.0,
+) -> List[Dict]:
+    """
+    Atomically move up to `limit` pending projects to processing
+
+    Projects are picked by the fair scheduler in
+    20261016000003_fair_project_scheduling.sql: highest response ratio
+    (wait + estimated cost) / estimated cost first, so short videos overtake
+    long ones while long ones still age to the front, and no user holds more
+    than `max_per_user` processing projects.
+
+    Args:
+        supabase: Supabase client
+        worker_id: Id stored in projects.claimed_by
+        limit: Maximum number of projects to claim in this round trip
+        lease_seconds: Initial lease length; kept alive by LeaseHeartbeat
+        max_per_user: Per-user cap on concurrently processing projects (all workers)
+        seconds_per_credit: Estimated processing seconds per credit of cost
+
+    Returns:
+        The claimed project rows (already in 'processing' state)
+    """
+    if limit <= 0:
+        return []
+
+    response = supabase.rpc('claim_pending_projects', {
+        'p_worker_id': worker_id,
+        'p_limit': limit,
+        'p_lease_seconds': lease_seconds,
+        'p_max_per_user': max_per_user,
+        'p_seconds_per_credit': seconds_per_credit,
+    }).execute()
+
+    return response.data or []
+
+
+def renew_leases(supabase, worker_id: str, project_ids: List[str], lease_seconds: int = 30) -> Set[str]:
+    """
+    Extend the leases of projects still held by this worker
+
+    Returns:
+        Ids whose lease was renewed (missing ids were reaped or finished)
+    """
+    if not project_ids:
+        return set()
+
+    response = supabase.rpc('renew_project_leases', {
+        'p_worker_id': worker_id,
+        'p_project_ids': project_ids,
+        'p_lease_seconds': lease_seconds,
+    }).execute()
+
+    return {str(project_id) for project_id in (response.data or [])}
+
+
+def reap_expired_projects(supabase, max_attempts: int = 3) -> List[Dict]:
+    """
+    Re-queue projects whose lease expired (worker crashed or hung)
+
+    Projects that already used `max_attempts` claims are marked failed instead.
+
+    Returns:
+        Rows with project_id, new_status and attempts for every reaped project
+    """
+    response = supabase.rpc('reap_expired_projects', {
+        'p_max_attempts': max_attempts,
+    }).execute()
+
+    reaped = response.data or []
+    for row in reaped:
+        if row.get('new_status') == 'pending':
+            print(f"♻️  Re-queued stuck project {row.get('project_id')} (attempt {row.get('attempts')})")
+        else:
+            print(f"💀 Project {row.get('project_id')} failed after {row.get('attempts')} attempts")
+    return reaped
+
+
+class LeaseReaper:
+    """
+    Background thread that runs reap_expired_projects() every `interval` seconds
+
+    Kept off the claim loop so an idle worker can block on LISTEN/NOTIFY for
+    the full poll interval. Re-queued projects go back to 'pending', which
+    fires the notify trigger and wakes the workers that claim them.
+    """
+
+    def __init__(self, supabase, max_attempts: int = 3, interval: float = 15):
+        self.supabase = supabase
+        self.max_attempts = max_attempts
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._reap_forever, name="lease-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _reap_forever(self):
+        # Reap once right away: leases of a crashed predecessor may already be expired
+        while True:
+            try:
+                reap_expired_projects(self.supabase, self.max_attempts)
+            except Exception as e:
+                print(f"⚠️ Lease reaper failed: {e}")
+            if self._stopping.wait(self.interval):
+                return
+
+
+class LeaseHeartbeat:
+    """
+    Background thread that renews leases for all projects this worker is running
+
+    One heartbeat per worker process: projects register on start and
+    unregister when process_project returns. add() returns the ProjectLease
+    the job checks before writing results.
+    """
+
+    def __init__(self, supabase, worker_id: str, lease_seconds: int = 30, interval: float = 10):
+        self.supabase = supabase
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.interval = interval
+        self._held: Dict[str, ProjectLease] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def add(self, project_id: str) -> ProjectLease:
+        lease = ProjectLease(project_id)
+        with self._lock:
+            self._held[project_id] = lease
+        return lease
+
+    def remove(self, project_id: str):
+        with self._lock:
+            self._held.pop(project_id, None)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._beat_forever, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def beat(self):
+        """Renew all held leases once"""
+        with self._lock:
+            held = list(self._held)
+        if not held:
+            return
+        renewed = renew_leases(self.supabase, self.worker_id, held, self.lease_seconds)
+        lost = set(held) - renewed
+        for project_id in lost:
+            # Still registered here but no longer ours in the DB (reaped or finished concurrently):
+            # stop renewing and tell the running job to abort
+            with self._lock:
+                lease = self._held.pop(project_id, None)
+            if lease:
+                lease.mark_lost()
+            print(f"⚠️ Lease for project {project_id} could not be renewed - aborting it")
+
+    def _beat_forever(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.beat()
+            except Exception as e:
+                print(f"⚠️ Lease heartbeat failed: {e}")
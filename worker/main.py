@@ -11,17 +11,20 @@ Processes video projects by:
 
 import os
 import time
-import json
+import hashlib
 import tempfile
-import shutil
 import re
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional
 from dotenv import load_dotenv
 
 import yt_dlp
 from supabase import create_client, Client
 import requests
+from requests.adapters import HTTPAdapter
 import google.generativeai as genai
 
 # Optional imports for fallback methods (not needed for Storyboard)
@@ -36,6 +39,21 @@ except ImportError:
 
 # Import Storyboard extractor for lightweight screenshot extraction
 from storyboard_extractor import StoryboardExtractor
+from captions import rank_caption_tracks, fetch_caption, preferred_caption_format
+from transcript import Cue, CAPTION_FORMATS, iter_caption_cues, dedupe_rolling_cues, compact_transcript, estimate_tokens, split_transcript_windows, TranscriptWindow
+from metadata_cache import VideoMetadataCache
+from cookie_pool import CookiePool
+from job_queue import claim_projects, default_worker_id, LeaseReaper, LeaseHeartbeat, LeaseLost, ProjectLease
+from project_executor import ProjectExecutor
+from checkpoint import ProjectCheckpoint
+from singleflight import SingleFlight
+from analysis_cache import AnalysisCache
+from job_notifier import create_notifier
+from hedging import hedged_call, HedgeCancelled
+from analysis_schema import Analysis, AnalysisDecodeError, SectionStreamDecoder
+from section_stream import SectionPipeline, SectionRelay
+from prompt_cache import PromptCache
+from rate_limiter import create_rate_limiter, is_rate_limit_error, parse_rate_limits
 
 # Load environment variables
 load_dotenv()
@@ -45,22 +63,119 @@ SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL"
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 STORAGE_BUCKET = os.getenv("SUPABASE_STORAGE_BUCKET") or os.getenv("STORAGE_BUCKET", "guide_images")
 
+# Queue configuration
+WORKER_ID = default_worker_id()
+# Number of projects processed concurrently by this worker process
+WORKER_CONCURRENCY = max(1, int(os.getenv("WORKER_CONCURRENCY", "4")))
+# Lease settings: heartbeat renews every LEASE_SECONDS/3, reaper re-queues expired leases
+LEASE_SECONDS = int(os.getenv("WORKER_LEASE_SECONDS", "30"))
+REAPER_INTERVAL = float(os.getenv("WORKER_REAPER_INTERVAL", "15"))
+MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+# Fair scheduling: per-user cap on processing projects, cost estimate for short-job-first ordering
+MAX_PROJECTS_PER_USER = int(os.getenv("WORKER_MAX_PROJECTS_PER_USER", "2"))
+SECONDS_PER_CREDIT = float(os.getenv("WORKER_SECONDS_PER_CREDIT", "1.0"))
+# Direct Postgres connection used for LISTEN/NOTIFY wakeups (optional)
+WORKER_NOTIFY_DSN = os.getenv("SUPABASE_DB_URL") or os.getenv("DATABASE_URL")
+# Seconds between polls: POLL_INTERVAL without notifications, NOTIFY_POLL_INTERVAL as a safety net with them
+POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "5"))
+NOTIFY_POLL_INTERVAL = float(os.getenv("WORKER_NOTIFY_POLL_INTERVAL", "60"))
+
 # API Configuration - Google Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Gemini models, in order of preference
+GEMINI_MODELS = [
+    'gemini-2.5-pro',           # Best quality, supports YouTube URLs
+    'gemini-flash-latest',      # Faster, cheaper, also supports YouTube URLs
+]
+
+# Seconds without an answer before the next model is started in parallel (0 = only on failure)
+GEMINI_HEDGE_SECONDS = float(os.getenv("GEMINI_HEDGE_SECONDS", "60"))
+
+# Gemini quotas per model, "model=rpm:tpm,..." (unset = unlimited), shared by all workers
+# through GEMINI_RATE_LIMIT_BACKEND: sqlite (one host), postgres (SUPABASE_DB_URL) or memory
+GEMINI_RATE_LIMITS = parse_rate_limits(os.getenv("GEMINI_RATE_LIMITS", ""))
+GEMINI_RATE_LIMIT_BACKEND = os.getenv("GEMINI_RATE_LIMIT_BACKEND", "sqlite")
+# Longest wait for quota before falling back to the next model, and 429 retries per model
+GEMINI_RATE_LIMIT_MAX_WAIT = float(os.getenv("GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS", "120"))
+GEMINI_RATE_LIMIT_RETRIES = max(0, int(os.getenv("GEMINI_RATE_LIMIT_RETRIES", "2")))
+
+# Transcript sent to Gemini: token budget and [mm:ss] marker granularity
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "8000"))
+TRANSCRIPT_BLOCK_SECONDS = float(os.getenv("TRANSCRIPT_BLOCK_SECONDS", "30"))
+
+# Long videos (>= LONG_VIDEO_SECONDS) are analyzed as overlapping windows in parallel,
+# each with its own TRANSCRIPT_TOKEN_BUDGET, then merged by a cheap reduce call
+LONG_VIDEO_SECONDS = float(os.getenv("LONG_VIDEO_SECONDS", "2700"))
+LONG_VIDEO_WINDOW_SECONDS = float(os.getenv("LONG_VIDEO_WINDOW_SECONDS", "1200"))
+LONG_VIDEO_OVERLAP_SECONDS = float(os.getenv("LONG_VIDEO_OVERLAP_SECONDS", "60"))
+LONG_VIDEO_MAX_PARALLEL = max(1, int(os.getenv("LONG_VIDEO_MAX_PARALLEL", "4")))
+# Extra attempts for a failed window before it is left as a gap
+LONG_VIDEO_WINDOW_RETRIES = max(0, int(os.getenv("LONG_VIDEO_WINDOW_RETRIES", "1")))
+
+# YouTube cookie pool: quarantine for failing jars, jars tried per video on bot checks
+COOKIE_QUARANTINE_SECONDS = float(os.getenv("YOUTUBE_COOKIE_QUARANTINE_SECONDS", "900"))
+COOKIE_MAX_JARS_PER_VIDEO = max(1, int(os.getenv("YOUTUBE_COOKIE_MAX_JARS_PER_VIDEO", "2")))
+
+# Model for the cheap merge step of long-video analysis
+GEMINI_REDUCE_MODEL = os.getenv("GEMINI_REDUCE_MODEL", GEMINI_MODELS[-1])
+
+# Cross-project analysis cache TTL (0 disables the cache)
+ANALYSIS_CACHE_TTL_HOURS = float(os.getenv("ANALYSIS_CACHE_TTL_HOURS", "168"))
+
+# How long a system_configs prompt is served from memory before it is revalidated (0 = query every project)
+PROMPT_CACHE_TTL_SECONDS = float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "30"))
+
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
     print(f"🔌 Using Google Gemini API")
 else:
     print("⚠️ Warning: GEMINI_API_KEY not set - processing will fail")
 
-# Initialize Supabase client
+# Initialize Supabase client (shared by all concurrently running projects)
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# Shared keep-alive HTTP session for storyboard and other plain HTTP downloads
+http_session = requests.Session()
+_http_adapter = HTTPAdapter(
+    pool_connections=WORKER_CONCURRENCY * 2,
+    pool_maxsize=WORKER_CONCURRENCY * 4,
+)
+http_session.mount("https://", _http_adapter)
+http_session.mount("http://", _http_adapter)
+
+# YouTube cookies, decoded once and shared (in memory) by all projects
+youtube_cookies = CookiePool.from_env(quarantine_seconds=COOKIE_QUARANTINE_SECONDS)
+
+# Coalesces concurrent projects for the same video / mode / prompt version
+# (a leader's LeaseLost is its own: the waiting projects retry instead)
+guide_flight = SingleFlight(leader_only=(LeaseLost,))
+
+# Prompts from system_configs, revalidated in the background
+prompt_cache = PromptCache(supabase, ttl_seconds=PROMPT_CACHE_TTL_SECONDS)
+
+# Analysis results shared across projects and workers
+analysis_cache = AnalysisCache(supabase, ttl_seconds=ANALYSIS_CACHE_TTL_HOURS * 3600)
+
 # Create temp directory for processing
 TEMP_DIR = Path(tempfile.gettempdir()) / "vidoc_worker"
 TEMP_DIR.mkdir(exist_ok=True)
 
+# Per-video YouTube metadata (title, duration, caption tracks, storyboard spec)
+video_metadata_cache = VideoMetadataCache(
+    Path(os.getenv("VIDEO_METADATA_CACHE_PATH") or TEMP_DIR / "video_metadata.sqlite3"),
+    ttl_seconds=float(os.getenv("VIDEO_METADATA_CACHE_TTL_SECONDS", str(3 * 3600))),
+    negative_ttl_seconds=float(os.getenv("VIDEO_METADATA_NEGATIVE_TTL_SECONDS", "3600")),
+)
+
+# Gemini RPM/TPM buckets and 429 pauses, shared with the other workers
+gemini_rate_limiter = create_rate_limiter(
+    GEMINI_RATE_LIMIT_BACKEND, GEMINI_RATE_LIMITS,
+    path=Path(os.getenv("GEMINI_RATE_LIMIT_PATH") or TEMP_DIR / "gemini_rate_limits.sqlite3"),
+    dsn=WORKER_NOTIFY_DSN,
+    max_wait=GEMINI_RATE_LIMIT_MAX_WAIT,
+)
+
 
 def format_time(seconds: float) -> str:
     """Format seconds to HH:MM:SS"""
@@ -72,6 +187,16 @@ def format_time(seconds: float) -> str:
     return f"{minutes:02d}:{secs:02d}"
 
 
+def estimate_credits_cost(duration: float) -> int:
+    """
+    Credits charged for a video of the given duration (10 credits per started minute, min 10)
+
+    Also used as the job cost estimate by the fair scheduler in claim_pending_projects.
+    """
+    minutes = (duration + 59) // 60  # Round up
+    return max(10, int(minutes * 10))
+
+
 def get_dynamic_prompt(default_prompt: str, prompt_key: str = 'gemini_video_prompt') -> str:
     """
     从数据库获取最新的 Prompt，如果获取失败则返回默认的硬编码 Prompt
@@ -83,92 +208,8 @@ def get_dynamic_prompt(default_prompt: str, prompt_key: str = 'gemini_video_prom
     Returns:
         Prompt 内容字符串
     """
-    try:
-        # 从 system_configs 表获取 Prompt
-        response = supabase.table('system_configs').select('value').eq('key', prompt_key).single().execute()
-        if response.data and response.data.get('value'):
-            print(f"✨ Loaded dynamic prompt from DB: {prompt_key}")
-            return response.data['value']
-    except Exception as e:
-        print(f"⚠️  Failed to load dynamic prompt (key: {prompt_key}), using default. Error: {e}")
-    
-    return default_prompt
-
-
-def get_youtube_cookies_path() -> Optional[str]:
-    """
-    Get YouTube cookies file path from environment or filesystem.
-    
-    Priority:
-    1. YOUTUBE_COOKIES_B64 (decode to temp file)
-    2. YOUTUBE_COOKIES (write to temp file)
-    3. /data/cookies.txt (Zeabur persistent)
-    4. /app/cookies.txt (container)
-    5. cookies.txt (local development)
-    
-    Returns:
-        Path to cookies file, or None if not found
-    """
-    import base64
-    import tempfile
-    
-    # Option 1: Base64 encoded cookies (recommended for production)
-    cookies_b64 = os.getenv("YOUTUBE_COOKIES_B64")
-    if cookies_b64:
-        try:
-            # Decode base64 to binary (cookies file can be binary)
-            cookies_binary = base64.b64decode(cookies_b64)
-            temp_file = Path(tempfile.gettempdir()) / "youtube_cookies.txt"
-            # Write as binary to preserve any non-UTF8 characters
-            temp_file.write_bytes(cookies_binary)
-            
-            # Validate cookie file
-            if temp_file.stat().st_size == 0:
-                print(f"   ⚠️ Cookie file is empty after decoding")
-                return None
-            
-            # Check if it's a valid Netscape format (starts with # Netscape)
-            try:
-                first_line = temp_file.read_text('utf-8', errors='ignore').split('\n')[0]
-                if first_line.startswith('# Netscape') or 'youtube.com' in first_line.lower():
-                    print(f"   🍪 Using cookies from YOUTUBE_COOKIES_B64 (decoded to {temp_file}, {temp_file.stat().st_size} bytes)")
-                    return str(temp_file)
-                else:
-                    print(f"   ⚠️ Cookie file doesn't appear to be in Netscape format")
-                    print(f"   💡 First line: {first_line[:50]}")
-            except:
-                # If we can't read as text, assume it's binary format (OK)
-                print(f"   🍪 Using cookies from YOUTUBE_COOKIES_B64 (decoded to {temp_file}, {temp_file.stat().st_size} bytes)")
-                return str(temp_file)
-                
-        except Exception as e:
-            print(f"   ⚠️ Failed to decode YOUTUBE_COOKIES_B64: {e}")
-            print(f"   💡 Tip: Ensure cookies are properly base64 encoded")
-            import traceback
-            print(f"   Full error: {traceback.format_exc()}")
-    
-    # Option 2: Plain text environment variable
-    cookies_plain = os.getenv("YOUTUBE_COOKIES")
-    if cookies_plain:
-        temp_file = Path(tempfile.gettempdir()) / "youtube_cookies.txt"
-        temp_file.write_text(cookies_plain)
-        print(f"   🍪 Using cookies from YOUTUBE_COOKIES (written to {temp_file})")
-        return str(temp_file)
-    
-    # Option 3-5: File-based cookies (check priority order)
-    cookie_paths = [
-        Path("/data/cookies.txt"),      # Zeabur persistent
-        Path("/app/cookies.txt"),        # Container
-        Path(__file__).parent / "cookies.txt"  # Local development
-    ]
-    
-    for path in cookie_paths:
-        if path.exists() and path.stat().st_size > 0:
-            print(f"   🍪 Using cookies from: {path}")
-            return str(path)
-    
-    print("   ⚠️ No YouTube cookies found (subtitle downloads may fail for restricted content)")
-    return None
+    # 内存缓存 PROMPT_CACHE_TTL_SECONDS 秒，过期后在后台按 updated_at 刷新（见 prompt_cache.py）
+    return prompt_cache.get(prompt_key, default_prompt)
 
 
 def download_subtitles_only(url: str, output_path: Path) -> Dict:
@@ -177,6 +218,9 @@ def download_subtitles_only(url: str, output_path: Path) -> Dict:
     
     NO VIDEO DOWNLOAD - Storyboard-only mode
     
+    The video is extracted once; subtitle downloads and the storyboard stage
+    reuse the returned `info` dict instead of asking YouTube again.
+    
     Returns:
         Dict with subtitle info and video metadata
     """
@@ -187,94 +231,75 @@ def download_subtitles_only(url: str, output_path: Path) -> Dict:
     subtitle_path = None
     title = ""
     
-    # Get cookies path once (will be used for all yt-dlp calls)
-    cookies_path = get_youtube_cookies_path()
+    # Metadata cache: a hit skips extract_info below
+    info = video_metadata_cache.get(extract_video_id(url))
+    info_from_cache = info is not None
     
-    # First, get video metadata (without downloading video)
-    # Retry logic: Try with cookies first, then without cookies if failed
-    
-    info = None
-    metadata_error = None
-    
-    # Attempt 1: With cookies (if available)
-    if cookies_path:
-        print(f"   ℹ️ Attempting metadata extraction WITH cookies...")
-        print(f"   📁 Cookie file: {cookies_path}")
-        
-        # Enhanced options for YouTube access with cookies
+    # First, get video metadata (without downloading video).
+    # Cookies come from the pool: a bot check or auth error is retried with
+    # another healthy jar (up to COOKIE_MAX_JARS_PER_VIDEO jars); without any
+    # healthy jar we go anonymous.
+    tried_jars = []
+    cookie_jar = None if info else youtube_cookies.acquire()
+    while not info:
         ydl_opts_info = {
             'skip_download': True,
             'quiet': True,
             'no_warnings': True,
-            'cookiefile': cookies_path,
             'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            # Add retry options
-            'retries': 3,
-            'fragment_retries': 3,
-            # Try to bypass age verification
-            'age_limit': None,
-            # Additional headers
-            'http_headers': {
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-us,en;q=0.5',
-                'Accept-Encoding': 'gzip,deflate',
-                'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.7',
-                'Keep-Alive': '300',
-                'Connection': 'keep-alive',
-            },
         }
+        if cookie_jar:
+            print(f"   ℹ️ Attempting metadata extraction WITH cookies ({cookie_jar.name})...")
+            ydl_opts_info.update({
+                'cookiefile': cookie_jar.cookiefile(),
+                # Add retry options
+                'retries': 3,
+                'fragment_retries': 3,
+                # Try to bypass age verification
+                'age_limit': None,
+                # Additional headers
+                'http_headers': {
+                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                    'Accept-Language': 'en-us,en;q=0.5',
+                    'Accept-Encoding': 'gzip,deflate',
+                    'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.7',
+                    'Keep-Alive': '300',
+                    'Connection': 'keep-alive',
+                },
+            })
+        else:
+            print(f"   ℹ️ Attempting metadata extraction WITHOUT cookies...")
         
         try:
             with yt_dlp.YoutubeDL(ydl_opts_info) as ydl:
                 info = ydl.extract_info(url, download=False)
-                print("   ✅ Metadata extracted successfully with cookies")
+            youtube_cookies.report_success(cookie_jar)
+            print("   ✅ Metadata extracted successfully" + (" with cookies" if cookie_jar else " WITHOUT cookies"))
         except Exception as e:
             error_msg = str(e)
-            print(f"   ⚠️ Metadata extraction with cookies failed: {error_msg}")
+            print(f"   ❌ Metadata extraction failed: {error_msg}")
             
-            # Check cookie-specific errors
-            if 'cookie' in error_msg.lower() or 'authentication' in error_msg.lower():
-                print(f"   ⚠️ Cookie authentication failed - cookies may be expired or invalid")
-                print(f"   💡 Try re-exporting cookies from your browser")
-            elif 'bot' in error_msg.lower() or 'sign in' in error_msg.lower():
-                print(f"   ⚠️ YouTube still requires verification even with cookies")
-                print(f"   💡 Cookies may need to be refreshed or video requires login")
-            
-            metadata_error = e
-
-    # Attempt 2: Without cookies (if attempt 1 failed or no cookies)
-    if not info:
-        print(f"   ℹ️ Attempting metadata extraction WITHOUT cookies...")
-        # Common yt-dlp options to help with YouTube access
-        yt_dlp_base_opts = {
-            'skip_download': True,
-            'quiet': True,
-            'no_warnings': True,
-            # Try to use a different user agent
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        }
-        
-        ydl_opts_info_no_cookies = yt_dlp_base_opts.copy()
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts_info_no_cookies) as ydl:
-                info = ydl.extract_info(url, download=False)
-                print("   ✅ Metadata extracted successfully WITHOUT cookies")
-        except Exception as e:
-            error_msg = str(e)
-            print(f"   ❌ Metadata extraction failed without cookies: {error_msg}")
+            if youtube_cookies.report_failure(cookie_jar, e):
+                tried_jars.append(cookie_jar)
+                next_jar = youtube_cookies.acquire(exclude=tried_jars) if len(tried_jars) < COOKIE_MAX_JARS_PER_VIDEO else None
+                if next_jar:
+                    print(f"   🔁 Retrying with another cookie jar")
+                    cookie_jar = next_jar
+                    continue
             
             # Check if it's a bot verification error
             if 'bot' in error_msg.lower() or 'sign in' in error_msg.lower():
                 print(f"\n   ⚠️ YouTube is requiring bot verification")
                 print(f"   💡 Solutions:")
-                print(f"      1. Configure YOUTUBE_COOKIES_B64 with valid cookies")
+                print(f"      1. Configure YOUTUBE_COOKIES_B64 with valid cookies (several jars spread the load)")
                 print(f"      2. Export cookies from browser using yt-dlp instructions")
                 print(f"      3. Wait a few minutes and try again (rate limiting)")
                 print(f"      4. Try a different video that doesn't require verification")
-            
-            # If both failed, raise the last error
-            raise metadata_error or e
+            raise
 
+    if info and not info_from_cache:
+        video_metadata_cache.put(info)
+    
     if info:
         video_id = info.get('id')
         duration = info.get('duration', 0)
@@ -287,137 +312,196 @@ def download_subtitles_only(url: str, output_path: Path) -> Dict:
     print(f"   Duration: {format_time(duration)}")
     print(f"   Title: {title[:50]}..." if len(title) > 50 else f"   Title: {title}")
     
-    # Download subtitles (with retry and fallback)
-    # Priority: Chinese first (for Chinese videos), then English
-    subtitle_languages = [
-        'zh-Hans',  # Simplified Chinese
-        'zh-CN',    # China
-        'zh-TW',    # Taiwan
-        'zh',       # Generic Chinese
-        'en',       # English
-        'en-US',    # US English
-        'en-GB',    # UK English
-    ]
-    
-    for lang in subtitle_languages:
+    # Download subtitles: rank the tracks the info dict already lists
+    # (video's own language first, then our preference list) and fetch only
+    # the best one. Later candidates are tried only if that download fails.
+    caption_tracks = rank_caption_tracks(info)
+    if caption_tracks:
+        print(f"   📋 Caption tracks: {', '.join(t['lang'] + (' (auto)' if t['auto'] else '') for t in caption_tracks[:5])}")
+    subtitle_lang = None
+    subtitle_auto = False
+    
+    subtitle_text = None
+    subtitle_format = None
+    
+    for track in caption_tracks:
+        lang = track['lang']
+        kind = "auto-generated" if track['auto'] else "manual"
+        
+        # Fast path: fetch the track URL into memory over the shared keep-alive session
+        # (json3/srv3 when offered: exact word timing, no rolling repetition)
         try:
-            print(f"   Trying to download {lang} subtitles...")
+            track_format = preferred_caption_format(track)
+            subtitle_text = fetch_caption(track, http_session, ext=track_format) if track_format else None
+            if subtitle_text:
+                subtitle_lang = lang
+                subtitle_auto = track['auto']
+                subtitle_format = track_format
+                print(f"   ✅ Fetched {kind} {lang} {track_format} subtitles in memory ({len(subtitle_text)} chars)")
+                break
+        except Exception as e:
+            print(f"   ⚠️  Direct fetch of {kind} {lang} subtitles failed: {e} (falling back to yt-dlp)")
+            if info_from_cache:
+                # Signed caption URLs may have expired - drop the cached entry
+                video_metadata_cache.invalidate(video_id)
+        
+        try:
+            print(f"   Downloading {kind} {lang} subtitles...")
             ydl_opts_subs = {
-                'writesubtitles': True,
-                'writeautomaticsub': True,
+                'writesubtitles': not track['auto'],
+                'writeautomaticsub': track['auto'],
                 'subtitleslangs': [lang],
+                'subtitlesformat': '/'.join(CAPTION_FORMATS),
                 'skip_download': True,  # Don't download video
                 'outtmpl': str(output_path / '%(id)s'),
                 'quiet': True,
                 'no_warnings': True,
                 'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             }
-            if cookies_path:
-                ydl_opts_subs['cookiefile'] = cookies_path
+            if cookie_jar is None and info_from_cache:
+                cookie_jar = youtube_cookies.acquire()
+            if cookie_jar:
+                ydl_opts_subs['cookiefile'] = cookie_jar.cookiefile()
             
             with yt_dlp.YoutubeDL(ydl_opts_subs) as ydl:
-                ydl.download([url])
+                if info_from_cache:
+                    # Cached info is slim (no video formats) - let yt-dlp extract again
+                    ydl.download([url])
+                else:
+                    # Reuse the extracted info instead of ydl.download(), which re-extracts
+                    ydl.process_ie_result(dict(info), download=True)
             
             # Check if subtitle was downloaded
-            for file in output_path.glob(f"{video_id}.{lang}*.vtt"):
-                subtitle_path = file
-                print(f"   ✅ Found subtitle: {file.name}")
-                break
+            for ext in CAPTION_FORMATS:
+                for file in output_path.glob(f"{video_id}.{lang}*.{ext}"):
+                    subtitle_path = file
+                    subtitle_lang = lang
+                    subtitle_auto = track['auto']
+                    subtitle_format = ext
+                    print(f"   ✅ Found {kind} subtitle: {file.name}")
+                    break
+                if subtitle_path:
+                    break
             
             if subtitle_path:
                 break
                 
         except Exception as e:
-            print(f"   ⚠️  Failed to download {lang} subtitles: {e}")
+            print(f"   ⚠️  Failed to download {kind} {lang} subtitles: {e}")
+            youtube_cookies.report_failure(cookie_jar, e)
             continue
     
-    # If no manual subtitles, try auto-generated (try multiple languages)
-    if not subtitle_path:
-        print("   ⚠️ No manual subtitles found, trying auto-generated...")
-        auto_langs = ['zh-Hans', 'zh', 'en']  # Priority languages for auto-generated
-        
-        for auto_lang in auto_langs:
-            try:
-                print(f"   Trying auto-generated {auto_lang} subtitles...")
-                ydl_opts_auto = {
-                    'writeautomaticsub': True,
-                    'subtitleslangs': [auto_lang],
-                    'skip_download': True,
-                    'outtmpl': str(output_path / '%(id)s'),
-                    'quiet': True,
-                    'no_warnings': True,
-                    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                }
-                if cookies_path:
-                    ydl_opts_auto['cookiefile'] = cookies_path
-                
-                with yt_dlp.YoutubeDL(ydl_opts_auto) as ydl:
-                    ydl.download([url])
-                
-                # Check for any .vtt file
-                for file in output_path.glob(f"{video_id}.*.vtt"):
-                    subtitle_path = file
-                    print(f"   ✅ Found auto-generated subtitle: {file.name}")
-                    break
-                
-                if subtitle_path:
-                    break
-                    
-            except Exception as e:
-                print(f"   ⚠️ Auto-generated {auto_lang} subtitle failed: {e}")
-                continue
-    
-    if not subtitle_path:
+    if not subtitle_path and not subtitle_text:
         print("   ⚠️ No subtitles found. Proceeding to Vision Mode fallback.")
         # Do NOT raise exception - return metadata only so we can fallback to Vision Mode
         pass
             
     return {
         'subtitle_path': subtitle_path,
+        'subtitle_text': subtitle_text,
+        'subtitle_format': subtitle_format,
         'duration': duration,
         'title': title,
         'video_id': video_id,
+        'subtitle_lang': subtitle_lang,
+        'subtitle_auto': subtitle_auto,
+        # Raw yt-dlp info dict, shared with the storyboard stage (one extraction per project)
+        'info': info,
     }
 
 
-def parse_vtt_to_text(vtt_path: Optional[Path]) -> str:
+def transcript_token_budget(duration: float) -> int:
+    """
+    Transcript token budget for a video
+    
+    Long videos are analyzed one window at a time, so each window gets the
+    full TRANSCRIPT_TOKEN_BUDGET.
+    """
+    if duration >= LONG_VIDEO_SECONDS:
+        return TRANSCRIPT_TOKEN_BUDGET * (int(duration // LONG_VIDEO_WINDOW_SECONDS) + 1)
+    return TRANSCRIPT_TOKEN_BUDGET
+
+
+def parse_vtt_to_text(vtt_path: Optional[Path], token_budget: Optional[int] = None, auto: bool = False) -> str:
     """
-    Parse VTT subtitle file to plain text
+    Parse a subtitle file (VTT, or json3/srv3 by file extension) to plain text
+    
+    The file is streamed cue by cue, never read into memory as a whole.
+    auto marks an auto-generated track (see cues_to_text).
     
     Returns:
-        Cleaned transcript text (limited to 25000 chars to avoid token limits)
+        Timestamped transcript text, compacted to TRANSCRIPT_TOKEN_BUDGET tokens
     """
     if not vtt_path or not vtt_path.exists():
         print("⚠️  No subtitle file to parse.")
         return ""
     
-    text_content = []
-    seen_lines = set()
+    subtitle_format = vtt_path.suffix.lstrip('.')
+    if subtitle_format not in CAPTION_FORMATS:
+        subtitle_format = 'vtt'
     try:
-        with open(vtt_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            for line in lines:
-                # Filter out timecodes, WEBVTT header, empty lines, and sequence numbers
-                if '-->' in line or line.strip() == '' or line.startswith('WEBVTT') or line.strip().isdigit():
-                    continue
-                # Remove HTML tags like <c>...</c>
-                clean_line = re.sub(r'<[^>]+>', '', line.strip())
-                # Deduplicate (subtitles often have repeated lines)
-                if clean_line and clean_line not in seen_lines:
-                    text_content.append(clean_line)
-                    seen_lines.add(clean_line)
-        
-        full_text = " ".join(text_content)
-        print(f"✅ Extracted transcript length: {len(full_text)} chars")
-        # Limit length to prevent token overflow
-        if len(full_text) > 25000:
-            full_text = full_text[:25000] + "..."
-        return full_text
+        # srv3 is XML and parsed from bytes
+        with open(vtt_path, 'rb') if subtitle_format == 'srv3' else open(vtt_path, 'r', encoding='utf-8') as f:
+            return cues_to_text(iter_caption_cues(f, subtitle_format), token_budget,
+                                rolling=auto and subtitle_format == 'vtt')
+    except Exception as e:
+        print(f"❌ Error parsing {subtitle_format} subtitles: {e}")
+        return ""
+
+
+def parse_vtt_content(vtt_content: str, token_budget: Optional[int] = None, auto: bool = False) -> str:
+    """
+    Parse VTT subtitle content (already in memory) to plain text
+    
+    Returns:
+        Timestamped transcript text, compacted to TRANSCRIPT_TOKEN_BUDGET tokens
+    """
+    return parse_subtitle_content(vtt_content, 'vtt', token_budget, auto)
+
+
+def parse_subtitle_content(content: str, subtitle_format: str = 'vtt', token_budget: Optional[int] = None,
+                           auto: bool = False) -> str:
+    """
+    Parse subtitle content in any of CAPTION_FORMATS (already in memory) to plain text
+    
+    auto marks an auto-generated track (see cues_to_text).
+    
+    Returns:
+        Timestamped transcript text, compacted to TRANSCRIPT_TOKEN_BUDGET tokens
+    """
+    try:
+        return cues_to_text(iter_caption_cues(content, subtitle_format), token_budget,
+                            rolling=auto and subtitle_format == 'vtt')
     except Exception as e:
-        print(f"❌ Error parsing VTT: {e}")
+        print(f"❌ Error parsing {subtitle_format} subtitles: {e}")
         return ""
 
 
+def cues_to_text(cues: Iterable[Cue], token_budget: Optional[int] = None, rolling: bool = True) -> str:
+    """
+    Join parsed cues into transcript text
+    
+    For auto-generated VTT (rolling=True) the rolling caption repetition is
+    merged away first (see transcript.dedupe_rolling_cues); manual tracks
+    keep lines that are really repeated, and json3/srv3 cues never repeat.
+    
+    Each ~TRANSCRIPT_BLOCK_SECONDS block starts with a [mm:ss] marker, and
+    long transcripts are thinned evenly over the whole video to fit the
+    token budget (TRANSCRIPT_TOKEN_BUDGET unless given, see
+    transcript_token_budget) instead of losing their ending.
+    
+    Returns:
+        Timestamped transcript text, compacted to the token budget
+    """
+    full_text = compact_transcript(
+        dedupe_rolling_cues(cues) if rolling else cues,
+        token_budget=token_budget or TRANSCRIPT_TOKEN_BUDGET,
+        block_seconds=TRANSCRIPT_BLOCK_SECONDS,
+    )
+    print(f"✅ Extracted transcript length: {len(full_text)} chars (~{estimate_tokens(full_text)} tokens)")
+    return full_text
+
+
 # REMOVED: extract_smart_screenshot() - no longer needed in Storyboard-only mode
 # This function required cv2/OpenCV which we've eliminated
 # All screenshots now use StoryboardExtractor instead
@@ -527,6 +611,31 @@ def upload_to_supabase_storage(file_path: Path, project_id: str, step_order: int
         raise
 
 
+def adopt_image(image_path: str, project_id: str, step_order: int) -> str:
+    """
+    Storage path of a screenshot inside this project's own folder
+
+    Cache hits and coalesced projects reuse screenshots uploaded by another
+    project; they are copied server-side so each project owns its images.
+    Falls back to the shared path if the copy fails.
+    """
+    storage_path = f"projects/{project_id}/step_{step_order}.jpg"
+    if image_path == storage_path:
+        return image_path
+    try:
+        bucket = supabase.storage.from_(STORAGE_BUCKET)
+        try:
+            # A retried project may already have a copy
+            bucket.remove([storage_path])
+        except Exception:
+            pass
+        bucket.copy(image_path, storage_path)
+        return storage_path
+    except Exception as e:
+        print(f"   ⚠️ Could not copy {image_path} into project {project_id}: {e}")
+        return image_path
+
+
 def save_step_to_db(project_id: str, step_data: Dict, image_path: Optional[str]):
     """Save step/section to database"""
     try:
@@ -562,58 +671,8 @@ def save_step_to_db(project_id: str, step_data: Dict, image_path: Optional[str])
         raise
 
 
-def analyze_content(video_path: Path, subtitle_path: Optional[Path], video_url: str, duration: float, generation_mode: str = 'text_with_images') -> Dict:
-    """
-    Analyze video content using Gemini AI
-    
-    Strategy:
-    1. Priority: Use transcript/subtitles if available (faster, more reliable)
-    2. Fallback: Upload video directly to Gemini (slower, may fail for large videos)
-    
-    Returns:
-        Dict with:
-        - summary: overall video summary
-        - sections: List of section dictionaries with content and screenshot flags
-    """
-    
-    # 1. Try to get transcript first (preferred method)
-    print(f"📄 Attempting to parse subtitles from: {subtitle_path}")
-    transcript_text = parse_vtt_to_text(subtitle_path)
-    
-    if transcript_text:
-        print(f"✅ Successfully parsed transcript: {len(transcript_text)} characters")
-    else:
-        print(f"⚠️ No transcript text extracted from subtitle file")
-        if subtitle_path:
-            print(f"   Subtitle path provided: {subtitle_path}")
-            if isinstance(subtitle_path, Path) and subtitle_path.exists():
-                print(f"   File exists but parsing failed or file is empty")
-            elif isinstance(subtitle_path, Path):
-                print(f"   File does not exist: {subtitle_path}")
-    
-    # 2. Whisper Fallback (only if video_path is available)
-    if not transcript_text and video_path is not None:
-        print("⚠️ No VTT subtitles found. Attempting Whisper transcription...")
-        try:
-            # Find audio file (usually same name as video but m4a)
-            audio_candidates = list(video_path.parent.glob(f"{video_path.stem}*.m4a"))
-            if not audio_candidates:
-                # Try extracting audio if not found? 
-                # For now, just assume yt-dlp downloaded it or the video file itself can be sent (if small enough)
-                # Sending large video file to whisper size limit is 25MB usually.
-                print("   ⚠️ No audio file found for Whisper transcription")
-            else:
-                audio_path = audio_candidates[0]
-                transcript_text = transcribe_with_whisper(audio_path)
-                if transcript_text:
-                    print("✅ Whisper transcription successful!")
-        except Exception as e:
-            print(f"   ⚠️ Whisper fallback failed: {e}")
-            # Continue to Vision Mode fallback
-    
-    has_transcript = bool(transcript_text)
-    
-    # 2. Get prompt template (adjust based on generation mode)
+def get_default_prompt_template(generation_mode: str) -> str:
+    """Hard-coded prompt template for a generation mode (fallback for system_configs)"""
     if generation_mode == 'text_only':
         default_prompt_template = """
         You are an expert technical writer. Convert this video transcript into a structured, engaging blog post.
@@ -719,7 +778,90 @@ def analyze_content(video_path: Path, subtitle_path: Optional[Path], video_url:
         Return ONLY valid JSON, no markdown formatting (except inside the summary string), no code blocks.
         """
     
-    prompt_template = get_dynamic_prompt(default_prompt_template, 'gemini_video_prompt')
+    return default_prompt_template
+
+
+def get_prompt_template(generation_mode: str) -> str:
+    """Prompt template for a generation mode, from system_configs when available"""
+    return get_dynamic_prompt(get_default_prompt_template(generation_mode), 'gemini_video_prompt')
+
+
+@lru_cache(maxsize=16)
+def prompt_version(prompt_template: str) -> str:
+    """
+    Short content hash of a prompt template (used in coalescing/cache keys
+    and logged per project; memoized, templates only change with system_configs)
+    
+    The transcript and long-video settings are part of the hash: changing
+    them sends Gemini a different transcript.
+    """
+    key = (
+        f"{prompt_template}\x00transcript:{TRANSCRIPT_TOKEN_BUDGET}:{TRANSCRIPT_BLOCK_SECONDS:g}"
+        f"\x00long:{LONG_VIDEO_SECONDS:g}:{LONG_VIDEO_WINDOW_SECONDS:g}:{LONG_VIDEO_OVERLAP_SECONDS:g}"
+    )
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]
+
+
+def analyze_content(video_path: Path, subtitle_path: Optional[Path], video_url: str, duration: float, generation_mode: str = 'text_with_images', transcript_text: Optional[str] = None, prompt_template: Optional[str] = None,
+                    on_section: Optional[Callable[[Dict], None]] = None, on_reset: Optional[Callable[[], None]] = None) -> Dict:
+    """
+    Analyze video content using Gemini AI
+    
+    Strategy:
+    1. Priority: Use transcript/subtitles if available (faster, more reliable)
+    2. Fallback: Upload video directly to Gemini (slower, may fail for large videos)
+    
+    on_section/on_reset: see generate_analysis (not used for long videos,
+    whose sections are only known once all windows are merged)
+    
+    Returns:
+        Dict with:
+        - summary: overall video summary
+        - sections: List of section dictionaries with content and screenshot flags
+    """
+    
+    # 1. Try to get transcript first (preferred method)
+    # Callers that already parsed (or checkpointed) the transcript pass it in
+    if transcript_text is None:
+        print(f"📄 Attempting to parse subtitles from: {subtitle_path}")
+        transcript_text = parse_vtt_to_text(subtitle_path)
+    
+    if transcript_text:
+        print(f"✅ Successfully parsed transcript: {len(transcript_text)} characters")
+    else:
+        print(f"⚠️ No transcript text extracted from subtitle file")
+        if subtitle_path:
+            print(f"   Subtitle path provided: {subtitle_path}")
+            if isinstance(subtitle_path, Path) and subtitle_path.exists():
+                print(f"   File exists but parsing failed or file is empty")
+            elif isinstance(subtitle_path, Path):
+                print(f"   File does not exist: {subtitle_path}")
+    
+    # 2. Whisper Fallback (only if video_path is available)
+    if not transcript_text and video_path is not None:
+        print("⚠️ No VTT subtitles found. Attempting Whisper transcription...")
+        try:
+            # Find audio file (usually same name as video but m4a)
+            audio_candidates = list(video_path.parent.glob(f"{video_path.stem}*.m4a"))
+            if not audio_candidates:
+                # Try extracting audio if not found? 
+                # For now, just assume yt-dlp downloaded it or the video file itself can be sent (if small enough)
+                # Sending large video file to whisper size limit is 25MB usually.
+                print("   ⚠️ No audio file found for Whisper transcription")
+            else:
+                audio_path = audio_candidates[0]
+                transcript_text = transcribe_with_whisper(audio_path)
+                if transcript_text:
+                    print("✅ Whisper transcription successful!")
+        except Exception as e:
+            print(f"   ⚠️ Whisper fallback failed: {e}")
+            # Continue to Vision Mode fallback
+    
+    has_transcript = bool(transcript_text)
+    
+    # 2. Get prompt template (adjust based on generation mode)
+    if prompt_template is None:
+        prompt_template = get_prompt_template(generation_mode)
     
     # Inject variables
     prompt = prompt_template.replace('{video_url}', video_url)
@@ -730,14 +872,6 @@ def analyze_content(video_path: Path, subtitle_path: Optional[Path], video_url:
 
     # --- REFACTORED: Using Google Gemini for YouTube URL Analysis ---
 
-    # Gemini models that support YouTube URLs
-    candidate_models = [
-        'gemini-2.5-pro',           # Best quality, supports YouTube URLs
-        'gemini-flash-latest',      # Faster, cheaper, also supports YouTube URLs
-    ]
-    
-    last_exception = None
-
     # 1. Determine Analysis Mode
     use_youtube_url = True  # Default to YouTube URL mode
     if transcript_text and len(transcript_text.strip()) > 0:
@@ -770,6 +904,7 @@ CRITICAL INSTRUCTIONS:
    - "content": string (detailed 2-4 sentence explanation, NOT just the title)
    - "timestamp_seconds": number (exact time in seconds)
    - "needs_screenshot": boolean (true if visual element is described)
+5. Transcript lines start with a [mm:ss] marker showing when that passage is spoken. Use them for "timestamp_seconds".
 
 Example of CORRECT output format:
 {
@@ -787,338 +922,657 @@ Example of CORRECT output format:
 
 Return ONLY valid JSON, no markdown, no code blocks."""
 
-    for model_name in candidate_models:
-        print(f"🔄 Attempting analysis with Gemini model: {model_name}")
+    if use_youtube_url:
+        # === NO SUBTITLES AVAILABLE ===
+        # Gemini cannot directly access YouTube videos via URL
+        # We require subtitles for accurate analysis
+        print(f"   ⚠️ No subtitles available for video analysis")
+        print(f"   ℹ️ Gemini API cannot directly access YouTube videos via URL")
+        print(f"   💡 Solution: Please use a video with captions/subtitles enabled")
+        
+        raise Exception(
+            "Cannot analyze video without subtitles. "
+            "Gemini API requires either:\n"
+            "  1. Video subtitles/captions (recommended)\n"
+            "  2. Uploaded video file via File API\n\n"
+            "Please choose a YouTube video with captions enabled, "
+            "or try a different video."
+        )
+    
+    # Long videos: analyze overlapping time windows in parallel, then merge
+    if duration >= LONG_VIDEO_SECONDS:
+        windows = split_transcript_windows(transcript_text, LONG_VIDEO_WINDOW_SECONDS, LONG_VIDEO_OVERLAP_SECONDS)
+        if len(windows) > 1:
+            return analyze_long_content(windows, prompt, system_prompt)
+    
+    return generate_analysis(system_prompt, prompt.replace('{transcript}', transcript_text),
+                             on_section=on_section, on_reset=on_reset)
+
+
+def generate_analysis(system_prompt: str, final_prompt: str, models: List[str] = GEMINI_MODELS,
+                      on_section: Optional[Callable[[Dict], None]] = None,
+                      on_reset: Optional[Callable[[], None]] = None) -> Dict:
+    """
+    Run one analysis prompt on the Gemini models in order of preference
+    
+    The next model is started when the previous one fails, or alongside it
+    when it has not answered within GEMINI_HEDGE_SECONDS; the first valid
+    result wins (see hedging.py).
+    
+    With on_section, each section is passed on as soon as it has been
+    streamed, before the response is complete. on_reset means the sections
+    passed so far are void (their model failed or lost) and the right ones
+    follow. By the time this returns, on_section has seen exactly the
+    returned sections.
+    
+    Returns:
+        Parsed analysis dict (summary, normalized sections, model)
+    """
+    started = time.time()
+    relay = SectionRelay(on_section, on_reset or (lambda: None)) if on_section else None
+    
+    def attempt(model_name: str, cancelled: Event) -> Dict:
         try:
-            # Initialize Gemini model
-            model = genai.GenerativeModel(model_name)
-            
-            # Prepare content based on mode
-            if use_youtube_url:
-                # === NO SUBTITLES AVAILABLE ===
-                # Gemini cannot directly access YouTube videos via URL
-                # We require subtitles for accurate analysis
-                print(f"   ⚠️ No subtitles available for video analysis")
-                print(f"   ℹ️ Gemini API cannot directly access YouTube videos via URL")
-                print(f"   💡 Solution: Please use a video with captions/subtitles enabled")
-                
-                raise Exception(
-                    "Cannot analyze video without subtitles. "
-                    "Gemini API requires either:\n"
-                    "  1. Video subtitles/captions (recommended)\n"
-                    "  2. Uploaded video file via File API\n\n"
-                    "Please choose a YouTube video with captions enabled, "
-                    "or try a different video."
-                )
-                
-            else:
-                # === TEXT MODE (Transcript) - Most reliable method ===
-                print(f"   📄 Using Transcript for {model_name}")
-                final_prompt = prompt.replace('{transcript}', transcript_text)
-                
-                # Generate content with text only
-                response = model.generate_content(
-                    [system_prompt, final_prompt],
-                    generation_config={"temperature": 0.7}
-                )
+            return analyze_with_model(
+                model_name, system_prompt, final_prompt,
+                on_section=(lambda section: relay.emit(model_name, section)) if relay else None,
+                cancelled=cancelled,
+            )
+        except HedgeCancelled:
+            print(f"   🛑 {model_name} stopped: another model already answered")
+            raise
+        except Exception as e:
+            print(f"⚠️ Model {model_name} failed: {str(e)}")
+            if relay:
+                relay.fail(model_name)
+            raise
+    
+    try:
+        data, model_name = hedged_call(
+            attempt, models,
+            hedge_after=GEMINI_HEDGE_SECONDS,
+            answering=relay.answering if relay else None,
+        )
+    except Exception:
+        print("❌ All Gemini models failed.")
+        raise
+    
+    if relay:
+        relay.settle(model_name, data['sections'])
+    print(f"   ⏱️ Analysis finished in {time.time() - started:.1f}s with {model_name}")
+    return data
+
+
+def analyze_with_model(model_name: str, system_prompt: str, final_prompt: str,
+                       on_section: Optional[Callable[[Dict], None]] = None,
+                       cancelled: Optional[Event] = None) -> Dict:
+    """
+    One streamed analysis request to one Gemini model, parsed and normalized
+    
+    on_section is called with each section as soon as it is complete in
+    the stream. cancelled (from hedged_call) is set once
+    another model has won: the call then stops reading the stream and never
+    waits for quota or retries again, raising HedgeCancelled.
+    
+    Raises:
+        Exception if the request fails or the response is not a usable analysis
+    """
+    print(f"🔄 Attempting analysis with Gemini model: {model_name}")
+    # Initialize Gemini model
+    model = genai.GenerativeModel(model_name)
+
+    # === TEXT MODE (Transcript) - Most reliable method ===
+    print(f"   📄 Using Transcript for {model_name}")
+
+    prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(final_prompt)
+    decoder = SectionStreamDecoder()
+    def ensure_wanted():
+        if cancelled is not None and cancelled.is_set():
+            raise HedgeCancelled(f"{model_name} is no longer needed")
+    
+    for retry in range(GEMINI_RATE_LIMIT_RETRIES + 1):
+        ensure_wanted()
+        # Waits for this model's shared RPM/TPM quota (RateLimitExceeded -> next model)
+        gemini_rate_limiter.acquire(model_name, prompt_tokens, cancelled=cancelled)
+        ensure_wanted()
+        try:
+            # Generate content with text only; the response schema makes Gemini return bare JSON
+            response = model.generate_content(
+                [system_prompt, final_prompt],
+                generation_config={
+                    "temperature": 0.7,
+                    "response_mime_type": "application/json",
+                    "response_schema": Analysis,
+                },
+                stream=True,
+            )
             
-            response_text = response.text
-            print(f"   ✅ API request successful with {model_name}")
+            for chunk in response:
+                ensure_wanted()
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunk without text parts (e.g. only the finish reason)
+                    continue
+                for section in decoder.feed(text):
+                    if on_section:
+                        on_section(section)
+            break
+        except Exception as e:
+            if not is_rate_limit_error(e):
+                raise
+            # Every 429 pauses the model for all workers, also when we give up on it.
+            # Then wait out the retry delay and try the same model again -
+            # the fallback model is usually throttled too. Not once output was streamed.
+            gemini_rate_limiter.block(model_name, e)
+            if decoder.text or retry == GEMINI_RATE_LIMIT_RETRIES:
+                raise
+            ensure_wanted()
+    print(f"   ✅ API request successful with {model_name}")
+
+    try:
+        data = decoder.finish()
+    except AnalysisDecodeError as e:
+        print(f"   ❌ Response validation failed: {e}")
+        print(f"   Response Preview: {decoder.text[:500]}")
+        raise
+
+    for section in data['sections']:
+        print(f"   📷 Section {section['section_order']}: needs_screenshot={section['needs_screenshot']}")
+    data['model'] = model_name
+
+    print(f"✅ Successfully parsed {len(data['sections'])} sections using {model_name}")
+    return data
 
-            # Parse JSON response
+
+def analyze_long_content(windows: List[TranscriptWindow], prompt: str, system_prompt: str) -> Dict:
+    """
+    Map-reduce analysis of a long video
+    
+    Map: every transcript window is analyzed concurrently (up to
+    LONG_VIDEO_MAX_PARALLEL Gemini calls) with the normal prompt, told which
+    part of the video it covers.
+    Reduce: sections are kept only by the window that owns their timestamp
+    (drops duplicates from the overlaps), sorted and renumbered, and the
+    per-window summaries are merged by one small GEMINI_REDUCE_MODEL call.
+    
+    A window that still fails after LONG_VIDEO_WINDOW_RETRIES retries is a
+    gap: the others are merged without it, and its neighbours keep their
+    sections from the overlap with it. Only when every window fails, or
+    nothing is left after merging, does the analysis fail.
+    
+    Returns:
+        Same shape as generate_analysis()
+    """
+    total = len(windows)
+    print(f"🧩 Long video: analyzing {total} windows of {format_time(LONG_VIDEO_WINDOW_SECONDS)} ({LONG_VIDEO_MAX_PARALLEL} in parallel)")
+    
+    def analyze_window(window: TranscriptWindow) -> Dict:
+        end = "the end" if window.end == float('inf') else format_time(window.end)
+        header = (
+            f"(This is part {window.index + 1} of {total} of the video, covering "
+            f"{format_time(window.start)} to {end}. Only describe this part; "
+            f"the other parts are analyzed separately.)\n"
+        )
+        print(f"   🧩 Window {window.index + 1}/{total}: {format_time(window.start)} - {end}")
+        for attempt in range(LONG_VIDEO_WINDOW_RETRIES + 1):
             try:
-                text = response_text.strip()
-                
-                # Remove markdown code blocks if present
-                if '```json' in text:
-                    text = text.split('```json')[1].split('```')[0].strip()
-                elif '```' in text:
-                    text = text.split('```')[1].split('```')[0].strip()
-                
-                # Extract JSON using regex if needed
-                if not text.startswith('{'):
-                    json_match = re.search(r'(\{.*\})', text, re.DOTALL)
-                    if json_match:
-                        text = json_match.group(1)
-                        print("   📝 Extracted JSON using regex")
-                
-                # Parse JSON
-                data = json.loads(text)
-                
-                # Validate structure
-                if not isinstance(data, dict):
-                    raise ValueError("Response is not a dictionary")
-                
-                # Check for 'sections' or 'steps'
-                if 'sections' in data:
-                    sections_data = data['sections']
-                elif 'steps' in data:
-                    sections_data = data['steps']
-                    print("   📝 Using 'steps' field (renamed from 'sections')")
-                    data['sections'] = sections_data
-                else:
-                    raise ValueError("Response missing both 'sections' and 'steps' fields")
-                
-                if not isinstance(sections_data, list):
-                    raise ValueError("'sections/steps' is not a list")
-                
-                if len(sections_data) == 0:
-                    print(f"   ⚠️ Model {model_name} returned 0 sections. Treating as failure.")
-                    raise ValueError("Model returned 0 sections")
-
-                # Normalize section fields
-                normalized_sections = []
-                for idx, section in enumerate(sections_data):
-                    # Parse needs_screenshot - be aggressive, default to True for visual guides
-                    raw_screenshot = (
-                        section.get('needs_screenshot') or 
-                        section.get('screenshot') or 
-                        section.get('has_screenshot') or
-                        section.get('visual') or
-                        section.get('image') or
-                        True  # Default to True for text_with_images mode
-                    )
-                    # Handle string "true"/"false" values
-                    if isinstance(raw_screenshot, str):
-                        needs_screenshot = raw_screenshot.lower() in ('true', 'yes', '1')
-                    else:
-                        needs_screenshot = bool(raw_screenshot)
-                    
-                    normalized = {
-                        'section_order': (
-                            section.get('section_order') or 
-                            section.get('step_order') or 
-                            section.get('order') or 
-                            idx + 1
-                        ),
-                        'title': (
-                            section.get('title') or 
-                            section.get('name') or 
-                            f"Section {idx + 1}"
-                        ),
-                        'content': (
-                            section.get('content') or 
-                            section.get('instruction') or 
-                            section.get('description') or 
-                            section.get('title') or
-                            "Content not provided"
-                        ),
-                        'needs_screenshot': needs_screenshot
-                    }
-                    print(f"   📷 Section {idx+1}: needs_screenshot={needs_screenshot}")
-                    
-                    # Parse timestamp
-                    raw_timestamp = (
-                        section.get('timestamp_seconds') or 
-                        section.get('timestamp') or 
-                        0
-                    )
-                    if isinstance(raw_timestamp, str):
-                        parts = raw_timestamp.replace('s', '').split(':')
-                        if len(parts) == 1:
-                            normalized['timestamp_seconds'] = float(parts[0])
-                        elif len(parts) == 2:
-                            normalized['timestamp_seconds'] = int(parts[0]) * 60 + float(parts[1])
-                        else:
-                            normalized['timestamp_seconds'] = int(parts[0]) * 3600 + int(parts[1]) * 60 + float(parts[2])
-                    else:
-                        normalized['timestamp_seconds'] = float(raw_timestamp)
-                    
-                    normalized_sections.append(normalized)
-                
-                data['sections'] = normalized_sections
-                
-                print(f"✅ Successfully parsed {len(normalized_sections)} sections using {model_name}")
-                return data
-                
-            except json.JSONDecodeError as e:
-                print(f"   ❌ JSON parsing failed: {e}")
-                print(f"   Response Preview: {response_text[:500]}")
-                raise Exception(f"Invalid JSON response: {e}")
+                return generate_analysis(system_prompt, prompt.replace('{transcript}', header + window.text))
             except Exception as e:
-                print(f"   ❌ Response validation failed: {e}")
-                raise
-                
-        except Exception as e:
-            print(f"⚠️ Model {model_name} failed: {str(e)}")
-            last_exception = e
-            continue  # Try next model
+                if attempt == LONG_VIDEO_WINDOW_RETRIES:
+                    print(f"   ⚠️ Window {window.index + 1}/{total} failed, leaving a gap: {e}")
+                    return e
+                print(f"   🔁 Window {window.index + 1}/{total} failed ({e}), retrying")
+    
+    with ThreadPoolExecutor(max_workers=min(LONG_VIDEO_MAX_PARALLEL, total), thread_name_prefix="window") as pool:
+        outcomes = list(pool.map(analyze_window, windows))
+    
+    failed = [window for window, outcome in zip(windows, outcomes) if isinstance(outcome, Exception)]
+    if len(failed) == total:
+        raise outcomes[-1]
     
-    # If all models failed
-    print("❌ All Gemini models failed.")
-    raise last_exception or Exception("All models failed")
+    def kept_by(window: TranscriptWindow, timestamp: float) -> bool:
+        # The owner keeps a section; for a failed owner, whoever saw it in the overlap does
+        return window.owns(timestamp) or any(gap.owns(timestamp) for gap in failed)
+    
+    results = [outcome for outcome in outcomes if not isinstance(outcome, Exception)]
+    sections = []
+    for window, result in zip(windows, outcomes):
+        if isinstance(result, Exception):
+            continue
+        owned = [section for section in result['sections'] if kept_by(window, section['timestamp_seconds'])]
+        print(f"   🧩 Window {window.index + 1}: {len(owned)}/{len(result['sections'])} sections kept")
+        sections.extend(owned)
+    if not sections:
+        raise Exception(f"Long video analysis produced no sections ({len(failed)}/{total} windows failed)")
+    sections.sort(key=lambda section: section['timestamp_seconds'])
+    for order, section in enumerate(sections, 1):
+        section['section_order'] = order
+    
+    summaries = [result.get('summary') or '' for result in results]
+    # A mix of models is labelled with the least preferred one used
+    models_used = [result['model'] for result in results]
+    model_name = max(models_used, key=lambda name: GEMINI_MODELS.index(name) if name in GEMINI_MODELS else len(GEMINI_MODELS))
+    
+    gaps = f", {len(failed)} failed" if failed else ""
+    print(f"✅ Merged {len(sections)} sections from {total} windows{gaps}")
+    return {
+        'summary': merge_summaries(summaries),
+        'sections': sections,
+        'model': model_name,
+    }
 
 
-def process_project(project: Dict):
-    """Process a single project"""
-    project_id = project['id']
-    video_url = project['video_source_url']
-    generation_mode = project.get('generation_mode', 'text_with_images')  # Default to text_with_images
+def merge_summaries(summaries: List[str]) -> str:
+    """
+    Merge per-window summaries of a long video into one (reduce step)
     
-    print(f"\n{'='*60}")
-    print(f"🎬 Processing Project: {project_id}")
-    print(f"Video URL: {video_url}")
-    print(f"Generation Mode: {generation_mode}")
-    print(f"{'='*60}\n")
+    Falls back to joining them when the reduce call fails.
+    """
+    parts = [summary.strip() for summary in summaries if summary and summary.strip()]
+    if len(parts) <= 1:
+        return parts[0] if parts else ""
     
-    # Create temp directory for this project
-    project_dir = TEMP_DIR / project_id
+    reduce_prompt = (
+        "These are summaries of consecutive parts of one video, in order. "
+        "Merge them into a single summary of the whole video. Keep the format of the "
+        "partial summaries (headings, bullet lists) and their language, remove repetition, "
+        "and do not add information that is not in them. Return only the summary text.\n\n"
+        + "\n\n".join(f"Part {i}:\n{part}" for i, part in enumerate(parts, 1))
+    )
+    try:
+        gemini_rate_limiter.acquire(GEMINI_REDUCE_MODEL, estimate_tokens(reduce_prompt))
+        model = genai.GenerativeModel(GEMINI_REDUCE_MODEL)
+        response = model.generate_content(reduce_prompt, generation_config={"temperature": 0.3})
+        merged = response.text.strip()
+        if merged:
+            print(f"   ✅ Merged {len(parts)} window summaries with {GEMINI_REDUCE_MODEL}")
+            return merged
+    except Exception as e:
+        print(f"   ⚠️ Summary merge failed ({e}), joining window summaries")
+    return "\n\n".join(parts)
+
+
+def fetch_video_info(video_url: str, project_dir: Path) -> Dict:
+    """
+    Download metadata + subtitles, falling back to the video id from the URL
+
+    Returns:
+        Dict from download_subtitles_only, or a fallback dict (fallback=True)
+        when the download failed
+    """
+    print("📥 Downloading video metadata and subtitles...")
+    
+    video_info = None
+    duration = 600
+    video_id = None
     
     try:
-        # Update status to processing
-        supabase.table('projects').update({
-            'status': 'processing'
-        }).eq('id', project_id).execute()
+        video_info = download_subtitles_only(video_url, project_dir)
+        duration = video_info.get('duration', 600)
+        video_id = video_info.get('video_id', 'unknown')
         
-        # Clean previous run if exists
-        if project_dir.exists():
-            shutil.rmtree(project_dir)
-        project_dir.mkdir(exist_ok=True)
+        print(f"✅ Video info retrieved: ID={video_id}, Duration={format_time(duration)}")
+        
+        if video_info.get('subtitle_text'):
+            print(f"✅ Subtitles fetched in memory: {video_info.get('subtitle_lang')}")
+        elif video_info.get('subtitle_path'):
+            subtitle_file = video_info['subtitle_path']
+            if isinstance(subtitle_file, Path):
+                print(f"✅ Subtitles found: {subtitle_file.name} (path: {subtitle_file})")
+            else:
+                print(f"✅ Subtitles found: {subtitle_file}")
+        else:
+            print("⚠️ No subtitles available - will attempt analysis without transcript")
+            print("   Note: Analysis quality may be reduced without subtitles")
+            
+    except Exception as e:
+        error_msg = str(e)
+        print(f"⚠️ Failed to download metadata/subtitles: {error_msg}")
+        import traceback
+        print(f"   Full error: {traceback.format_exc()}")
         
-        # ========================================
-        # Step 1: Download subtitles and metadata from YouTube
-        # This is REQUIRED for accurate content analysis
-        # ========================================
+        # Check if it's a cookie/verification issue
+        if 'bot' in error_msg.lower() or 'sign in' in error_msg.lower() or 'verification' in error_msg.lower():
+            print(f"\n   🔍 DIAGNOSIS: YouTube verification required")
+            print(f"   📋 Possible causes:")
+            print(f"      1. Cookies expired or invalid")
+            print(f"      2. Cookies not properly formatted")
+            print(f"      3. YouTube rate limiting")
+            print(f"      4. Video requires login")
+            print(f"\n   💡 SOLUTIONS:")
+            print(f"      1. Re-export cookies from browser (see YOUTUBE_COOKIES_SETUP.md)")
+            print(f"      2. Ensure cookies are in Netscape format")
+            print(f"      3. Check YOUTUBE_COOKIES_B64 is correctly base64 encoded")
+            print(f"      4. Wait 10-15 minutes and retry (rate limiting)")
+            print(f"      5. Try a different video URL")
+            print(f"      6. Update yt-dlp: pip install --upgrade yt-dlp")
         
-        print("📥 Downloading video metadata and subtitles...")
+        # Fallback: extract video ID from URL
+        if 'youtube.com' in video_url or 'youtu.be' in video_url:
+            match = re.search(r'(?:v=|/)([a-zA-Z0-9_-]{11})', video_url)
+            if match:
+                video_id = match.group(1)
         
-        video_info = None
+        if not video_id:
+            raise Exception(
+                f"Could not extract video ID from URL: {video_url}\n"
+                f"Original error: {error_msg}"
+            )
+        
+        video_info = {
+            'subtitle_path': None,
+            'subtitle_text': None,
+            'duration': 600,  # Default 10 minutes
+            'video_id': video_id,
+            'title': '',
+            'fallback': True,  # Not checkpointed - a retry downloads again
+        }
         duration = 600
-        video_id = None
+        print(f"⚠️ Using fallback: video_id={video_id}, duration={duration}s")
+        print(f"   ⚠️ WARNING: Cannot proceed without subtitles - analysis will fail")
+    
+    return video_info
+
+
+def extract_video_id(video_url: str) -> Optional[str]:
+    """Extract the YouTube video id from a URL without any network call"""
+    if 'youtube.com' in video_url or 'youtu.be' in video_url:
+        match = re.search(r'(?:v=|/)([a-zA-Z0-9_-]{11})', video_url)
+        if match:
+            return match.group(1)
+    return None
+
+
+def clamp_timestamp(timestamp: float, duration: float) -> float:
+    """Ensure timestamp is within video duration"""
+    if timestamp > duration:
+        return max(5.0, duration - 10)
+    return timestamp
+
+
+def capture_section_image(section: Dict, extractor: StoryboardExtractor, video_id: str, duration: float,
+                          project_id: str, project_dir: Path, checkpoint: ProjectCheckpoint,
+                          resume: bool = True) -> Optional[str]:
+    """
+    Screenshot of one section from the storyboard, uploaded to storage
+    
+    With resume, a screenshot the checkpoint already has for the section is reused.
+
+    Returns:
+        Storage path, or None when no screenshot is needed or it failed
+    """
+    section_order = section['section_order']
+    
+    # Extract screenshot only when AI explicitly requests it
+    # Respects the needs_screenshot flag to avoid unnecessary storyboard extraction
+    if not section.get('needs_screenshot', False):
+        # AI determined this section doesn't need a screenshot
+        print(f"   📝 Section {section_order}: No screenshot needed (AI marked needs_screenshot=False)")
+        return None
+    
+    if resume and checkpoint.image_for(section_order):
+        print(f"   ⏩ Section {section_order}: screenshot already uploaded ({checkpoint.image_for(section_order)})")
+        return checkpoint.image_for(section_order)
+    
+    timestamp = clamp_timestamp(section['timestamp_seconds'], duration)
+    screenshot_path = None
+    
+    # Extract screenshot using YouTube Storyboard (no video download needed!)
+    try:
+        screenshot_filename = f"{video_id}_{int(timestamp * 1000)}.jpg"
+        screenshot_path_obj = project_dir / screenshot_filename
+        
+        extractor.get_thumbnail_at_timestamp(timestamp, screenshot_path_obj)
+        screenshot_path = str(screenshot_path_obj)
         
+        print(f"   📸 Storyboard Screenshot captured for section {section_order}")
+    except Exception as e:
+        print(f"   ❌ Storyboard extraction failed: {e}")
+        screenshot_path = None
+
+    # Upload if we have a valid screenshot
+    if screenshot_path:
         try:
-            video_info = download_subtitles_only(video_url, project_dir)
-            duration = video_info.get('duration', 600)
-            video_id = video_info.get('video_id', 'unknown')
-            
-            # Update project with actual duration
-            supabase.table('projects').update({
-                'video_duration_seconds': duration,
-                'title': video_info.get('title', '')[:200] if video_info.get('title') else None
-            }).eq('id', project_id).execute()
-            
-            print(f"✅ Video info retrieved: ID={video_id}, Duration={format_time(duration)}")
-            
-            if video_info.get('subtitle_path'):
-                subtitle_file = video_info['subtitle_path']
-                if isinstance(subtitle_file, Path):
-                    print(f"✅ Subtitles found: {subtitle_file.name} (path: {subtitle_file})")
-                else:
-                    print(f"✅ Subtitles found: {subtitle_file}")
-            else:
-                print("⚠️ No subtitles available - will attempt analysis without transcript")
-                print("   Note: Analysis quality may be reduced without subtitles")
-                
-        except Exception as e:
-            error_msg = str(e)
-            print(f"⚠️ Failed to download metadata/subtitles: {error_msg}")
-            import traceback
-            print(f"   Full error: {traceback.format_exc()}")
-            
-            # Check if it's a cookie/verification issue
-            if 'bot' in error_msg.lower() or 'sign in' in error_msg.lower() or 'verification' in error_msg.lower():
-                print(f"\n   🔍 DIAGNOSIS: YouTube verification required")
-                print(f"   📋 Possible causes:")
-                print(f"      1. Cookies expired or invalid")
-                print(f"      2. Cookies not properly formatted")
-                print(f"      3. YouTube rate limiting")
-                print(f"      4. Video requires login")
-                print(f"\n   💡 SOLUTIONS:")
-                print(f"      1. Re-export cookies from browser (see YOUTUBE_COOKIES_SETUP.md)")
-                print(f"      2. Ensure cookies are in Netscape format")
-                print(f"      3. Check YOUTUBE_COOKIES_B64 is correctly base64 encoded")
-                print(f"      4. Wait 10-15 minutes and retry (rate limiting)")
-                print(f"      5. Try a different video URL")
-                print(f"      6. Update yt-dlp: pip install --upgrade yt-dlp")
-            
-            # Fallback: extract video ID from URL
-            if 'youtube.com' in video_url or 'youtu.be' in video_url:
-                match = re.search(r'(?:v=|/)([a-zA-Z0-9_-]{11})', video_url)
-                if match:
-                    video_id = match.group(1)
-            
-            if not video_id:
-                raise Exception(
-                    f"Could not extract video ID from URL: {video_url}\n"
-                    f"Original error: {error_msg}"
-                )
-            
-            video_info = {
-                'subtitle_path': None,
-                'duration': 600,  # Default 10 minutes
-                'video_id': video_id,
-                'title': ''
+            image_path = upload_to_supabase_storage(
+                Path(screenshot_path),
+                project_id,
+                section_order
+            )
+            checkpoint.save_image(section_order, image_path)
+            return image_path
+        except Exception as e_upload:
+             print(f"   ☁️ Upload failed: {e_upload}")
+    return None
+
+
+def prepare_guide(project_id: str, video_url: str, generation_mode: str, prompt_template: str,
+                  checkpoint: ProjectCheckpoint, project_dir: Path,
+                  on_step: Optional[Callable[[Dict, Optional[str]], None]] = None,
+                  on_discard: Optional[Callable[[], None]] = None,
+                  on_metadata: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Steps 1-3 of process_project: everything that only depends on the video
+
+    Subtitles, Gemini analysis and screenshot uploads. The result is shared
+    with concurrent duplicate projects, so nothing here writes to the
+    project's own rows except its checkpoint and storage folder - and the
+    steps of sections handed to on_step.
+
+    While Gemini streams its answer, every finished section gets its
+    screenshot right away and is passed to on_step(section, image_path),
+    so the caller can save it before the rest is generated. on_discard()
+    voids what on_step received so far (the streaming model failed or was
+    beaten by a hedged one). Sections that were not streamed (long videos,
+    cache and checkpoint hits) are only in the returned analysis.
+    on_metadata(video_info) is called as soon as the video metadata is known,
+    before the analysis, so even a failed run records title and duration.
+
+    Returns:
+        Dict with video_info, duration, analysis and images ({section_order: storage path})
+    """
+    prompt_hash = prompt_version(prompt_template)
+    
+    # Step 0: Analysis cache - a hit skips subtitles, Gemini and screenshots entirely
+    # (reset_project.py --fresh drops the entry, so a fresh run misses)
+    if not checkpoint.has('analysis'):
+        cached = analysis_cache.get(extract_video_id(video_url), generation_mode, prompt_hash, GEMINI_MODELS)
+        if cached:
+            video_info = dict(cached['metadata'], subtitle_path=None)
+            if on_metadata:
+                on_metadata(video_info)
+            return {
+                'video_info': video_info,
+                'duration': video_info.get('duration') or 600,
+                'analysis': cached['analysis'],
+                'images': cached['images'],
             }
-            duration = 600
-            print(f"⚠️ Using fallback: video_id={video_id}, duration={duration}s")
-            print(f"   ⚠️ WARNING: Cannot proceed without subtitles - analysis will fail")
+    
+    # ========================================
+    # Step 1: Download subtitles and metadata from YouTube
+    # This is REQUIRED for accurate content analysis
+    # (skipped when a previous attempt checkpointed the transcript)
+    # ========================================
+    
+    if checkpoint.has('metadata') and checkpoint.has('transcript'):
+        video_info = dict(checkpoint.get('metadata'), subtitle_path=None)
+        transcript_text = checkpoint.get('transcript')
+        print(f"⏩ Resuming from checkpoint: metadata + transcript ({len(transcript_text)} chars)")
+    else:
+        video_info = fetch_video_info(video_url, project_dir)
+        if video_info.get('subtitle_text'):
+            transcript_text = parse_subtitle_content(
+                video_info['subtitle_text'],
+                video_info.get('subtitle_format') or 'vtt',
+                transcript_token_budget(video_info['duration'] or 0),
+                auto=video_info.get('subtitle_auto', False),
+            )
+        else:
+            transcript_text = parse_vtt_to_text(
+                video_info['subtitle_path'],
+                transcript_token_budget(video_info['duration'] or 0),
+                auto=video_info.get('subtitle_auto', False),
+            )
+        if transcript_text and not video_info.get('fallback'):
+            checkpoint.save(
+                metadata={
+                    'video_id': video_info['video_id'],
+                    'duration': video_info['duration'],
+                    'title': video_info.get('title', ''),
+                },
+                transcript=transcript_text,
+            )
+    
+    if on_metadata:
+        on_metadata(video_info)
+    duration = video_info.get('duration') or 600
+    
+    # One extractor per project: storyboard spec is resolved once, from the
+    # info dict of step 1 when available
+    extractor = StoryboardExtractor(
+        video_url,
+        session=http_session,
+        info=video_info.get('info') or video_metadata_cache.get(video_info['video_id']),
+    )
+    
+    def section_image(section: Dict, resume: bool = True) -> Optional[str]:
+        if generation_mode != 'text_with_images':
+            return None
+        return capture_section_image(section, extractor, video_info['video_id'], duration,
+                                     project_id, project_dir, checkpoint, resume)
+    
+    # Step 2: Analyze content with Gemini (get summary and sections)
+    # Pass video_url instead of video_path for Storyboard
+    streamed = {}
+    if checkpoint.has('analysis'):
+        analysis = checkpoint.get('analysis')
+        print(f"⏩ Resuming from checkpoint: analysis ({len(analysis.get('sections', []))} sections)")
+    else:
+        if checkpoint.has('images'):
+            # Screenshots of an earlier attempt whose analysis never completed
+            checkpoint.save(images=None)
         
-        # Calculate credits cost based on duration
-        minutes = (duration + 59) // 60  # Round up
-        credits_cost = max(10, int(minutes * 10))
+        def discard_sections():
+            if checkpoint.has('images'):
+                checkpoint.save(images=None)
+            if on_discard:
+                on_discard()
         
-        # Step 2: Analyze content with Gemini (get summary and sections)
-        # Pass video_url instead of video_path for Storyboard
-        analysis = analyze_content(None, video_info['subtitle_path'], video_url, duration, generation_mode)
+        # Step 3 for streamed sections: screenshots (and on_step) while Gemini is still generating.
+        # One worker: captures run in order, so a discarded one never overwrites the
+        # upload of a later section with the same number
+        pipeline = SectionPipeline(
+            lambda section: section_image(section, resume=False),
+            deliver=lambda section, image_path: on_step(section, image_path) if on_step else None,
+            discard=discard_sections,
+        )
+        try:
+            analysis = analyze_content(
+                None, video_info['subtitle_path'], video_url, duration, generation_mode,
+                transcript_text=transcript_text,
+                prompt_template=prompt_template,
+                on_section=pipeline.submit,
+                on_reset=pipeline.reset,
+            )
+        finally:
+            pipeline.join()
+        streamed = pipeline.results
         
         if not analysis or 'sections' not in analysis:
             raise Exception("No analysis extracted from video")
+        # Rewrite images too: a capture discarded mid-upload may have left an entry
+        checkpoint.save(
+            analysis=analysis,
+            images={str(order): path for order, path in streamed.items() if path},
+        )
+    
+    # Step 3: Extract and upload screenshots of the sections that were not streamed
+    # (text_with_images mode only)
+    images = {order: path for order, path in streamed.items() if path}
+    for section in analysis['sections']:
+        section_order = section['section_order']
+        if section_order in streamed:
+            continue
+        image_path = section_image(section)
+        if image_path:
+            images[section_order] = image_path
+    
+    if not video_info.get('fallback'):
+        analysis_cache.put(
+            video_info['video_id'], generation_mode, analysis.get('model'), prompt_hash,
+            metadata={
+                'video_id': video_info['video_id'],
+                'duration': duration,
+                'title': video_info.get('title', ''),
+            },
+            analysis=analysis,
+            images=images,
+        )
+    
+    return {
+        'video_info': video_info,
+        'duration': duration,
+        'analysis': analysis,
+        'images': images,
+    }
+
+
+def process_project(project: Dict, lease: Optional[ProjectLease] = None):
+    """
+    Process a single project
+
+    The lease is flagged by the LeaseHeartbeat when this worker no longer holds
+    the project; the run then aborts before its next write to the project.
+    """
+    project_id = project['id']
+    video_url = project['video_source_url']
+    generation_mode = project.get('generation_mode', 'text_with_images')  # Default to text_with_images
+    
+    print(f"\n{'='*60}")
+    print(f"🎬 Processing Project: {project_id}")
+    print(f"Video URL: {video_url}")
+    print(f"Generation Mode: {generation_mode}")
+    print(f"{'='*60}\n")
+    
+    # Create temp directory for this project (isolated scratch area per project,
+    # so concurrently running projects never share files)
+    project_dir = TEMP_DIR / project_id
+    
+    def ensure_lease():
+        if lease is not None:
+            lease.ensure()
+    
+    def update_owned_project(fields: Dict):
+        # Only while this worker still holds the claim (not reaped or re-claimed)
+        ensure_lease()
+        response = supabase.table('projects').update(fields) \
+            .eq('id', project_id).eq('claimed_by', WORKER_ID).execute()
+        if not response.data:
+            raise LeaseLost(f"Project {project_id} is no longer claimed by {WORKER_ID}")
+    
+    try:
+        # Status is already 'processing' - set atomically by claim_projects()
         
-        summary = analysis.get('summary', '')
-        sections = analysis['sections']
+        # A previous attempt may have died after inserting some steps
+        if project.get('attempt_count', 1) > 1:
+            ensure_lease()
+            print(f"♻️  Retry attempt {project['attempt_count']} - removing steps from previous attempt")
+            supabase.table('steps').delete().eq('project_id', project_id).execute()
         
-        # Update project with summary
-        if summary:
-            supabase.table('projects').update({
-                'title': summary[:200] if len(summary) > 200 else summary  # Use summary as title if available
-            }).eq('id', project_id).execute()
+        # Completed stages of earlier attempts are kept in the checkpoint
+        checkpoint = ProjectCheckpoint.for_project(supabase, project)
+        project_dir.mkdir(exist_ok=True)
         
-        # Step 3: Process sections - extract screenshots based on mode
-        for section in sections:
+        # Step 4 for sections streamed by Gemini: saved while later ones are still generated
+        saved_steps = set()
+        
+        def save_section(section: Dict, image_path: Optional[str]):
+            # Copy: the analysis dict may be shared with concurrent duplicate projects
+            section = dict(section)
             section_order = section['section_order']
-            timestamp = section['timestamp_seconds']
-            needs_screenshot = section.get('needs_screenshot', False)
-            print(f"DEBUG: Section {section_order} timestamp={timestamp} needs_screenshot={needs_screenshot} mode={generation_mode}")
+            print(f"DEBUG: Section {section_order} timestamp={section['timestamp_seconds']} needs_screenshot={section.get('needs_screenshot', False)} mode={generation_mode}")
             
-            # Ensure timestamp is within video duration
-            if timestamp > duration:
-                timestamp = max(5.0, duration - 10)
-            
-            image_path = None
-            
-            # Extract screenshot only when AI explicitly requests it
-            # Respects the needs_screenshot flag to avoid unnecessary storyboard extraction
-            if generation_mode == 'text_with_images' and needs_screenshot:
-                screenshot_path = None
-                
-                # Extract screenshot using YouTube Storyboard (no video download needed!)
-                try:
-                    screenshot_filename = f"{video_info['video_id']}_{int(timestamp * 1000)}.jpg"
-                    screenshot_path_obj = project_dir / screenshot_filename
-                    
-                    extractor = StoryboardExtractor(video_url)
-                    extractor.get_thumbnail_at_timestamp(timestamp, screenshot_path_obj)
-                    screenshot_path = str(screenshot_path_obj)
-                    
-                    print(f"   📸 Storyboard Screenshot captured for section {section_order}")
-                except Exception as e:
-                    print(f"   ❌ Storyboard extraction failed: {e}")
-                    screenshot_path = None
-
-                # Upload if we have a valid screenshot
-                if screenshot_path:
-                    try:
-                        image_path = upload_to_supabase_storage(
-                            Path(screenshot_path),
-                            project_id,
-                            section_order
-                        )
-                    except Exception as e_upload:
-                         print(f"   ☁️ Upload failed: {e_upload}")
-            elif generation_mode == 'text_with_images' and not needs_screenshot:
-                # AI determined this section doesn't need a screenshot
-                print(f"   📝 Section {section_order}: No screenshot needed (AI marked needs_screenshot=False)")
-            elif generation_mode == 'text_only':
+            if generation_mode == 'text_only':
                 # Force no screenshot in text-only mode
                 section['needs_screenshot'] = False
                 print(f"   📝 Text-only mode: skipping screenshot for section {section_order}")
@@ -1129,19 +1583,89 @@ def process_project(project: Dict):
                 section['content'] = section.get('title', f'Section {section_order}')
             
             # Save section to database (as step)
+            ensure_lease()
             save_step_to_db(project_id, section, image_path)
+            saved_steps.add(section_order)
+        
+        def discard_steps():
+            if saved_steps:
+                ensure_lease()
+                supabase.table('steps').delete().eq('project_id', project_id).execute()
+                saved_steps.clear()
+        
+        def save_metadata(video_info: Dict):
+            # Recorded right away so failed and retried projects keep title and duration
+            fields = {}
+            if video_info.get('duration'):
+                fields['video_duration_seconds'] = int(video_info['duration'])
+            if video_info.get('title'):
+                fields['title'] = video_info['title'][:200]
+            if fields:
+                update_owned_project(fields)
+        
+        # Steps 1-3 run once per (video, mode, prompt version) across concurrent projects
+        prompt_template = get_prompt_template(generation_mode)
+        prompt_hash = prompt_version(prompt_template)
+        print(f"📝 Prompt version: {prompt_hash}")
+        video_key = extract_video_id(video_url) or video_url
+        guide, shared = guide_flight.do(
+            (video_key, generation_mode, prompt_hash),
+            lambda: prepare_guide(project_id, video_url, generation_mode, prompt_template, checkpoint, project_dir,
+                                  on_step=save_section, on_discard=discard_steps,
+                                  on_metadata=save_metadata),
+        )
+        if shared:
+            print(f"🔗 Reusing analysis of a concurrent project for the same video")
+        
+        video_info = guide['video_info']
+        duration = guide['duration']
+        analysis = guide['analysis']
+        images = guide['images']
+        
+        # Calculate credits cost based on duration
+        credits_cost = estimate_credits_cost(duration)
+        
+        summary = analysis.get('summary', '')
+        sections = analysis['sections']
+        
+        # Update project with actual duration, and summary as title if available
+        title = summary or video_info.get('title') or None
+        update_owned_project({
+            'video_duration_seconds': duration,
+            'title': title[:200] if title else None,
+        })
+        
+        # Step 4: Save the sections that were not streamed as steps
+        # (screenshots of a cached or shared analysis are copied into this project)
+        for section in sections:
+            section_order = section['section_order']
+            if section_order not in saved_steps:
+                image_path = images.get(section_order)
+                if image_path:
+                    image_path = adopt_image(image_path, project_id, section_order)
+                save_section(section, image_path)
         
         # Update project status to completed
-        supabase.table('projects').update({
+        update_owned_project({
             'status': 'completed',
             'credits_cost': credits_cost,
-        }).eq('id', project_id).execute()
+        })
+        
+        # Stages are only needed to resume a retry
+        try:
+            checkpoint.clear()
+        except Exception as e:
+            print(f"⚠️  Could not clear checkpoint: {e}")
         
         print(f"\n✅ Project {project_id} COMPLETED!")
         print(f"   Sections created: {len(sections)}")
         print(f"   Summary: {summary[:100]}..." if len(summary) > 100 else f"   Summary: {summary}")
         print(f"   Credits cost: {credits_cost}")
         
+    except LeaseLost as e:
+        # Another worker owns the project now - leave its steps and status alone
+        print(f"\n⚠️  Abandoning project {project_id}: {e}")
+        
     except Exception as e:
         print(f"\n❌ Error processing project {project_id}: {e}")
         
@@ -1155,7 +1679,7 @@ def process_project(project: Dict):
             supabase.table('projects').update({
                 'status': 'failed',
                 'error_message': str(e)
-            }).eq('id', project_id).execute()
+            }).eq('id', project_id).eq('claimed_by', WORKER_ID).execute()
         except:
             pass
         
@@ -1170,29 +1694,82 @@ def process_project(project: Dict):
             print(f"⚠️  Error cleaning up temp directory: {e}")
 
 
-def worker_loop():
-    """Main worker loop - polls for pending projects"""
+def run_claimed_project(project: Dict, heartbeat: LeaseHeartbeat):
+    """Run process_project while the heartbeat keeps the project's lease alive"""
+    lease = heartbeat.add(project['id'])
+    try:
+        process_project(project, lease)
+    finally:
+        heartbeat.remove(project['id'])
+
+
+def wait_for_new_projects(notifier):
+    """Wait for a pending-project notification, or poll interval if not subscribed"""
+    if notifier and notifier.is_connected:
+        # The reaper runs on its own thread, so only the safety-net poll bounds the wait
+        notifier.wait(timeout=NOTIFY_POLL_INTERVAL)
+    else:
+        time.sleep(POLL_INTERVAL)
+
+
+def worker_loop(notifier=None):
+    """
+    Main worker loop - claims pending projects
+
+    Wakes up on LISTEN/NOTIFY when a notifier is connected, otherwise polls.
+    Pass a job_notifier.LocalNotifier to drive the loop without a live database.
+    """
     print("🚀 Vidoc Worker Started (Subtitle Enhanced Mode)")
     print("🚀 Vidoc Worker - Version: REMOVED_GOOGLE_CLIENT")
     print(f"   Supabase URL: {SUPABASE_URL}")
     print(f"   Storage Bucket: {STORAGE_BUCKET}")
     print(f"   Temp Directory: {TEMP_DIR}")
+    print(f"   Worker ID: {WORKER_ID}")
+    print(f"   Concurrency: {WORKER_CONCURRENCY}")
     print("\nWaiting for projects to process...\n")
     
+    heartbeat = LeaseHeartbeat(supabase, WORKER_ID, LEASE_SECONDS, interval=LEASE_SECONDS / 3)
+    heartbeat.start()
+    executor = ProjectExecutor(lambda project: run_claimed_project(project, heartbeat), WORKER_CONCURRENCY)
+    # Re-queue projects abandoned by crashed workers, independent of claiming
+    reaper = LeaseReaper(supabase, MAX_ATTEMPTS, interval=REAPER_INTERVAL)
+    reaper.start()
+    
+    if notifier is None:
+        notifier = create_notifier(WORKER_NOTIFY_DSN)
+    if notifier:
+        notifier.start()
+    
     while True:
         try:
-            # Fetch pending projects
-            response = supabase.table('projects').select('*').eq('status', 'pending').limit(1).execute()
+            free_slots = executor.free_slots()
+            if free_slots == 0:
+                # All slots busy, wait for a running project to finish
+                executor.wait_for_slot(timeout=5)
+                continue
+            
+            # Atomically claim only as many projects as we can start now
+            projects = claim_projects(
+                supabase, WORKER_ID, free_slots, LEASE_SECONDS,
+                max_per_user=MAX_PROJECTS_PER_USER,
+                seconds_per_credit=SECONDS_PER_CREDIT,
+            )
             
-            if response.data and len(response.data) > 0:
-                project = response.data[0]
-                process_project(project)
+            if projects:
+                for project in projects:
+                    executor.submit(project)
             else:
-                # No pending projects, wait a bit
-                time.sleep(5)
+                # No pending projects, wait for a notification (or poll)
+                wait_for_new_projects(notifier)
                 
         except KeyboardInterrupt:
             print("\n\n👋 Worker stopped by user")
+            print(f"   Waiting for {executor.running_count()} running project(s) to finish...")
+            executor.shutdown(wait_for_running=True)
+            heartbeat.stop()
+            reaper.stop()
+            if notifier:
+                notifier.stop()
             break
         except Exception as e:
             print(f"❌ Error in worker loop: {e}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Local SQLite cache of per-video YouTube metadata
+
+Title, duration, caption track list and storyboard formats of a video
+rarely change, so a slim copy of the yt-dlp info dict is kept per video id
+and reused by download_subtitles_only and StoryboardExtractor instead of
+calling extract_info again.
+
+Videos without usable captions are cached too (negative caching) with a
+shorter TTL, so resubmitting them does not hit YouTube every time.
+
+Caption and storyboard URLs in the info dict are signed and eventually
+expire; the default TTL stays well below that, and callers invalidate()
+an entry when a cached URL stops working.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from captions import rank_caption_tracks
+
+
+def slim_info(info: Dict) -> Dict:
+    """
+    The parts of a yt-dlp info dict the worker needs, small enough to cache
+
+    Keeps metadata, the caption tracks we could actually pick and the
+    storyboard formats; drops the (large) audio/video format list.
+    """
+    wanted = {(track['lang'], track['auto']) for track in rank_caption_tracks(info)}
+    subtitles = {
+        lang: formats for lang, formats in (info.get('subtitles') or {}).items()
+        if (lang, False) in wanted
+    }
+    automatic_captions = {
+        lang: formats for lang, formats in (info.get('automatic_captions') or {}).items()
+        if (lang, True) in wanted
+    }
+    return {
+        'id': info.get('id'),
+        'title': info.get('title'),
+        'duration': info.get('duration'),
+        'language': info.get('language'),
+        'subtitles': subtitles,
+        'automatic_captions': automatic_captions,
+        'formats': [fmt for fmt in (info.get('formats') or []) if fmt.get('format_note') == 'storyboard'],
+        'storyboards': info.get('storyboards'),
+    }
+
+
+class VideoMetadataCache:
+    """
+    SQLite-backed video metadata cache with TTL and negative caching
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float = 3 * 3600, negative_ttl_seconds: float = 3600):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = None
+        if self.enabled:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS video_metadata ("
+                " video_id TEXT PRIMARY KEY,"
+                " info TEXT NOT NULL,"
+                " has_captions INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def get(self, video_id: Optional[str]) -> Optional[Dict]:
+        """Cached slim info dict for a video, or None on miss/expiry"""
+        if not self.enabled or not video_id:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT info, has_captions FROM video_metadata WHERE video_id = ? AND expires_at > ?",
+                (video_id, time.time()),
+            ).fetchone()
+        if not row:
+            return None
+        info = json.loads(row[0])
+        label = "captions" if row[1] else "no captions"
+        print(f"   🗃️ Video metadata cache hit: {video_id} ({label})")
+        return info
+
+    def put(self, info: Dict) -> Dict:
+        """
+        Cache the slim form of an extracted info dict
+
+        Returns:
+            The slim info dict that was stored
+        """
+        slim = slim_info(info)
+        if not self.enabled or not slim.get('id'):
+            return slim
+        has_captions = bool(slim['subtitles'] or slim['automatic_captions'])
+        ttl = self.ttl_seconds if has_captions else self.negative_ttl_seconds
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO video_metadata (video_id, info, has_captions, expires_at) VALUES (?, ?, ?, ?)",
+                (slim["id"], json.dumps(slim, default=str), int(has_captions), time.time() + ttl),
+            )
+            self._conn.commit()
+        return slim
+
+    def invalidate(self, video_id: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM video_metadata WHERE video_id = ?", (video_id,))
+            self._conn.commit()
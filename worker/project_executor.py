@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Bounded in-process executor for projects
+
+A project spends almost all of its time waiting on the network (yt-dlp,
+Gemini, storyboard downloads, Supabase), so one worker process can run
+several of them at once on threads. The executor only tracks capacity;
+the Supabase client and HTTP session are module-level in main.py and
+shared by every running project.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Set
+
+
+class ProjectExecutor:
+    """
+    Runs up to `max_concurrency` projects at the same time
+    """
+
+    def __init__(self, process_fn: Callable[[Dict], None], max_concurrency: int = 1):
+        self.process_fn = process_fn
+        self.max_concurrency = max(1, max_concurrency)
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="project",
+        )
+        self._running: Set[Future] = set()
+        self._lock = threading.Lock()
+
+    def free_slots(self) -> int:
+        """Number of projects that can be started right now"""
+        with self._lock:
+            self._running = {f for f in self._running if not f.done()}
+            return self.max_concurrency - len(self._running)
+
+    def running_count(self) -> int:
+        return self.max_concurrency - self.free_slots()
+
+    def submit(self, project: Dict) -> Future:
+        """Start processing a project in the background"""
+        future = self._pool.submit(self._run, project)
+        with self._lock:
+            self._running.add(future)
+        return future
+
+    def wait_for_slot(self, timeout: float) -> bool:
+        """
+        Block until at least one running project finishes or timeout expires
+
+        Returns:
+            True if a slot is free when this returns
+        """
+        with self._lock:
+            running = set(self._running)
+        if running:
+            wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        return self.free_slots() > 0
+
+    def shutdown(self, wait_for_running: bool = True):
+        self._pool.shutdown(wait=wait_for_running)
+
+    def _run(self, project: Dict):
+        try:
+            self.process_fn(project)
+        except Exception as e:
+            # process_project records its own failures; this only guards the pool
+            print(f"❌ Unhandled error in project {project.get('id')}: {e}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+In-process cache of prompts stored in `system_configs`
+
+Every project used to read its prompt from the database before the Gemini
+call. Now the value is kept in memory together with the row's
+`updated_at`:
+
+- fresh (younger than ttl_seconds): served from memory
+- stale: still served from memory, and a background thread revalidates it.
+  The refresh only asks for `updated_at`; the full value is fetched again
+  only when that changed, so prompt edits take effect within about
+  ttl_seconds without making projects wait.
+- missing (first use): loaded synchronously
+
+A prompt that cannot be loaded falls back to the caller's default, which
+is cached for ttl_seconds as well so a database outage does not add a
+failing query to every project. A refresh that finds the row deleted
+drops the entry instead; only transient errors keep serving stale data.
+
+Prompt versions (for cache keys and logs) come from main.prompt_version.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+# PostgREST error code of .single() when no row matched
+NOT_FOUND_CODE = 'PGRST116'
+
+
+def is_not_found(error: Exception) -> bool:
+    """True if a .single() query failed because the row does not exist"""
+    return getattr(error, 'code', None) == NOT_FOUND_CODE or NOT_FOUND_CODE in str(error)
+
+
+class _Entry:
+    __slots__ = ('value', 'updated_at', 'checked_at', 'refreshing', 'from_db')
+
+    def __init__(self, value: str, updated_at: Optional[str], from_db: bool):
+        self.value = value
+        self.updated_at = updated_at
+        self.checked_at = time.monotonic()
+        self.refreshing = False
+        self.from_db = from_db
+
+
+class PromptCache:
+    """
+    TTL cache of system_configs values with background revalidation
+    """
+
+    def __init__(self, supabase, ttl_seconds: float = 30):
+        self.supabase = supabase
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: str) -> str:
+        """Current value of a config key, or default when it has none"""
+        if self.ttl_seconds <= 0:
+            return self._load(key, default).value
+
+        with self._lock:
+            entry = self._entries.get(key)
+            stale = entry is not None and time.monotonic() - entry.checked_at >= self.ttl_seconds
+            if stale and not entry.refreshing:
+                entry.refreshing = True
+                threading.Thread(target=self._refresh, args=(key, default), daemon=True,
+                                 name=f"prompt-refresh-{key}").start()
+        if entry is None:
+            entry = self._load(key, default)
+            with self._lock:
+                self._entries[key] = entry
+        # The entry only holds the DB value or the default it was created with
+        return entry.value if entry.from_db else default
+
+    def invalidate(self, key: Optional[str] = None):
+        """Forget one key (or all); the next get() loads synchronously"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _load(self, key: str, default: str) -> _Entry:
+        try:
+            response = self.supabase.table('system_configs').select('value, updated_at').eq('key', key).single().execute()
+            if response.data and response.data.get('value'):
+                entry = _Entry(response.data['value'], response.data.get('updated_at'), from_db=True)
+                print(f"✨ Loaded dynamic prompt from DB: {key} (updated {entry.updated_at})")
+                return entry
+        except Exception as e:
+            print(f"⚠️  Failed to load dynamic prompt (key: {key}), using default. Error: {e}")
+        return _Entry(default, None, from_db=False)
+
+    def _refresh(self, key: str, default: str):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return
+        try:
+            response = self.supabase.table('system_configs').select('updated_at').eq('key', key).single().execute()
+            updated_at = (response.data or {}).get('updated_at')
+            unchanged = entry.from_db and updated_at == entry.updated_at
+        except Exception as e:
+            if is_not_found(e):
+                # Row deleted: forget it, the next get() falls back to the default
+                print(f"🗑️  Prompt {key} no longer exists, dropping cached value")
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+                return
+            # Transient: keep serving what we have; try again after another TTL
+            print(f"⚠️  Prompt refresh failed (key: {key}): {e}")
+            unchanged = True
+
+        fresh = entry if unchanged else self._load(key, default)
+        if fresh is not entry and fresh.value != entry.value:
+            print(f"🔄 Prompt {key} changed (updated {entry.updated_at} -> {fresh.updated_at})")
+        with self._lock:
+            fresh.checked_at = time.monotonic()
+            fresh.refreshing = False
+            if self._entries.get(key) is entry:
+                self._entries[key] = fresh
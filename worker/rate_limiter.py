@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Shared token-bucket rate limiting for Gemini calls
+
+Each model has two buckets, requests per minute (RPM) and tokens per
+minute (TPM), refilled continuously. acquire() takes one request and the
+estimated prompt tokens, sleeping until both buckets have enough, so
+concurrent projects and workers spread their calls over the minute
+instead of all failing with 429 at once.
+
+A 429 (ResourceExhausted) blocks the model for the retry delay the API
+suggests (block()), for every process sharing the buckets.
+
+Bucket state lives in a store shared by the processes that use it:
+- SqliteBucketStore: a local file (all workers on one host)
+- PostgresBucketStore: the `gemini_rate_limits` table
+  (supabase/migrations/20261016000006_gemini_rate_limits.sql), for
+  workers on several hosts
+- MemoryBucketStore: this process only
+
+Store errors fail open: a broken limiter never stops analyses.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import psycopg2
+    PSYCOPG2_AVAILABLE = True
+except ImportError:
+    PSYCOPG2_AVAILABLE = False
+
+
+# (requests per minute, tokens per minute); 0 means unlimited
+Limits = Tuple[float, float]
+# (request bucket, token bucket, updated_at, blocked_until)
+BucketState = Tuple[float, float, float, float]
+
+_RETRY_IN_RE = re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE)
+_RETRY_DELAY_RE = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)")
+
+
+class RateLimitExceeded(Exception):
+    """Waiting for a model's quota would take longer than allowed"""
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Limits]:
+    """
+    Limits from "model=rpm:tpm,model=rpm:tpm" (tpm optional)
+
+    e.g. "gemini-2.5-pro=150:2000000,gemini-flash-latest=1000"
+    """
+    limits = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        model, _, values = item.partition('=')
+        rpm, _, tpm = values.partition(':')
+        limits[model.strip()] = (float(rpm or 0), float(tpm or 0))
+    return limits
+
+
+def is_rate_limit_error(error) -> bool:
+    """
+    True for quota/429 errors from the Gemini SDK (google.api_core ResourceExhausted)
+
+    Matched on the status code, the exception type or '429' / 'resource exhausted'
+    in the message - not on 'quota' alone, which also appears in unrelated errors
+    such as "Invalid value for quota_project_id".
+    """
+    if getattr(error, 'code', None) == 429 or type(error).__name__ in ('ResourceExhausted', 'TooManyRequests'):
+        return True
+    message = str(error).lower()
+    return '429' in message or 'resource exhausted' in message or 'resource_exhausted' in message
+
+
+def retry_after_seconds(error) -> Optional[float]:
+    """Retry delay suggested by a 429 (RetryInfo detail, Retry-After header or message)"""
+    for detail in getattr(error, 'details', None) or []:
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None and hasattr(delay, 'seconds'):
+            return delay.seconds + getattr(delay, 'nanos', 0) / 1e9
+    response = getattr(error, 'response', None)
+    header = getattr(response, 'headers', {}).get('retry-after') if response is not None else None
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    message = str(error)
+    match = _RETRY_IN_RE.search(message) or _RETRY_DELAY_RE.search(message)
+    return float(match.group(1)) if match else None
+
+
+def take(state: Optional[BucketState], limits: Limits, tokens: float, now: float) -> Tuple[float, BucketState]:
+    """
+    Refill the buckets and take one request plus tokens from them
+
+    Returns:
+        (wait, new state): wait is 0 when the request was granted (and
+        deducted), otherwise the seconds until it could be
+    """
+    rpm, tpm = limits
+    if state is None:
+        state = (rpm, tpm, now, 0.0)
+    requests, token_level, updated_at, blocked_until = state
+    elapsed = max(0.0, now - updated_at)
+    requests = min(rpm, requests + elapsed * rpm / 60)
+    token_level = min(tpm, token_level + elapsed * tpm / 60)
+    # A prompt larger than the whole bucket would never fit: wait for a full bucket
+    tokens = min(tokens, tpm)
+
+    wait = max(0.0, blocked_until - now)
+    if rpm and requests < 1:
+        wait = max(wait, (1 - requests) * 60 / rpm)
+    if tpm and token_level < tokens:
+        wait = max(wait, (tokens - token_level) * 60 / tpm)
+    if wait == 0:
+        requests -= 1 if rpm else 0
+        token_level -= tokens if tpm else 0
+    return wait, (requests, token_level, now, blocked_until)
+
+
+class MemoryBucketStore:
+    """Buckets of this process only"""
+
+    def __init__(self):
+        self._states: Dict[str, BucketState] = {}
+        self._lock = threading.Lock()
+
+    def take(self, model: str, limits: Limits, tokens: float) -> float:
+        with self._lock:
+            wait, self._states[model] = take(self._states.get(model), limits, tokens, time.time())
+        return wait
+
+    def block(self, model: str, limits: Limits, until: float):
+        with self._lock:
+            requests, token_level, updated_at, blocked_until = self._states.get(model) or (*limits, time.time(), 0.0)
+            self._states[model] = (requests, token_level, updated_at, max(blocked_until, until))
+
+
+class SqliteBucketStore:
+    """Buckets in a SQLite file, shared by every process on the host"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS gemini_rate_limits ("
+            " model TEXT PRIMARY KEY,"
+            " requests REAL NOT NULL,"
+            " tokens REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " blocked_until REAL NOT NULL)"
+        )
+
+    def _update(self, model: str, change) -> float:
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front: read-modify-write is atomic across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT requests, tokens, updated_at, blocked_until FROM gemini_rate_limits WHERE model = ?",
+                    (model,),
+                ).fetchone()
+                result, state = change(tuple(row) if row else None)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO gemini_rate_limits (model, requests, tokens, updated_at, blocked_until)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (model, *state),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def take(self, model: str, limits: Limits, tokens: float) -> float:
+        return self._update(model, lambda state: take(state, limits, tokens, time.time()))
+
+    def block(self, model: str, limits: Limits, until: float):
+        def change(state):
+            requests, token_level, updated_at, blocked_until = state or (*limits, time.time(), 0.0)
+            return None, (requests, token_level, updated_at, max(blocked_until, until))
+        self._update(model, change)
+
+
+class PostgresBucketStore:
+    """Buckets in Postgres, shared by workers on every host"""
+
+    def __init__(self, dsn: str):
+        if not PSYCOPG2_AVAILABLE:
+            raise RuntimeError("psycopg2 is required for PostgresBucketStore")
+        self.dsn = dsn
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _update(self, model: str, change):
+        with self._lock:
+            if self._conn is None or self._conn.closed:
+                self._conn = psycopg2.connect(self.dsn)
+            try:
+                with self._conn.cursor() as cur:
+                    cur.execute(
+                        "INSERT INTO public.gemini_rate_limits (model) VALUES (%s) ON CONFLICT (model) DO NOTHING",
+                        (model,),
+                    )
+                    cur.execute(
+                        "SELECT requests, tokens, updated_at, blocked_until FROM public.gemini_rate_limits"
+                        " WHERE model = %s FOR UPDATE",
+                        (model,),
+                    )
+                    row = cur.fetchone()
+                    # A new row has NULL buckets: start full
+                    result, state = change(tuple(row) if row and row[0] is not None else None)
+                    cur.execute(
+                        "UPDATE public.gemini_rate_limits SET requests = %s, tokens = %s, updated_at = %s,"
+                        " blocked_until = %s WHERE model = %s",
+                        (*state, model),
+                    )
+                self._conn.commit()
+            except BaseException:
+                try:
+                    self._conn.rollback()
+                except Exception:
+                    self._conn = None
+                raise
+        return result
+
+    def take(self, model: str, limits: Limits, tokens: float) -> float:
+        return self._update(model, lambda state: take(state, limits, tokens, time.time()))
+
+    def block(self, model: str, limits: Limits, until: float):
+        def change(state):
+            requests, token_level, updated_at, blocked_until = state or (*limits, time.time(), 0.0)
+            return None, (requests, token_level, updated_at, max(blocked_until, until))
+        self._update(model, change)
+
+
+class RateLimiter:
+    """
+    Per-model RPM/TPM limits over a shared bucket store
+    """
+
+    def __init__(self, store, limits: Dict[str, Limits], max_wait: float = 120,
+                 default_retry_after: float = 30):
+        self.store = store
+        self.limits = limits
+        self.max_wait = max_wait
+        self.default_retry_after = default_retry_after
+
+    def acquire(self, model: str, tokens: float = 0, cancelled: Optional[threading.Event] = None) -> float:
+        """
+        Wait until model has quota for one request of tokens, then take it
+
+        Returns early, without taking quota, once `cancelled` is set.
+
+        Returns:
+            Seconds waited
+
+        Raises:
+            RateLimitExceeded: the quota would not be available within max_wait
+        """
+        limits = self.limits.get(model, (0, 0))
+        waited = 0.0
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                return waited
+            try:
+                wait = self.store.take(model, limits, tokens)
+            except Exception as e:
+                print(f"⚠️ Rate limiter unavailable ({e}), not limiting {model}")
+                return waited
+            if wait <= 0:
+                if waited:
+                    print(f"   🚦 Waited {waited:.1f}s for {model} quota")
+                return waited
+            if waited + wait > self.max_wait:
+                raise RateLimitExceeded(f"{model} quota not available within {self.max_wait:.0f}s (next in {wait:.1f}s)")
+            if cancelled is not None:
+                cancelled.wait(wait)
+            else:
+                time.sleep(wait)
+            waited += wait
+
+    def block(self, model: str, error=None) -> float:
+        """
+        Pause model for everyone after a 429
+
+        Returns:
+            The pause in seconds (retry delay of the error, or the default)
+        """
+        delay = (retry_after_seconds(error) if error is not None else None) or self.default_retry_after
+        try:
+            self.store.block(model, self.limits.get(model, (0, 0)), time.time() + delay)
+        except Exception as e:
+            print(f"⚠️ Rate limiter unavailable ({e}), could not pause {model}")
+        print(f"   🚦 {model} rate limited, pausing it for {delay:.1f}s")
+        return delay
+
+
+def create_rate_limiter(backend: str, limits: Dict[str, Limits], path: Optional[Path] = None,
+                        dsn: Optional[str] = None, **kwargs) -> RateLimiter:
+    """
+    Limiter with the configured store: sqlite (default), postgres or memory
+
+    Falls back to an in-process store when the shared one is unavailable.
+    """
+    store = None
+    try:
+        if backend == 'postgres':
+            if not dsn:
+                raise RuntimeError("no database DSN configured")
+            store = PostgresBucketStore(dsn)
+        elif backend == 'sqlite' and path:
+            store = SqliteBucketStore(path)
+    except Exception as e:
+        print(f"⚠️ Gemini rate limit store '{backend}' unavailable ({e}), limiting per process")
+    if store is None:
+        store = MemoryBucketStore()
+
+    if limits:
+        described = ', '.join(f"{model} {rpm:g} RPM / {tpm:g} TPM" for model, (rpm, tpm) in limits.items())
+        print(f"🚦 Gemini rate limits ({type(store).__name__}): {described}")
+    return RateLimiter(store, limits, **kwargs)
@@ -1,8 +1,12 @@
 
 import os
+import re
+import sys
 from dotenv import load_dotenv
 from supabase import create_client
 
+from analysis_cache import AnalysisCache
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
@@ -14,6 +18,11 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# By default the stage checkpoint is kept so the worker resumes where it stopped
+# (no new subtitle download / Gemini call). Pass --fresh to start from scratch:
+# the checkpoint and the cached analysis of the video are dropped as well.
+fresh = '--fresh' in sys.argv
+
 # Get latest project
 response = supabase.table('projects').select('*').order('created_at', desc=True).limit(1).execute()
 
@@ -21,13 +30,24 @@ if response.data:
     project_id = response.data[0]['id']
     print(f"🔄 Resetting project {project_id} to PENDING...")
     try:
-        supabase.table('projects').update({
-            'status': 'pending',
-            'error_message': None
-        }).eq('id', project_id).execute()
+        if fresh:
+            supabase.table('project_checkpoints').delete().eq('project_id', project_id).execute()
+            print("🧹 Clearing stage checkpoint (--fresh)")
+            match = re.search(r'(?:v=|/)([a-zA-Z0-9_-]{11})', response.data[0].get('video_source_url') or '')
+            if match:
+                AnalysisCache(supabase).invalidate(video_id=match.group(1))
+                print(f"🧹 Clearing cached analysis of video {match.group(1)} (--fresh)")
         
         # Delete existing steps to avoid duplicates
         supabase.table('steps').delete().eq('project_id', project_id).execute()
+        
+        # Last: going back to pending notifies the workers, which may claim it right away
+        reset_fields = {
+            'status': 'pending',
+            'error_message': None,
+            'attempt_count': 0,
+        }
+        supabase.table('projects').update(reset_fields).eq('id', project_id).execute()
         print("✅ Reset complete.")
     except Exception as e:
         print(f"❌ Error resetting project: {e}")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Incremental section processing while Gemini is still generating
+
+analyze_with_model() streams the response and hands over every section
+as soon as its JSON object is complete (see
+analysis_schema.SectionStreamDecoder). The classes here sit between that
+stream and process_project:
+
+- SectionRelay picks which streamed sections go downstream. Hedged calls
+  (see hedging.py) may stream two models at once; the first one to
+  produce a section owns the output. If it fails later, or another model
+  ends up winning, downstream is reset and fed the right sections.
+- SectionPipeline runs the per-section work (screenshot, upload, steps
+  insert) in background threads while the stream continues. A reset
+  discards everything done so far, including results still in flight.
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class SectionRelay:
+    """
+    Forwards the streamed sections of one attempt among concurrent ones
+    """
+
+    def __init__(self, on_section: Callable[[Dict], None], on_reset: Callable[[], None]):
+        self.on_section = on_section
+        self.on_reset = on_reset
+        self.owner: Optional[Hashable] = None
+        self._streamed: Dict[Hashable, List[Dict]] = {}
+        self._settled = False
+        self._lock = threading.Lock()
+
+    def answering(self) -> bool:
+        """True once some attempt is streaming sections downstream"""
+        return self.owner is not None
+
+    def emit(self, attempt: Hashable, section: Dict):
+        with self._lock:
+            if self._settled:
+                return
+            self._streamed.setdefault(attempt, []).append(section)
+            if self.owner is None:
+                self.owner = attempt
+            if self.owner == attempt:
+                self.on_section(section)
+
+    def fail(self, attempt: Hashable):
+        """attempt died; hand the output to another attempt that is streaming"""
+        with self._lock:
+            if self._settled:
+                return
+            self._streamed.pop(attempt, None)
+            if self.owner != attempt:
+                return
+            print(f"   ↩️ Discarding sections streamed by {attempt}")
+            self.owner = None
+            self.on_reset()
+            if self._streamed:
+                self.owner, sections = next(iter(self._streamed.items()))
+                for section in sections:
+                    self.on_section(section)
+
+    def settle(self, attempt: Hashable, sections: List[Dict]):
+        """
+        attempt won with the final sections: forward what the stream did not
+
+        If other sections were forwarded (another owner, or a stream that
+        differs from the final decode) downstream is reset first.
+        """
+        with self._lock:
+            self._settled = True
+            forwarded = self._streamed.get(self.owner, []) if self.owner is not None else []
+            if self.owner != attempt or sections[:len(forwarded)] != forwarded:
+                if forwarded:
+                    print(f"   ↩️ Streamed sections of {self.owner} replaced by the result of {attempt}")
+                    self.on_reset()
+                forwarded = []
+            for section in sections[len(forwarded):]:
+                self.on_section(section)
+            self.owner = attempt
+
+
+class SectionPipeline:
+    """
+    Runs process(section) in the background and deliver(section, result) for each
+
+    Deliveries and discards are serialized, so a reset never interleaves
+    with a delivery and nothing from before a reset is delivered after it.
+    """
+
+    def __init__(self, process: Callable[[Dict], Any], deliver: Callable[[Dict, Any], None],
+                 discard: Optional[Callable[[], None]] = None, max_workers: int = 1):
+        self.process = process
+        self.deliver = deliver
+        self.discard = discard
+        # {section_order: process() result} of the sections delivered since the last reset
+        self.results: Dict[int, Any] = {}
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="section")
+        self._futures: List[Future] = []
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def submit(self, section: Dict):
+        epoch = self._epoch
+
+        def run():
+            if epoch != self._epoch:
+                return
+            result = self.process(section)
+            with self._lock:
+                if epoch != self._epoch:
+                    return
+                self.deliver(section, result)
+                self.results[section['section_order']] = result
+
+        self._futures.append(self._pool.submit(run))
+
+    def reset(self):
+        with self._lock:
+            self._epoch += 1
+            self.results.clear()
+            if self.discard:
+                self.discard()
+
+    def join(self):
+        """Wait for all submitted sections; re-raises the first failure"""
+        try:
+            for future in list(self._futures):
+                future.result()
+        finally:
+            self._pool.shutdown(wait=False)
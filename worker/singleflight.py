@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Single-flight call coalescing
+
+When several projects for the same video (same generation mode and prompt
+version) run at the same time, only the first one downloads subtitles,
+calls Gemini and fetches storyboards. The others wait for its result and
+then only write their own `steps` rows.
+
+Errors that only concern the leader (e.g. job_queue.LeaseLost raised by
+its own step callbacks) are not shared: the waiting callers run the call
+again, one of them as the new leader.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple, Type
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution
+    """
+
+    def __init__(self, leader_only: Tuple[Type[BaseException], ...] = ()):
+        self.leader_only = leader_only
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn() unless a call with the same key is already in flight
+
+        Returns:
+            (result, shared) - shared is True when the result came from
+            another caller's execution. The leader's exception is re-raised
+            in every waiting caller, except for leader_only errors, after
+            which the waiting callers retry.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is not None:
+                    call.waiters += 1
+                    leader = False
+                else:
+                    call = _Call()
+                    self._calls[key] = call
+                    leader = True
+
+            if leader:
+                break
+            call.done.wait()
+            if call.error is None:
+                return call.result, True
+            if not isinstance(call.error, self.leader_only):
+                raise call.error
+            print(f"🔁 Leader of a coalesced call gave up ({type(call.error).__name__}), retrying")
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+        if call.waiters:
+            print(f"🔗 Shared result with {call.waiters} concurrent duplicate project(s)")
+        return call.result, False
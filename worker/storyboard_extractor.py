@@ -20,10 +20,14 @@ class StoryboardExtractor:
     提取 YouTube Storyboard（预览拼图）并裁剪特定时间点的缩略图
     """
     
-    def __init__(self, video_url: str):
+    def __init__(self, video_url: str, session: Optional[requests.Session] = None, info: Optional[Dict] = None):
         self.video_url = video_url
         self.video_id = self._extract_video_id(video_url)
         self.storyboard_spec = None
+        # 已提取的 yt-dlp info（与字幕阶段共用，避免再次请求 YouTube）
+        self.info = info
+        # 共享的 keep-alive 会话（并发项目之间复用连接）
+        self.session = session or requests
         
     def _extract_video_id(self, url: str) -> str:
         """从 URL 提取视频 ID"""
@@ -63,61 +67,65 @@ class StoryboardExtractor:
             'skip_download': True,
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(self.video_url, download=False)
-            
-            # 尝试从 info 中提取 storyboard
-            # YouTube 的 storyboard 信息通常在以下几个地方
-            storyboard_data = None
-            
-            # 方法 1: 查找 formats 中的 storyboard
-            if 'formats' in info:
-                for fmt in info['formats']:
-                    if fmt.get('format_note') == 'storyboard':
-                        storyboard_data = fmt
-                        break
-            
-            # 方法 2: 直接查找 storyboards 字段
-            if not storyboard_data and 'storyboards' in info:
-                storyboard_data = info['storyboards']
-            
-            # 方法 3: 构造默认的 storyboard URL（YouTube 的通用格式）
-            if not storyboard_data:
-                print("⚠️ No storyboard found in info, using fallback URL pattern")
-                # 使用 YouTube 的标准 storyboard URL 格式
-                # 格式：https://i.ytimg.com/sb/VIDEO_ID/storyboard3_L2/M$M.jpg
+        if self.info is None:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                self.info = ydl.extract_info(self.video_url, download=False)
+        else:
+            print("   ♻️ Reusing video info extracted for this project")
+        info = self.info
+        
+        # 尝试从 info 中提取 storyboard
+        # YouTube 的 storyboard 信息通常在以下几个地方
+        storyboard_data = None
+        
+        # 方法 1: 查找 formats 中的 storyboard
+        if 'formats' in info:
+            for fmt in info['formats']:
+                if fmt.get('format_note') == 'storyboard':
+                    storyboard_data = fmt
+                    break
+        
+        # 方法 2: 直接查找 storyboards 字段
+        if not storyboard_data and 'storyboards' in info:
+            storyboard_data = info['storyboards']
+        
+        # 方法 3: 构造默认的 storyboard URL（YouTube 的通用格式）
+        if not storyboard_data:
+            print("⚠️ No storyboard found in info, using fallback URL pattern")
+            # 使用 YouTube 的标准 storyboard URL 格式
+            # 格式：https://i.ytimg.com/sb/VIDEO_ID/storyboard3_L2/M$M.jpg
+            self.storyboard_spec = {
+                'url_template': f'https://i.ytimg.com/sb/{self.video_id}/storyboard3_L2/M$M.jpg',
+                'tile_width': 160,
+                'tile_height': 90,
+                'tiles_per_row': 10,
+                'tiles_per_col': 10,
+                'interval_ms': 2000,  # 2 seconds per thumbnail
+            }
+            return self.storyboard_spec
+        
+        # 解析 storyboard 数据
+        if isinstance(storyboard_data, dict):
+            url = storyboard_data.get('url', '')
+            if url:
                 self.storyboard_spec = {
-                    'url_template': f'https://i.ytimg.com/sb/{self.video_id}/storyboard3_L2/M$M.jpg',
-                    'tile_width': 160,
-                    'tile_height': 90,
-                    'tiles_per_row': 10,
-                    'tiles_per_col': 10,
-                    'interval_ms': 2000,  # 2 seconds per thumbnail
+                    'url_template': url,
+                    'tile_width': storyboard_data.get('width', 160),
+                    'tile_height': storyboard_data.get('height', 90),
+                    'tiles_per_row': storyboard_data.get('columns', 10),
+                    'tiles_per_col': storyboard_data.get('rows', 10),
+                    'interval_ms': storyboard_data.get('interval', 2000),
                 }
-                return self.storyboard_spec
-            
-            # 解析 storyboard 数据
-            if isinstance(storyboard_data, dict):
-                url = storyboard_data.get('url', '')
-                if url:
-                    self.storyboard_spec = {
-                        'url_template': url,
-                        'tile_width': storyboard_data.get('width', 160),
-                        'tile_height': storyboard_data.get('height', 90),
-                        'tiles_per_row': storyboard_data.get('columns', 10),
-                        'tiles_per_col': storyboard_data.get('rows', 10),
-                        'interval_ms': storyboard_data.get('interval', 2000),
-                    }
-                else:
-                    raise Exception("Storyboard data found but no URL")
             else:
-                raise Exception("Invalid storyboard data format")
-            
-            print(f"✅ Storyboard: {self.storyboard_spec['tile_width']}x{self.storyboard_spec['tile_height']}, "
-                  f"{self.storyboard_spec['tiles_per_row']}x{self.storyboard_spec['tiles_per_col']} grid, "
-                  f"interval={self.storyboard_spec['interval_ms']}ms")
-            
-            return self.storyboard_spec
+                raise Exception("Storyboard data found but no URL")
+        else:
+            raise Exception("Invalid storyboard data format")
+        
+        print(f"✅ Storyboard: {self.storyboard_spec['tile_width']}x{self.storyboard_spec['tile_height']}, "
+              f"{self.storyboard_spec['tiles_per_row']}x{self.storyboard_spec['tiles_per_col']} grid, "
+              f"interval={self.storyboard_spec['interval_ms']}ms")
+        
+        return self.storyboard_spec
     
     def get_thumbnail_at_timestamp(self, timestamp_seconds: float, output_path: Path) -> str:
         """
@@ -159,7 +167,7 @@ class StoryboardExtractor:
         
         try:
             # 下载 storyboard 图片
-            response = requests.get(storyboard_url, timeout=30)
+            response = self.session.get(storyboard_url, timeout=30)
             response.raise_for_status()
             
             #加载图片
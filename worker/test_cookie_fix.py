@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Direct test of cookie handling and subtitle download for YouTube URL.
-This tests the newly added get_youtube_cookies_path() function.
+This tests the cookie pool loaded by main.py at startup.
 """
 
 import sys
@@ -10,7 +10,7 @@ from pathlib import Path
 # Add worker directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from main import get_youtube_cookies_path, download_subtitles_only
+from main import youtube_cookies, download_subtitles_only
 from dotenv import load_dotenv
 import tempfile
 
@@ -22,18 +22,12 @@ print("🧪 Testing Cookie Handler & Subtitle Download")
 print("="*60)
 print()
 
-# Test 1: Cookie Path Resolution
-print("Test 1: Cookie Path Resolution")
+# Test 1: Cookie Pool
+print("Test 1: Cookie Pool")
 print("-" * 40)
-cookies_path = get_youtube_cookies_path()
-if cookies_path:
-    print(f"✅ Cookie path resolved: {cookies_path}")
-    cookie_file = Path(cookies_path)
-    if cookie_file.exists():
-        size = cookie_file.stat().st_size
-        print(f"✅ Cookie file exists ({size} bytes)")
-    else:
-        print(f"❌ Cookie file does not exist at resolved path!")
+if len(youtube_cookies):
+    for jar in youtube_cookies.jars:
+        print(f"✅ Cookie jar loaded: {jar.name} ({len(jar.content)} chars)")
 else:
     print("⚠️  No cookies found (subtitle download may fail)")
 print()
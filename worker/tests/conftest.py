@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Worker modules are imported as top-level modules (python main.py from worker/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,66 @@
+import threading
+import time
+
+import pytest
+
+from hedging import HedgeCancelled, hedged_call
+
+
+def test_fast_first_candidate_wins_without_starting_others():
+    started = []
+
+    def fn(candidate, cancelled):
+        started.append(candidate)
+        return candidate.upper()
+
+    assert hedged_call(fn, ['a', 'b'], hedge_after=1) == ('A', 'a')
+    assert started == ['a']
+
+
+def test_slow_candidate_is_hedged_and_loser_is_cancelled():
+    loser_cancelled = threading.Event()
+
+    def fn(candidate, cancelled):
+        if candidate == 'slow':
+            # Stand-in for a blocking Gemini call that checks at safe points
+            while not cancelled.wait(0.01):
+                pass
+            loser_cancelled.set()
+            raise HedgeCancelled(candidate)
+        return 'fast result'
+
+    assert hedged_call(fn, ['slow', 'fast'], hedge_after=0.05) == ('fast result', 'fast')
+    assert loser_cancelled.wait(1)
+
+
+def test_failure_falls_back_to_next_candidate_immediately():
+    def fn(candidate, cancelled):
+        if candidate == 'broken':
+            raise RuntimeError("boom")
+        return candidate
+
+    started = time.monotonic()
+    assert hedged_call(fn, ['broken', 'ok'], hedge_after=10) == ('ok', 'ok')
+    assert time.monotonic() - started < 1
+
+
+def test_all_candidates_failing_raises_last_error():
+    def fn(candidate, cancelled):
+        raise ValueError(candidate)
+
+    with pytest.raises(ValueError, match='second'):
+        hedged_call(fn, ['first', 'second'])
+
+
+def test_answering_postpones_hedge():
+    started = []
+
+    def fn(candidate, cancelled):
+        started.append(candidate)
+        time.sleep(0.15)
+        return candidate
+
+    result = hedged_call(fn, ['streaming', 'backup'], hedge_after=0.03, answering=lambda: True)
+
+    assert result == ('streaming', 'streaming')
+    assert started == ['streaming']
@@ -0,0 +1,40 @@
+import threading
+import time
+
+from job_notifier import LocalNotifier
+
+
+def test_notify_wakes_waiting_worker_before_timeout():
+    notifier = LocalNotifier()
+    threading.Timer(0.05, notifier.notify).start()
+
+    started = time.monotonic()
+    woken = notifier.wait(timeout=5)
+
+    assert woken
+    assert time.monotonic() - started < 1
+
+
+def test_wait_times_out_without_notification():
+    notifier = LocalNotifier()
+
+    started = time.monotonic()
+    assert not notifier.wait(timeout=0.05)
+    assert time.monotonic() - started >= 0.05
+
+
+def test_notifications_before_wait_coalesce_into_one_wakeup():
+    notifier = LocalNotifier()
+    notifier.notify("a")
+    notifier.notify("b")
+
+    assert notifier.wait(timeout=0)
+    assert not notifier.wait(timeout=0.01)
+
+
+def test_stop_wakes_and_disconnects():
+    notifier = LocalNotifier()
+    threading.Timer(0.05, notifier.stop).start()
+
+    assert notifier.wait(timeout=5)
+    assert not notifier.is_connected
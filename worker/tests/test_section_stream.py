@@ -0,0 +1,68 @@
+from section_stream import SectionRelay
+
+
+def section(order, title=None):
+    return {'section_order': order, 'title': title or f"s{order}"}
+
+
+class Downstream:
+    def __init__(self):
+        self.events = []
+
+    def on_section(self, value):
+        self.events.append(('section', value['section_order'], value['title']))
+
+    def on_reset(self):
+        self.events.append(('reset',))
+
+
+def make_relay():
+    downstream = Downstream()
+    return SectionRelay(downstream.on_section, downstream.on_reset), downstream
+
+
+def test_first_streaming_attempt_owns_output():
+    relay, downstream = make_relay()
+    relay.emit('pro', section(1, 'pro'))
+    relay.emit('flash', section(1, 'flash'))
+    relay.emit('pro', section(2, 'pro'))
+    relay.settle('pro', [section(1, 'pro'), section(2, 'pro'), section(3, 'pro')])
+
+    assert downstream.events == [
+        ('section', 1, 'pro'),
+        ('section', 2, 'pro'),
+        ('section', 3, 'pro'),
+    ]
+
+
+def test_failed_owner_hands_over_to_other_stream_in_order():
+    relay, downstream = make_relay()
+    relay.emit('pro', section(1, 'pro'))
+    relay.emit('flash', section(1, 'flash'))
+    relay.emit('flash', section(2, 'flash'))
+    relay.fail('pro')
+    relay.emit('flash', section(3, 'flash'))
+    relay.settle('flash', [section(1, 'flash'), section(2, 'flash'), section(3, 'flash')])
+
+    assert downstream.events == [
+        ('section', 1, 'pro'),
+        ('reset',),
+        ('section', 1, 'flash'),
+        ('section', 2, 'flash'),
+        ('section', 3, 'flash'),
+    ]
+
+
+def test_other_winner_replaces_streamed_sections():
+    relay, downstream = make_relay()
+    relay.emit('pro', section(1, 'pro'))
+    relay.settle('flash', [section(1, 'flash'), section(2, 'flash')])
+    # Late output of the loser is ignored
+    relay.emit('pro', section(2, 'pro'))
+
+    assert downstream.events == [
+        ('section', 1, 'pro'),
+        ('reset',),
+        ('section', 1, 'flash'),
+        ('section', 2, 'flash'),
+    ]
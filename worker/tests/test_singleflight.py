@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+class LeaderOnly(Exception):
+    pass
+
+
+def run_concurrently(flight, key, leader_fn, follower_fn):
+    """Start a leader, then a follower while the leader is still running"""
+    leader_running = threading.Event()
+    release = threading.Event()
+    results = {}
+
+    def leader():
+        def fn():
+            leader_running.set()
+            release.wait(5)
+            return leader_fn()
+        try:
+            results['leader'] = flight.do(key, fn)
+        except Exception as e:
+            results['leader'] = e
+
+    def follower():
+        try:
+            results['follower'] = flight.do(key, follower_fn)
+        except Exception as e:
+            results['follower'] = e
+
+    t1 = threading.Thread(target=leader)
+    t1.start()
+    assert leader_running.wait(5)
+    t2 = threading.Thread(target=follower)
+    t2.start()
+    # Give the follower time to join the in-flight call
+    t2.join(0.1)
+    release.set()
+    t1.join(5)
+    t2.join(5)
+    return results
+
+
+def test_follower_shares_leader_result():
+    results = run_concurrently(SingleFlight(), 'k', lambda: 'value', lambda: 'own')
+
+    assert results['leader'] == ('value', False)
+    assert results['follower'] == ('value', True)
+
+
+def test_follower_gets_leader_error():
+    def boom():
+        raise ValueError("no subtitles")
+
+    results = run_concurrently(SingleFlight(), 'k', boom, lambda: 'own')
+
+    assert isinstance(results['follower'], ValueError)
+
+
+def test_leader_only_error_makes_follower_run_itself():
+    def lost():
+        raise LeaderOnly()
+
+    results = run_concurrently(SingleFlight(leader_only=(LeaderOnly,)), 'k', lost, lambda: 'own')
+
+    assert isinstance(results['leader'], LeaderOnly)
+    assert results['follower'] == ('own', False)
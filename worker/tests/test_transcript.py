@@ -0,0 +1,61 @@
+from transcript import Cue, dedupe_rolling_cues, iter_caption_cues, split_transcript_windows
+
+
+def texts(cues):
+    return [cue.text for cue in cues]
+
+
+def test_scrolled_lines_are_not_repeated():
+    cues = [
+        Cue(0.0, 2.0, "hello and welcome"),
+        Cue(2.0, 2.01, "hello and welcome"),
+        Cue(2.01, 4.0, "hello and welcome\nto the channel"),
+        Cue(4.0, 6.0, "to the channel\ntoday we build"),
+    ]
+
+    assert texts(dedupe_rolling_cues(cues)) == ["hello and welcome", "to the channel", "today we build"]
+
+
+def test_word_by_word_roll_keeps_only_new_words():
+    cues = [
+        Cue(0.0, 1.0, "we are going to"),
+        Cue(1.0, 2.0, "are going to build a"),
+        Cue(2.0, 3.0, "to build a robot"),
+    ]
+
+    assert ' '.join(texts(dedupe_rolling_cues(cues))) == "we are going to build a robot"
+
+
+def test_single_repeated_word_across_boundary_is_kept():
+    cues = [Cue(0.0, 1.0, "that is very"), Cue(1.0, 2.0, "very good")]
+
+    assert texts(dedupe_rolling_cues(cues)) == ["that is very", "very good"]
+
+
+def test_phrase_said_again_later_is_kept():
+    cues = [
+        Cue(0.0, 1.0, "thank you"),
+        Cue(1.0, 2.0, "now the next part"),
+        Cue(2.0, 3.0, "thank you"),
+    ]
+
+    assert texts(dedupe_rolling_cues(cues)) == ["thank you", "now the next part", "thank you"]
+
+
+def test_vtt_markup_and_inline_timings_are_stripped():
+    vtt = (
+        "WEBVTT\n\n"
+        "00:00:01.000 --> 00:00:03.000 align:start position:0%\n"
+        "hello<00:00:01.500><c> world</c>\n"
+    )
+
+    cues = list(iter_caption_cues(vtt, 'vtt'))
+
+    assert [(cue.start, cue.end, cue.text) for cue in cues] == [(1.0, 3.0, "hello world")]
+
+
+def test_leading_text_goes_into_first_window():
+    windows = split_transcript_windows("intro\n[25:00] a\n[45:00] b", window_seconds=1200, overlap_seconds=60)
+
+    assert [w.text for w in windows] == ["intro\n[25:00] a", "[45:00] b"]
+    assert windows[0].owns(0)
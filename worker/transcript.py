@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Transcript extraction from WebVTT captions
+
+iter_vtt_cues() streams a caption file (or any iterable of lines) and yields
+compact Cue records with their timings, so the file is never held in memory
+as a list of lines and later stages can work with timestamps without
+parsing again.
+
+YouTube auto-captions carry inline word timings
+(`word<00:00:01.234><c> next</c>`); they are stripped from the text along
+with the other cue markup.
+
+YouTube's json3 and srv3 caption formats are parsed into the same Cue
+records (iter_json3_cues, iter_srv3_cues). They list each word once with
+its own timing, so there is no rolling repetition to merge and no markup
+to strip; iter_caption_cues() picks the parser for a format.
+
+dedupe_rolling_cues() then removes the repetition of rolling
+auto-captions, where each line is shown again at the top of the next cue
+(and once more in a 10ms "hold" cue) as the text scrolls.
+
+compact_transcript() renders the cues as text with a coarse [mm:ss]
+marker per time block and fits it into a token budget by thinning every
+block by the same ratio, so long videos keep their ending instead of
+being cut off. split_transcript_windows() cuts that text back into
+overlapping time windows for long videos.
+"""
+
+import html
+import io
+import json
+import math
+import re
+from collections import deque
+from xml.etree import ElementTree
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+# "00:01:02.345 --> 00:01:05.000 align:start position:0%" (hours optional)
+_TIMING_RE = re.compile(
+    r"^\s*(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{3})\s+-->\s+(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{3})"
+)
+# Cue markup: <c>, </c>, <i>, <v Speaker>, inline <00:00:01.234> timestamps
+_TAG_RE = re.compile(r"<[^>]*>")
+_SPACE_RE = re.compile(r"\s+")
+# Sentence ends (Latin and CJK punctuation)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?。！？])\s+")
+# Block marker at the start of a compacted transcript line
+_MARKER_RE = re.compile(r"^\[(?:(\d+):)?(\d{1,2}):(\d{2})\] ")
+# CJK characters count as roughly one token each
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+# Blocks that are not cues
+_SKIPPED_BLOCKS = ('NOTE', 'STYLE', 'REGION')
+
+
+class Cue:
+    """One caption cue: start/end in seconds and its text lines (newline-joined)"""
+
+    __slots__ = ('start', 'end', 'text')
+
+    def __init__(self, start: float, end: float, text: str):
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def lines(self) -> List[str]:
+        return self.text.split('\n') if self.text else []
+
+    def __repr__(self) -> str:
+        return f"Cue({self.start:.3f}, {self.end:.3f}, {self.text!r})"
+
+
+def _seconds(hours: Optional[str], minutes: str, seconds: str, millis: str) -> float:
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
+
+
+def clean_cue_line(line: str) -> str:
+    """Caption line without markup, inline timings and entity escapes"""
+    if '<' in line:
+        line = _TAG_RE.sub('', line)
+    if '&' in line:
+        line = html.unescape(line)
+    return _SPACE_RE.sub(' ', line).strip()
+
+
+def iter_vtt_cues(source: Union[str, Iterable[str]]) -> Iterator[Cue]:
+    """
+    Stream cues from WebVTT content
+
+    Args:
+        source: VTT content as a string, or an iterable of lines (e.g. an open file)
+
+    Yields:
+        Cue records in file order. Empty cues (YouTube's 10ms "hold" cues
+        contain only a blank line) are yielded too; their text is ''.
+    """
+    if isinstance(source, str):
+        source = io.StringIO(source)
+
+    start = end = None
+    text_lines: List[str] = []
+    skipping = False
+
+    for raw in source:
+        line = raw.rstrip('\r\n')
+
+        if not line.strip():
+            # Blank line ends the current block
+            if start is not None:
+                yield Cue(start, end, '\n'.join(text_lines))
+                start = None
+                text_lines = []
+            skipping = False
+            continue
+
+        if skipping:
+            continue
+
+        if start is None:
+            match = _TIMING_RE.match(line)
+            if match:
+                g = match.groups()
+                start = _seconds(*g[0:4])
+                end = _seconds(*g[4:8])
+            elif line.startswith(_SKIPPED_BLOCKS):
+                skipping = True
+            # Anything else outside a cue is the WEBVTT header, header
+            # metadata (Kind:, Language:) or a cue identifier
+            continue
+
+        cleaned = clean_cue_line(line)
+        if cleaned:
+            text_lines.append(cleaned)
+
+    if start is not None:
+        yield Cue(start, end, '\n'.join(text_lines))
+
+
+# Caption formats iter_caption_cues() understands, cheapest to parse first
+CAPTION_FORMATS = ('json3', 'srv3', 'vtt')
+
+
+def _segment_text(text: str) -> str:
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def iter_json3_cues(source: Union[str, bytes, Iterable[str]]) -> Iterator[Cue]:
+    """
+    Cues from YouTube json3 captions
+
+    Every event with text becomes a cue; auto-caption events only carry the
+    words that are new, and the "\\n" append events that end a line are
+    skipped.
+    """
+    if not isinstance(source, (str, bytes)):
+        source = ''.join(source)
+    for event in json.loads(source).get('events') or []:
+        segs = event.get('segs')
+        if not segs:
+            continue
+        text = _segment_text(''.join(seg.get('utf8', '') for seg in segs))
+        if not text:
+            continue
+        start = event.get('tStartMs', 0) / 1000
+        yield Cue(start, start + event.get('dDurationMs', 0) / 1000, text)
+
+
+def iter_srv3_cues(source: Union[str, bytes, Iterable[str]]) -> Iterator[Cue]:
+    """
+    Cues from YouTube srv3 (timedtext XML) captions
+
+    Parsed incrementally; each <p t=".." d=".."> paragraph is one cue.
+    """
+    if isinstance(source, str):
+        source = io.BytesIO(source.encode('utf-8'))
+    elif isinstance(source, bytes):
+        source = io.BytesIO(source)
+    elif not hasattr(source, 'read'):
+        source = io.BytesIO(''.join(source).encode('utf-8'))
+
+    for _, element in ElementTree.iterparse(source, events=('end',)):
+        if element.tag != 'p':
+            continue
+        for br in element.iter('br'):
+            br.tail = '\n' + (br.tail or '')
+        text = _segment_text(''.join(element.itertext()))
+        if text:
+            start = int(element.get('t', 0)) / 1000
+            yield Cue(start, start + int(element.get('d', 0)) / 1000, text)
+        element.clear()
+
+
+def iter_caption_cues(source, caption_format: str = 'vtt') -> Iterator[Cue]:
+    """Cues from captions in any of CAPTION_FORMATS"""
+    if caption_format == 'json3':
+        return iter_json3_cues(source)
+    if caption_format == 'srv3':
+        return iter_srv3_cues(source)
+    return iter_vtt_cues(source)
+
+
+def _overlap(tail: List[str], words: List[str]) -> int:
+    """
+    Length of the longest suffix of tail that is also a prefix of words
+
+    Knuth-Morris-Pratt failure function over words, then one scan of tail:
+    O(len(tail) + len(words)).
+    """
+    failure = [0] * len(words)
+    k = 0
+    for i in range(1, len(words)):
+        while k and words[i] != words[k]:
+            k = failure[k - 1]
+        if words[i] == words[k]:
+            k += 1
+        failure[i] = k
+
+    k = 0
+    for word in tail:
+        while k and (k == len(words) or word != words[k]):
+            k = failure[k - 1]
+        if k < len(words) and word == words[k]:
+            k += 1
+    return k
+
+
+def dedupe_rolling_cues(cues: Iterable[Cue], min_overlap_words: int = 2, window_words: int = 64) -> Iterator[Cue]:
+    """
+    Drop the text each cue repeats from the cues before it
+
+    Two passes per cue, both linear:
+    1. Leading lines equal to the previous cue's trailing lines are dropped
+       (YouTube scrolls whole lines: the last line of one cue is the first
+       line of the next, and the 10ms hold cue in between repeats it again)
+    2. Otherwise the longest prefix of the cue that matches the end of the
+       text emitted so far is dropped, for captions that roll word by word.
+       Overlaps shorter than min_overlap_words are ignored so that a speaker
+       repeating a word across a cue boundary is kept.
+
+    Unlike a global set of seen lines, a phrase that is legitimately said
+    again later is kept.
+
+    Yields:
+        Cues with only their new text; cues that add nothing are skipped
+    """
+    tail = deque(maxlen=window_words)
+    prev_lines: List[str] = []
+    for cue in cues:
+        lines = cue.lines()
+        if not lines:
+            continue
+
+        skip = 0
+        for n in range(min(len(lines), len(prev_lines)), 0, -1):
+            if lines[:n] == prev_lines[-n:]:
+                skip = n
+                break
+        prev_lines = lines
+
+        words = ' '.join(lines[skip:]).split()
+        if not words:
+            continue
+        k = 0
+        if not skip:
+            k = _overlap(list(tail)[-len(words):], words)
+            if k < min_overlap_words:
+                k = 0
+        new_words = words[k:]
+        if not new_words:
+            continue
+        tail.extend(new_words)
+        yield Cue(cue.start, cue.end, ' '.join(new_words))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough model token count: ~4 characters per token, one per CJK character"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def format_marker(seconds: float) -> str:
+    """[mm:ss] (or [h:mm:ss]) marker for a block start"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"[{hours}:{minutes:02d}:{secs:02d}]"
+    return f"[{minutes:02d}:{secs:02d}]"
+
+
+def group_cues(cues: Iterable[Cue], block_seconds: float = 30) -> List[Tuple[float, str]]:
+    """Merge consecutive cues into (start, text) blocks of about block_seconds"""
+    blocks: List[Tuple[float, str]] = []
+    start = None
+    parts: List[str] = []
+    for cue in cues:
+        if not cue.text:
+            continue
+        if start is not None and cue.start - start >= block_seconds:
+            blocks.append((start, ' '.join(parts)))
+            start, parts = None, []
+        if start is None:
+            start = cue.start
+        parts.append(cue.text)
+    if start is not None:
+        blocks.append((start, ' '.join(parts)))
+    return blocks
+
+
+def _units(text: str, max_words: int = 25) -> List[str]:
+    """Sentences of a block; unpunctuated runs are cut into max_words chunks"""
+    units = []
+    for sentence in _SENTENCE_END_RE.split(text):
+        words = sentence.split()
+        for i in range(0, len(words), max_words):
+            units.append(' '.join(words[i:i + max_words]))
+    return units
+
+
+def _thin(units: List[str], ratio: float) -> List[str]:
+    """Keep about ratio of the units, spread evenly and always including the first"""
+    if ratio >= 1:
+        return units
+    return [unit for i, unit in enumerate(units) if math.ceil((i + 1) * ratio) > math.ceil(i * ratio)]
+
+
+def _regroup(blocks: List[Tuple[float, str]], block_seconds: float) -> List[Tuple[float, str]]:
+    """Merge already grouped blocks into wider ones"""
+    merged: List[Tuple[float, str]] = []
+    for start, text in blocks:
+        if merged and start - merged[-1][0] < block_seconds:
+            merged[-1] = (merged[-1][0], merged[-1][1] + ' ' + text)
+        else:
+            merged.append((start, text))
+    return merged
+
+
+def compact_transcript(cues: Iterable[Cue], token_budget: int = 8000, block_seconds: float = 30) -> str:
+    """
+    Transcript text with [mm:ss] block markers, fitted into token_budget
+
+    When the full text is over budget every block is thinned by the same
+    ratio (whole sentences, evenly spaced), so coverage degrades uniformly
+    over the timeline. Blocks are widened when the markers alone would take
+    more than a quarter of the budget, or when thinning cannot get below it
+    (each block always keeps its first sentence).
+    """
+    blocks = group_cues(cues, block_seconds)
+    if not blocks:
+        return ""
+
+    while len(blocks) > 1 and len(blocks) * 4 > token_budget // 4:
+        block_seconds *= 2
+        blocks = _regroup(blocks, block_seconds)
+
+    while True:
+        unit_blocks = [(start, _units(text)) for start, text in blocks]
+
+        def render(ratio: float) -> str:
+            return '\n'.join(f"{format_marker(start)} {' '.join(_thin(units, ratio))}" for start, units in unit_blocks)
+
+        ratio = 1.0
+        text = render(ratio)
+        tokens = estimate_tokens(text)
+        # Sentence lengths vary, so one proportional step may not land under
+        # the budget; a few corrections converge quickly
+        for _ in range(8):
+            if tokens <= token_budget:
+                return text
+            ratio *= token_budget / tokens * 0.97
+            text = render(ratio)
+            tokens = estimate_tokens(text)
+
+        if len(blocks) == 1:
+            return text
+        block_seconds *= 2
+        blocks = _regroup(blocks, block_seconds)
+
+
+class TranscriptWindow:
+    """Part of a compacted transcript: [start, end) is the part it owns, text includes the overlap"""
+
+    __slots__ = ('index', 'start', 'end', 'text')
+
+    def __init__(self, index: int, start: float, end: float, text: str):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def owns(self, seconds: float) -> bool:
+        return self.start <= seconds < self.end
+
+
+def split_transcript_windows(text: str, window_seconds: float = 1200,
+                             overlap_seconds: float = 60) -> List[TranscriptWindow]:
+    """
+    Split a compact_transcript() text into overlapping time windows
+
+    Each window owns [k*window_seconds, (k+1)*window_seconds) - the first
+    starts at 0, the last is open-ended - and its text also includes the
+    blocks within overlap_seconds on either side, so a topic that crosses
+    a boundary is seen whole by at least one window.
+
+    Text before the first marker is prepended to the first window.
+
+    Returns:
+        Windows in time order (a single window if the text has no markers)
+    """
+    leading = []
+    blocks = []
+    for line in text.split('\n'):
+        match = _MARKER_RE.match(line)
+        if match:
+            blocks.append((_seconds(match.group(1), match.group(2), match.group(3), '0'), line))
+        elif blocks:
+            blocks[-1] = (blocks[-1][0], blocks[-1][1] + '\n' + line)
+        else:
+            leading.append(line)
+
+    if not blocks:
+        return [TranscriptWindow(0, 0.0, float('inf'), text)] if text.strip() else []
+    count = int(blocks[-1][0] // window_seconds) + 1
+    windows = []
+    for k in range(count):
+        start = k * window_seconds if k else 0.0
+        end = (k + 1) * window_seconds if k < count - 1 else float('inf')
+        lines = [line for at, line in blocks if start - overlap_seconds <= at < end + overlap_seconds]
+        if lines:
+            windows.append(TranscriptWindow(len(windows), start, end, '\n'.join(lines)))
+    # A window with no text hands its range to the one before it
+    for previous, following in zip(windows, windows[1:]):
+        previous.end = following.start
+    windows[0].start = 0.0
+    if leading:
+        windows[0].text = '\n'.join(leading + [windows[0].text])
+    return windows